@@ -0,0 +1,61 @@
+"""
+Run the backend benchmark and conformance workloads (see `coco.contract.benchmark`) and print the JSON report.
+
+The target is created by calling a factory given as 'module:callable' without arguments. Without a target,
+the in-memory container backend is benchmarked, which measures the overhead of the harness itself.
+
+Usage: python benchmarks/backends.py [module:callable] [--concurrency 1,4,16] [--iterations N]
+                                     [--option name=value ...] [--output FILE]
+"""
+from coco.contract.benchmark import run_benchmark
+from coco.contract.memory import MemoryContainerBackend
+import argparse
+import importlib
+import json
+import sys
+
+
+def load_factory(spec):
+    module_name, _, name = spec.partition(':')
+    factory = importlib.import_module(module_name)
+    for attribute in name.split('.'):
+        factory = getattr(factory, attribute)
+    return factory
+
+
+def parse_option(option):
+    name, _, value = option.partition('=')
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('target', nargs='?', help="factory of the benchmarked instance ('module:callable')")
+    parser.add_argument('--concurrency', default='1,4,16', help='comma separated concurrency levels')
+    parser.add_argument('--iterations', type=int, default=100, help='calls per operation and level')
+    parser.add_argument('--option', action='append', default=[], help="workload option ('name=value')")
+    parser.add_argument('--output', help='file to write the report to (default: stdout)')
+    args = parser.parse_args()
+
+    if args.target:
+        target = load_factory(args.target)()
+    else:
+        target = MemoryContainerBackend(images=['base'])
+    options = dict(parse_option(option) for option in args.option)
+    concurrency = [int(level) for level in args.concurrency.split(',')]
+
+    report = run_benchmark(target, concurrency=concurrency, iterations=args.iterations, **options)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    return 0 if report['conformant'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Micro-benchmark comparing `PosixStorageBackend` with a naive path-based `StorageBackend` implementation.
+
+Usage: python benchmarks/posix_storage.py [--dirs N] [--rounds N]
+"""
+from coco.contract.backends import StorageBackend
+from coco.contract.errors import DirectoryNotFoundError, StorageBackendError
+from coco.contract.posix import PosixStorageBackend
+import argparse
+import grp
+import os
+import pwd
+import shutil
+import stat
+import tempfile
+import time
+
+
+class NaiveStorageBackend(StorageBackend):
+
+    """
+    Typical path-based implementation: joins and resolves the full path for every operation.
+    """
+
+    def _path(self, dir_name):
+        path = os.path.realpath(os.path.join(self.base_dir, dir_name))
+        if not path.startswith(os.path.realpath(self.base_dir) + os.sep):
+            raise StorageBackendError("Invalid directory name '%s'." % dir_name)
+        return path
+
+    def _stat(self, dir_name):
+        try:
+            return os.stat(self._path(dir_name))
+        except FileNotFoundError:
+            raise DirectoryNotFoundError(dir_name)
+
+    def dir_exists(self, dir_name, **kwargs):
+        return os.path.isdir(self._path(dir_name))
+
+    def get_dir_gid(self, dir_name, **kwargs):
+        return self._stat(dir_name).st_gid
+
+    def get_dir_group(self, dir_name, **kwargs):
+        return grp.getgrgid(self._stat(dir_name).st_gid).gr_name
+
+    def get_dir_mode(self, dir_name, **kwargs):
+        return stat.S_IMODE(self._stat(dir_name).st_mode)
+
+    def get_dir_owner(self, dir_name, **kwargs):
+        return pwd.getpwuid(self._stat(dir_name).st_uid).pw_name
+
+    def get_dir_uid(self, dir_name, **kwargs):
+        return self._stat(dir_name).st_uid
+
+    def get_full_dir_path(self, dir_name, **kwargs):
+        return self._path(dir_name)
+
+    def mk_dir(self, dir_name, **kwargs):
+        os.mkdir(self._path(dir_name))
+
+    def rm_dir(self, dir_name, recursive=False, **kwargs):
+        if recursive:
+            shutil.rmtree(self._path(dir_name))
+        else:
+            os.rmdir(self._path(dir_name))
+
+    def set_dir_mode(self, dir_name, mode, **kwargs):
+        os.chmod(self._path(dir_name), mode)
+
+
+def naive_dir_info(backend, dir_name):
+    """
+    What callers had to do before `get_dir_info` existed.
+    """
+    return (backend.get_dir_owner(dir_name), backend.get_dir_uid(dir_name), backend.get_dir_group(dir_name),
+            backend.get_dir_gid(dir_name), backend.get_dir_mode(dir_name))
+
+
+def measure(operation, names, rounds):
+    """
+    Run `operation` for every name `rounds` times and return the mean latency in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for name in names:
+            operation(name)
+    return (time.perf_counter() - start) / (rounds * len(names)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dirs', type=int, default=1000, help="number of directories to work on")
+    parser.add_argument('--rounds', type=int, default=5, help="number of passes over all directories")
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp(prefix='coco-bench-')
+    try:
+        names = ['home%05d' % i for i in range(args.dirs)]
+        nested = ['nested/%s' % name for name in names]
+        os.mkdir(os.path.join(base_dir, 'nested'))
+        for name in names:
+            os.mkdir(os.path.join(base_dir, name))
+            os.mkdir(os.path.join(base_dir, 'nested', name))
+
+        naive = NaiveStorageBackend(base_dir)
+        with PosixStorageBackend(base_dir) as posix:
+            cases = [
+                ('dir_exists', lambda b: b.dir_exists, names),
+                ('dir_exists (nested)', lambda b: b.dir_exists, nested),
+                ('dir info (5 getters vs get_dir_info)', None, names),
+                ('set_dir_mode', lambda b: lambda name: b.set_dir_mode(name, 0o750), names),
+                ('mk_dir + rm_dir', lambda b: lambda name: (b.mk_dir(name + '.tmp'), b.rm_dir(name + '.tmp')), names),
+            ]
+
+            print("%-40s %12s %12s %8s" % ("operation", "naive (us)", "posix (us)", "speedup"))
+            for label, operation, targets in cases:
+                if operation is None:
+                    naive_op = lambda name: naive_dir_info(naive, name)
+                    posix_op = posix.get_dir_info
+                else:
+                    naive_op = operation(naive)
+                    posix_op = operation(posix)
+                naive_us = measure(naive_op, targets, args.rounds)
+                posix_us = measure(posix_op, targets, args.rounds)
+                print("%-40s %12.2f %12.2f %7.1fx" % (label, naive_us, posix_us, naive_us / posix_us))
+    finally:
+        shutil.rmtree(base_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,584 @@
+from coco.contract.backends import _slice_page, ContainerBackend, GroupBackend, SnapshotableContainerBackend, \
+    StorageBackend, SuspendableContainerBackend, UserBackend
+from coco.contract.errors import DirectoryNotFoundError, EncryptionServiceError, IntegrityServiceError, \
+    IntegrityValidationError
+from coco.contract.services import EncryptionService, IntegrityService
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import inspect
+import os
+
+
+"""
+Sentinel returned by `next` once a generator is exhausted.
+"""
+_EXHAUSTED = object()
+
+
+def _abstract_coroutine(name, doc):
+    """
+    Create a coroutine method stub raising `NotImplementedError`.
+
+    :param name: The name of the method.
+    :param doc: The docstring of the method.
+    """
+    async def method(self, *args, **kwargs):
+        raise NotImplementedError
+
+    method.__name__ = name
+    method.__doc__ = doc
+    return method
+
+
+def _abstract_async_generator(name, doc):
+    """
+    Create an asynchronous generator method stub raising `NotImplementedError`.
+
+    :param name: The name of the method.
+    :param doc: The docstring of the method.
+    """
+    async def method(self, *args, **kwargs):
+        raise NotImplementedError
+        yield
+
+    method.__name__ = name
+    method.__doc__ = doc
+    return method
+
+
+async def _iter_pages(get_page, page_size, **kwargs):
+    """
+    Asynchronously iterate over all records by fetching them page by page with `get_page`.
+
+    :param get_page: One of the `get_*_page` coroutine methods.
+    :param page_size: The number of records to fetch per page.
+
+    :return async generator An asynchronous generator yielding the records.
+    """
+    cursor = None
+    while True:
+        page, cursor = await get_page(page_size=page_size, cursor=cursor, **kwargs)
+        for record in page:
+            yield record
+        if cursor is None:
+            return
+
+
+class AsyncContract(object):
+
+    """
+    Parent class for the asyncio variants of the backend and service contracts.
+
+    Each subclass names the synchronous contract it mirrors in `sync_contract`. For every public method of
+    that contract which is not defined on the subclass (or one of its parents), a coroutine method
+    raising `NotImplementedError` is generated so the async contract always matches the synchronous one.
+    Generator methods get an asynchronous generator counterpart.
+    The public constants (e.g. `ContainerBackend.KEY_PK`) are copied as well.
+    """
+
+    """
+    The synchronous contract this asynchronous contract mirrors.
+    """
+    sync_contract = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        contract = cls.__dict__.get('sync_contract')
+        if contract is None:
+            return
+
+        for name in dir(contract):
+            if name.startswith('_') or hasattr(cls, name):
+                continue
+            value = getattr(contract, name)
+            if inspect.isgeneratorfunction(value):
+                setattr(cls, name, _abstract_async_generator(name, value.__doc__))
+            elif callable(value):
+                setattr(cls, name, _abstract_coroutine(name, value.__doc__))
+            else:
+                setattr(cls, name, value)
+
+
+class AsyncBackend(AsyncContract):
+
+    """
+    Parent class for the asyncio variants of the backend contracts (see `coco.contract.backends.Backend`).
+    """
+
+    pass
+
+
+class AsyncContainerBackend(AsyncBackend):
+
+    """
+    Asyncio variant of `coco.contract.backends.ContainerBackend`.
+    """
+
+    sync_contract = ContainerBackend
+
+    async def containers_are_running(self, containers, **kwargs):
+        """
+        See `ContainerBackend.containers_are_running`.
+        """
+        return {
+            container: status == self.CONTAINER_STATUS_RUNNING
+            for container, status in (await self.get_containers_status(containers, **kwargs)).items()
+        }
+
+    async def containers_exist(self, containers, **kwargs):
+        """
+        See `ContainerBackend.containers_exist`.
+        """
+        containers = list(containers)
+        found = await self.get_containers_by_pk(containers, **kwargs)
+        return {container: container in found for container in containers}
+
+    async def exec_in_container(self, container, cmd, **kwargs):
+        """
+        See `ContainerBackend.exec_in_container`.
+        """
+        output = b''.join([
+            chunk async for stream, chunk in self.exec_in_container_stream(container, cmd, **kwargs)
+            if stream != self.EXEC_STREAM_EXIT_CODE
+        ])
+        return output.decode('utf-8', errors='replace')
+
+    async def get_containers_by_pk(self, containers, **kwargs):
+        """
+        See `ContainerBackend.get_containers_by_pk`.
+        """
+        wanted = set(containers)
+        if not wanted:
+            return {}
+        return {
+            container.get(self.KEY_PK): container
+            for container in await self.get_containers(**kwargs)
+            if container.get(self.KEY_PK) in wanted
+        }
+
+    async def get_containers_page(self, page_size=None, cursor=None, only_running=False, **kwargs):
+        """
+        See `ContainerBackend.get_containers_page`.
+        """
+        containers = await self.get_containers(only_running=only_running, **kwargs)
+        return _slice_page(containers, page_size or self.DEFAULT_PAGE_SIZE, cursor)
+
+    async def get_containers_status(self, containers, **kwargs):
+        """
+        See `ContainerBackend.get_containers_status`.
+        """
+        containers = list(containers)
+        found = await self.get_containers_by_pk(containers, **kwargs)
+        return {
+            container: found[container].get(self.CONTAINER_KEY_STATUS) if container in found else None
+            for container in containers
+        }
+
+    async def iter_container_logs(self, container, tail=None, since=None, follow=False, poll_interval=1.0,
+                                  **kwargs):
+        """
+        See `ContainerBackend.iter_container_logs`.
+        """
+        cursor = since or 0
+        tail_pending = tail is not None
+        while True:
+            running = follow and await self.container_is_running(container)
+            logs = await self.get_container_logs(container, **kwargs)
+            start = cursor
+            if tail_pending:
+                start = max(start, len(logs) - tail)
+                tail_pending = False
+            for index in range(start, len(logs)):
+                yield index + 1, logs[index]
+            cursor = max(cursor, len(logs))
+            if not running:
+                return
+            await asyncio.sleep(poll_interval)
+
+    async def iter_containers(self, only_running=False, page_size=None, **kwargs):
+        """
+        See `ContainerBackend.iter_containers`.
+        """
+        if type(self).get_containers_page is AsyncContainerBackend.get_containers_page:
+            for record in await self.get_containers(only_running=only_running, **kwargs):
+                yield record
+        else:
+            async for record in _iter_pages(self.get_containers_page, page_size or self.DEFAULT_PAGE_SIZE,
+                                            only_running=only_running, **kwargs):
+                yield record
+
+    async def restart_container(self, container, **kwargs):
+        """
+        See `ContainerBackend.restart_container`.
+        """
+        await self.stop_container(container)
+        await self.start_container(container)
+
+
+class AsyncSnapshotableContainerBackend(AsyncContainerBackend):
+
+    """
+    Asyncio variant of `coco.contract.backends.SnapshotableContainerBackend`.
+    """
+
+    sync_contract = SnapshotableContainerBackend
+
+    async def get_container_snapshots_page(self, page_size=None, cursor=None, **kwargs):
+        """
+        See `SnapshotableContainerBackend.get_container_snapshots_page`.
+        """
+        snapshots = await self.get_container_snapshots(**kwargs)
+        return _slice_page(snapshots, page_size or self.DEFAULT_PAGE_SIZE, cursor)
+
+    async def iter_container_snapshots(self, page_size=None, **kwargs):
+        """
+        See `SnapshotableContainerBackend.iter_container_snapshots`.
+        """
+        if type(self).get_container_snapshots_page is AsyncSnapshotableContainerBackend.get_container_snapshots_page:
+            for record in await self.get_container_snapshots(**kwargs):
+                yield record
+        else:
+            async for record in _iter_pages(self.get_container_snapshots_page, page_size or self.DEFAULT_PAGE_SIZE,
+                                            **kwargs):
+                yield record
+
+
+class AsyncSuspendableContainerBackend(AsyncContainerBackend):
+
+    """
+    Asyncio variant of `coco.contract.backends.SuspendableContainerBackend`.
+    """
+
+    sync_contract = SuspendableContainerBackend
+
+
+class AsyncGroupBackend(AsyncBackend):
+
+    """
+    Asyncio variant of `coco.contract.backends.GroupBackend`.
+    """
+
+    sync_contract = GroupBackend
+
+    async def add_group_members(self, group, users, **kwargs):
+        """
+        See `GroupBackend.add_group_members`.
+        """
+        for user in users:
+            await self.add_group_member(group, user, **kwargs)
+
+    async def get_groups_page(self, page_size=None, cursor=None, **kwargs):
+        """
+        See `GroupBackend.get_groups_page`.
+        """
+        return _slice_page(await self.get_groups(**kwargs), page_size or self.DEFAULT_PAGE_SIZE, cursor)
+
+    async def get_user_groups(self, user, **kwargs):
+        """
+        See `GroupBackend.get_user_groups`.
+        """
+        return [
+            group async for group in self.iter_groups(**kwargs)
+            if await self.is_group_member(group.get(self.FIELD_PK), user, **kwargs)
+        ]
+
+    async def iter_groups(self, page_size=None, **kwargs):
+        """
+        See `GroupBackend.iter_groups`.
+        """
+        if type(self).get_groups_page is AsyncGroupBackend.get_groups_page:
+            for record in await self.get_groups(**kwargs):
+                yield record
+        else:
+            async for record in _iter_pages(self.get_groups_page, page_size or self.DEFAULT_PAGE_SIZE, **kwargs):
+                yield record
+
+    async def remove_group_members(self, group, users, **kwargs):
+        """
+        See `GroupBackend.remove_group_members`.
+        """
+        for user in users:
+            await self.remove_group_member(group, user, **kwargs)
+
+    async def remove_user_from_all_groups(self, user, **kwargs):
+        """
+        See `GroupBackend.remove_user_from_all_groups`.
+        """
+        for group in await self.get_user_groups(user, **kwargs):
+            await self.remove_group_member(group.get(self.FIELD_PK), user, **kwargs)
+
+
+class AsyncStorageBackend(AsyncBackend):
+
+    """
+    Asyncio variant of `coco.contract.backends.StorageBackend`.
+    """
+
+    sync_contract = StorageBackend
+
+    def __init__(self, base_dir):
+        """
+        Initialize a new storage backend instance that will work within 'base_dir'.
+
+        :param base_dir: The base directory within which should be worked.
+        """
+        if not os.path.exists(base_dir):
+            raise DirectoryNotFoundError("Base directory does not exist.")
+
+        self.base_dir = base_dir
+
+
+class AsyncUserBackend(AsyncBackend):
+
+    """
+    Asyncio variant of `coco.contract.backends.UserBackend`.
+    """
+
+    sync_contract = UserBackend
+
+    async def get_users_page(self, page_size=None, cursor=None, **kwargs):
+        """
+        See `UserBackend.get_users_page`.
+        """
+        return _slice_page(await self.get_users(**kwargs), page_size or self.DEFAULT_PAGE_SIZE, cursor)
+
+    async def iter_users(self, page_size=None, **kwargs):
+        """
+        See `UserBackend.iter_users`.
+        """
+        if type(self).get_users_page is AsyncUserBackend.get_users_page:
+            for record in await self.get_users(**kwargs):
+                yield record
+        else:
+            async for record in _iter_pages(self.get_users_page, page_size or self.DEFAULT_PAGE_SIZE, **kwargs):
+                yield record
+
+
+class AsyncService(AsyncContract):
+
+    """
+    Parent class for the asyncio variants of the service contracts (see `coco.contract.services.Service`).
+    """
+
+    pass
+
+
+class AsyncEncryptionService(AsyncService):
+
+    """
+    Asyncio variant of `coco.contract.services.EncryptionService`.
+    """
+
+    sync_contract = EncryptionService
+
+    async def decrypt_many(self, texts, key, **kwargs):
+        """
+        See `EncryptionService.decrypt_many`.
+        """
+        results = []
+        for text in texts:
+            try:
+                results.append(await self.decrypt(text, key, **kwargs))
+            except EncryptionServiceError as ex:
+                results.append(ex)
+        return results
+
+    async def encrypt_many(self, texts, key, **kwargs):
+        """
+        See `EncryptionService.encrypt_many`.
+        """
+        results = []
+        for text in texts:
+            try:
+                results.append(await self.encrypt(text, key, **kwargs))
+            except EncryptionServiceError as ex:
+                results.append(ex)
+        return results
+
+
+class AsyncIntegrityService(AsyncService):
+
+    """
+    Asyncio variant of `coco.contract.services.IntegrityService`.
+    """
+
+    sync_contract = IntegrityService
+
+    async def verify_many(self, items, key, **kwargs):
+        """
+        See `IntegrityService.verify_many`.
+        """
+        results = []
+        for text, signature in items:
+            try:
+                results.append(await self.verify(text, signature, key, **kwargs) is not False)
+            except IntegrityValidationError:
+                results.append(False)
+            except IntegrityServiceError as ex:
+                results.append(ex)
+        return results
+
+
+"""
+Mapping of the synchronous contracts to their asyncio variants (most specific first).
+"""
+ASYNC_CONTRACTS = (
+    (SnapshotableContainerBackend, AsyncSnapshotableContainerBackend),
+    (SuspendableContainerBackend, AsyncSuspendableContainerBackend),
+    (ContainerBackend, AsyncContainerBackend),
+    (GroupBackend, AsyncGroupBackend),
+    (StorageBackend, AsyncStorageBackend),
+    (UserBackend, AsyncUserBackend),
+    (EncryptionService, AsyncEncryptionService),
+    (IntegrityService, AsyncIntegrityService),
+)
+
+
+class AsyncAdapter(object):
+
+    """
+    Adapter exposing a synchronous backend or service through the matching asyncio contract.
+
+    Every call is executed on a bounded thread pool, so the event loop is never blocked and
+    many calls can be in flight at the same time (at most `max_workers` of them are running,
+    the others are queued). Generators returned by the synchronous backend are advanced on the
+    thread pool as well. Use `to_async` to create adapters.
+    """
+
+    def __init__(self, backend, executor=None, max_workers=32):
+        """
+        Initialize a new adapter for `backend`.
+
+        :param backend: The synchronous backend or service to adapt.
+        :param executor: An optional `concurrent.futures.Executor` to run the calls on.
+                         If none is given, a dedicated thread pool is created and shut down with `close`.
+        :param max_workers: The size of the dedicated thread pool (ignored if `executor` is given).
+        """
+        self.backend = backend
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='coco-async')
+        self.executor = executor
+
+    def __getattr__(self, name):
+        if name == 'backend':
+            raise AttributeError(name)
+        attr = getattr(self.backend, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self._run(attr, *args, **kwargs)
+        return method
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def _run(self, func, *args, **kwargs):
+        """
+        Run `func` with the given arguments on the executor and wait for its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def aclose(self, wait=True):
+        """
+        Shut down the dedicated thread pool (if the adapter created one) without blocking the event loop.
+
+        The shutdown (and waiting for the pending calls) runs on the loop's default executor.
+
+        :param wait: Whether to wait for the pending calls to finish.
+        """
+        if self._owns_executor:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, functools.partial(self.executor.shutdown, wait=wait))
+
+    def close(self, wait=True):
+        """
+        Shut down the dedicated thread pool (if the adapter created one).
+
+        Waiting blocks the calling thread, use `aclose` from coroutines.
+
+        :param wait: Whether to wait for the pending calls to finish.
+        """
+        if self._owns_executor:
+            self.executor.shutdown(wait=wait)
+
+
+def _delegating_coroutine(name):
+    """
+    Create a coroutine method running the wrapped backend's method `name` on the adapter's executor.
+    """
+    async def method(self, *args, **kwargs):
+        return await self._run(getattr(self.backend, name), *args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+def _delegating_async_generator(name):
+    """
+    Create an asynchronous generator method advancing the wrapped backend's generator `name` on the adapter's executor.
+    """
+    async def method(self, *args, **kwargs):
+        iterator = await self._run(lambda: iter(getattr(self.backend, name)(*args, **kwargs)))
+        try:
+            while True:
+                item = await self._run(next, iterator, _EXHAUSTED)
+                if item is _EXHAUSTED:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                await self._run(close)
+
+    method.__name__ = name
+    return method
+
+
+@functools.lru_cache(maxsize=None)
+def _adapter_class(contracts):
+    """
+    Create (once) the adapter class implementing all the given async contracts.
+
+    :param contracts: Tuple of async contract classes.
+    """
+    namespace = {}
+    for contract in contracts:
+        for name, value in inspect.getmembers(contract, inspect.iscoroutinefunction):
+            if not name.startswith('_'):
+                namespace[name] = _delegating_coroutine(name)
+        for name, value in inspect.getmembers(contract, inspect.isasyncgenfunction):
+            if not name.startswith('_'):
+                namespace[name] = _delegating_async_generator(name)
+    name = ''.join(contract.__name__ for contract in contracts) + 'Adapter'
+    return type(name, (AsyncAdapter,) + contracts, namespace)
+
+
+def to_async(backend, executor=None, max_workers=32):
+    """
+    Adapt the synchronous backend or service to the matching asyncio contract(s).
+
+    The returned adapter is an instance of every async contract the backend implements
+    (e.g. `AsyncSnapshotableContainerBackend` for a `SnapshotableContainerBackend`).
+
+    :param backend: The synchronous backend or service to adapt.
+    :param executor: An optional `concurrent.futures.Executor` to run the calls on.
+    :param max_workers: The size of the dedicated thread pool if no executor is given.
+
+    :return AsyncAdapter The adapter.
+    """
+    contracts = []
+    for sync_contract, async_contract in ASYNC_CONTRACTS:
+        if isinstance(backend, sync_contract) and not any(issubclass(c, async_contract) for c in contracts):
+            contracts.append(async_contract)
+    if not contracts:
+        raise TypeError("%s does not implement any known contract." % type(backend).__name__)
+
+    return _adapter_class(tuple(contracts))(backend, executor=executor, max_workers=max_workers)
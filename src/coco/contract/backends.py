@@ -1,5 +1,45 @@
-from coco.contract.errors import DirectoryNotFoundError
+from coco.contract import fs
+from coco.contract.cache import LRUCache
+from coco.contract.errors import DirectoryNotFoundError, StorageBackendError
+from concurrent.futures import ThreadPoolExecutor
+import errno
 import os
+import stat
+import time
+
+
+def _iter_pages(get_page, page_size, **kwargs):
+    """
+    Iterate over all records by fetching them page by page with `get_page`.
+
+    :param get_page: One of the `get_*_page` methods.
+    :param page_size: The number of records to fetch per page.
+
+    :return generator A generator yielding the records.
+    """
+    cursor = None
+    while True:
+        page, cursor = get_page(page_size=page_size, cursor=cursor, **kwargs)
+        for record in page:
+            yield record
+        if cursor is None:
+            return
+
+
+def _slice_page(records, page_size, cursor):
+    """
+    Cut a page out of the full list of records, using the offset as cursor.
+
+    :param records: The full list of records.
+    :param page_size: The maximum number of records on the page.
+    :param cursor: The offset of the page's first record or `None` for the first page.
+
+    :return tuple A (page, next_cursor) tuple as returned by the `get_*_page` methods.
+    """
+    offset = cursor or 0
+    page = records[offset:offset + page_size]
+    next_offset = offset + len(page)
+    return page, next_offset if page and next_offset < len(records) else None
 
 
 class Backend(object):
@@ -15,9 +55,16 @@ class Backend(object):
 
     All methods creating a resource must return the primary key for that resource as 'pk' and all methods
     returning resources or a list of them must include that 'pk' field as well.
+
+    Methods returning lists of resources have a paginated `get_*_page` counterpart returning
+    a (records, next_cursor) tuple. The cursor is opaque to the caller and `None` once the last page
+    has been returned. The `iter_*` methods iterate over all records page by page.
     """
 
-    pass
+    """
+    Number of records per page used by the paginated methods if no page size is given.
+    """
+    DEFAULT_PAGE_SIZE = 100
 
 
 class ContainerBackend(Backend):
@@ -69,6 +116,21 @@ class ContainerBackend(Backend):
     """
     CONTAINER_STATUS_STOPPED = 'stopped'
 
+    """
+    Stream name used by `exec_in_container_stream` for the item carrying the command's exit code.
+    """
+    EXEC_STREAM_EXIT_CODE = 'exit_code'
+
+    """
+    Stream name used by `exec_in_container_stream` for chunks written to stderr.
+    """
+    EXEC_STREAM_STDERR = 'stderr'
+
+    """
+    Stream name used by `exec_in_container_stream` for chunks written to stdout.
+    """
+    EXEC_STREAM_STDOUT = 'stdout'
+
     """
     Key to be used in returns as unique identifier for the resource.
     """
@@ -129,6 +191,31 @@ class ContainerBackend(Backend):
         """
         raise NotImplementedError
 
+    def containers_are_running(self, containers, **kwargs):
+        """
+        Check which of the requested containers are running.
+
+        :param containers: An iterable of container PKs to check.
+
+        :return dict A dict mapping each requested PK to `True` if the container is running, `False` otherwise.
+        """
+        return {
+            container: status == self.CONTAINER_STATUS_RUNNING
+            for container, status in self.get_containers_status(containers, **kwargs).items()
+        }
+
+    def containers_exist(self, containers, **kwargs):
+        """
+        Check which of the requested containers exist in the backend.
+
+        :param containers: An iterable of container PKs to check.
+
+        :return dict A dict mapping each requested PK to `True` if the container exists, `False` otherwise.
+        """
+        containers = list(containers)
+        found = self.get_containers_by_pk(containers, **kwargs)
+        return {container: container in found for container in containers}
+
     def create_container(self, username, uid, name, ports, volumes,
                          cmd=None, base_url=None, image=None, clone_of=None, **kwargs):
         """
@@ -189,12 +276,45 @@ class ContainerBackend(Backend):
         """
         Execute the given command inside the container.
 
+        The default implementation collects the stdout and stderr chunks of `exec_in_container_stream`
+        in the order they arrive.
+
         :param container: The container to execute the command in.
         :param cmd: The command to execute.
 
         :return str The output returned by the command.
         """
-        raise NotImplementedError
+        output = b''.join(
+            chunk for stream, chunk in self.exec_in_container_stream(container, cmd, **kwargs)
+            if stream != self.EXEC_STREAM_EXIT_CODE
+        )
+        return output.decode('utf-8', errors='replace')
+
+    def exec_in_container_stream(self, container, cmd, **kwargs):
+        """
+        Execute the given command inside the container and stream its output while it is running.
+
+        Output is yielded as (`ContainerBackend.EXEC_STREAM_STDOUT`, bytes) and
+        (`ContainerBackend.EXEC_STREAM_STDERR`, bytes) tuples as soon as it is available.
+        The last item is always (`ContainerBackend.EXEC_STREAM_EXIT_CODE`, exit code) holding the command's
+        exit code as `int`, or `None` if the backend cannot tell it (see below).
+
+        Concrete backends should implement this method, `exec_in_container` is built on top of it.
+        For backends only implementing `exec_in_container`, the default implementation yields
+        its whole output as a single stdout chunk and `None` as exit code.
+
+        :param container: The container to execute the command in.
+        :param cmd: The command to execute.
+
+        :return generator A generator yielding (stream, chunk) tuples as described above.
+        """
+        if type(self).exec_in_container is ContainerBackend.exec_in_container:
+            raise NotImplementedError
+
+        output = self.exec_in_container(container, cmd, **kwargs)
+        if output:
+            yield self.EXEC_STREAM_STDOUT, output.encode('utf-8')
+        yield self.EXEC_STREAM_EXIT_CODE, None
 
     def get_container(self, container, **kwargs):
         """
@@ -248,6 +368,60 @@ class ContainerBackend(Backend):
         """
         raise NotImplementedError
 
+    def get_containers_by_pk(self, containers, **kwargs):
+        """
+        Get information about all the requested containers at once.
+
+        The default implementation issues a single `get_containers` call and picks the requested
+        containers from its result. Concrete backends with a native way to query multiple containers
+        in one request should override this method, since all other bulk methods are built on top of it.
+
+        :param containers: An iterable of container PKs to get the information of.
+
+        :return dict A dict mapping each existing container's PK to its description (as with `get_container`).
+                     Containers that do not exist are not included.
+        """
+        wanted = set(containers)
+        if not wanted:
+            return {}
+        return {
+            container.get(self.KEY_PK): container
+            for container in self.get_containers(**kwargs)
+            if container.get(self.KEY_PK) in wanted
+        }
+
+    def get_containers_page(self, page_size=None, cursor=None, only_running=False, **kwargs):
+        """
+        Get a single page of containers.
+
+        The default implementation slices the result of `get_containers`. Backends able to page natively
+        should override it and use their own cursor.
+
+        :param page_size: The maximum number of containers on the page (defaults to `Backend.DEFAULT_PAGE_SIZE`).
+        :param cursor: The cursor returned with the previous page or `None` for the first page.
+        :param only_running: If true, only running containers are returned.
+
+        :return tuple A (containers, next_cursor) tuple. `next_cursor` is `None` on the last page.
+        """
+        containers = self.get_containers(only_running=only_running, **kwargs)
+        return _slice_page(containers, page_size or self.DEFAULT_PAGE_SIZE, cursor)
+
+    def get_containers_status(self, containers, **kwargs):
+        """
+        Get the status of all the requested containers at once.
+
+        :param containers: An iterable of container PKs to get the status of.
+
+        :return dict A dict mapping each requested PK to the value of the container's
+                     `ContainerBackend.CONTAINER_KEY_STATUS` field or `None` if the container does not exist.
+        """
+        containers = list(containers)
+        found = self.get_containers_by_pk(containers, **kwargs)
+        return {
+            container: found[container].get(self.CONTAINER_KEY_STATUS) if container in found else None
+            for container in containers
+        }
+
     def get_status(self):
         """
         Get the status of the container backend.
@@ -259,6 +433,62 @@ class ContainerBackend(Backend):
         """
         raise NotImplementedError
 
+    def iter_container_logs(self, container, tail=None, since=None, follow=False, poll_interval=1.0, **kwargs):
+        """
+        Lazily iterate over the logging output of the container.
+
+        Each log message is yielded together with a cursor. Passing that cursor as `since` to a later call
+        continues right after the message, so pollers only transfer new messages.
+
+        The default implementation is built on `get_container_logs` and uses the number of messages seen so far
+        as cursor. Concrete backends able to stream logs natively should override this method so memory use
+        stays flat no matter how long the log is. They are free to use other cursors (e.g. timestamps)
+        as long as they accept them back as `since`.
+
+        :param container: The container to get the logs of.
+        :param tail: If set, only the last `tail` messages (after `since`) are yielded before following.
+        :param since: A cursor yielded by a previous call. Only messages after it are yielded.
+        :param follow: If true, keep waiting for new messages as long as the container is running.
+        :param poll_interval: The number of seconds to wait between two polls while following.
+
+        :return generator A generator yielding (cursor, message) tuples.
+        """
+        cursor = since or 0
+        tail_pending = tail is not None
+        while True:
+            running = follow and self.container_is_running(container)
+            logs = self.get_container_logs(container, **kwargs)
+            start = cursor
+            if tail_pending:
+                start = max(start, len(logs) - tail)
+                tail_pending = False
+            for index in range(start, len(logs)):
+                yield index + 1, logs[index]
+            cursor = max(cursor, len(logs))
+            if not running:
+                return
+            time.sleep(poll_interval)
+
+    def iter_containers(self, only_running=False, page_size=None, **kwargs):
+        """
+        Iterate over all containers.
+
+        If `get_containers_page` is implemented natively, the containers are fetched page by page.
+        Otherwise they are taken from a single `get_containers` call.
+
+        :param only_running: If true, only running containers are returned.
+        :param page_size: The number of containers to fetch per page (defaults to `Backend.DEFAULT_PAGE_SIZE`).
+
+        :return generator A generator yielding the containers (each entry as with `get_container`).
+        """
+        if type(self).get_containers_page is ContainerBackend.get_containers_page:
+            records = self.get_containers(only_running=only_running, **kwargs)
+        else:
+            records = _iter_pages(self.get_containers_page, page_size or self.DEFAULT_PAGE_SIZE,
+                                  only_running=only_running, **kwargs)
+        for record in records:
+            yield record
+
     def restart_container(self, container, **kwargs):
         """
         Restart the container.
@@ -348,6 +578,20 @@ class SnapshotableContainerBackend(ContainerBackend):
         """
         raise NotImplementedError
 
+    def get_container_snapshots_page(self, page_size=None, cursor=None, **kwargs):
+        """
+        Get a single page of containers' snapshots.
+
+        The default implementation slices the result of `get_container_snapshots`. Backends able to page natively
+        should override it and use their own cursor.
+
+        :param page_size: The maximum number of snapshots on the page (defaults to `Backend.DEFAULT_PAGE_SIZE`).
+        :param cursor: The cursor returned with the previous page or `None` for the first page.
+
+        :return tuple A (snapshots, next_cursor) tuple. `next_cursor` is `None` on the last page.
+        """
+        return _slice_page(self.get_container_snapshots(**kwargs), page_size or self.DEFAULT_PAGE_SIZE, cursor)
+
     def get_containers_snapshots(self, container, **kwargs):
         """
         Get a list of the container's snapshots.
@@ -356,6 +600,24 @@ class SnapshotableContainerBackend(ContainerBackend):
         """
         raise NotImplementedError
 
+    def iter_container_snapshots(self, page_size=None, **kwargs):
+        """
+        Iterate over all containers' snapshots.
+
+        If `get_container_snapshots_page` is implemented natively, the snapshots are fetched page by page.
+        Otherwise they are taken from a single `get_container_snapshots` call.
+
+        :param page_size: The number of snapshots to fetch per page (defaults to `Backend.DEFAULT_PAGE_SIZE`).
+
+        :return generator A generator yielding the snapshots (each entry as with `get_container_snapshot`).
+        """
+        if type(self).get_container_snapshots_page is SnapshotableContainerBackend.get_container_snapshots_page:
+            records = self.get_container_snapshots(**kwargs)
+        else:
+            records = _iter_pages(self.get_container_snapshots_page, page_size or self.DEFAULT_PAGE_SIZE, **kwargs)
+        for record in records:
+            yield record
+
     def restore_container_snapshot(self, container, snapshot, **kwargs):
         """
         Restore the container's snapshot.
@@ -434,6 +696,19 @@ class GroupBackend(Backend):
         """
         raise NotImplementedError
 
+    def add_group_members(self, group, users, **kwargs):
+        """
+        Add all the given users to the group.
+
+        The default implementation calls `add_group_member` for each user. Backends able to
+        add multiple members with a single operation (e.g. one LDAP modify) should override it.
+
+        :param group: The group to add the users to.
+        :param users: An iterable of users to add.
+        """
+        for user in users:
+            self.add_group_member(group, user, **kwargs)
+
     def connect(self, credentials, **kwargs):
         """
         Establish the connection to the group backend with the given credentials.
@@ -485,6 +760,36 @@ class GroupBackend(Backend):
         """
         raise NotImplementedError
 
+    def get_groups_page(self, page_size=None, cursor=None, **kwargs):
+        """
+        Get a single page of groups.
+
+        The default implementation slices the result of `get_groups`. Backends able to page natively
+        (e.g. using LDAP's paged results control) should override it and use their own cursor.
+
+        :param page_size: The maximum number of groups on the page (defaults to `Backend.DEFAULT_PAGE_SIZE`).
+        :param cursor: The cursor returned with the previous page or `None` for the first page.
+
+        :return tuple A (groups, next_cursor) tuple. `next_cursor` is `None` on the last page.
+        """
+        return _slice_page(self.get_groups(**kwargs), page_size or self.DEFAULT_PAGE_SIZE, cursor)
+
+    def get_user_groups(self, user, **kwargs):
+        """
+        Get a list of all groups the user is a member of.
+
+        The default implementation checks the membership for every group with `is_group_member`.
+        Backends with a native reverse lookup (e.g. LDAP's `memberOf` attribute) should override it.
+
+        :param user: The user to get the groups of.
+
+        :return list A list of the user's groups (each entry as with `get_groups`).
+        """
+        return [
+            group for group in self.iter_groups(**kwargs)
+            if self.is_group_member(group.get(self.FIELD_PK), user, **kwargs)
+        ]
+
     def group_exists(self, group, **kwargs):
         """
         Check if the group exists.
@@ -502,19 +807,54 @@ class GroupBackend(Backend):
         """
         raise NotImplementedError
 
+    def iter_groups(self, page_size=None, **kwargs):
+        """
+        Iterate over all groups.
+
+        If `get_groups_page` is implemented natively, the groups are fetched page by page.
+        Otherwise they are taken from a single `get_groups` call.
+
+        :param page_size: The number of groups to fetch per page (defaults to `Backend.DEFAULT_PAGE_SIZE`).
+
+        :return generator A generator yielding the groups.
+        """
+        if type(self).get_groups_page is GroupBackend.get_groups_page:
+            records = self.get_groups(**kwargs)
+        else:
+            records = _iter_pages(self.get_groups_page, page_size or self.DEFAULT_PAGE_SIZE, **kwargs)
+        for record in records:
+            yield record
+
     def remove_group_member(self, group, user, **kwargs):
         """
         TODO: write doc.
         """
         raise NotImplementedError
 
+    def remove_group_members(self, group, users, **kwargs):
+        """
+        Remove all the given users from the group.
+
+        The default implementation calls `remove_group_member` for each user. Backends able to
+        remove multiple members with a single operation (e.g. one LDAP modify) should override it.
+
+        :param group: The group to remove the users from.
+        :param users: An iterable of users to remove.
+        """
+        for user in users:
+            self.remove_group_member(group, user, **kwargs)
+
     def remove_user_from_all_groups(self, user, **kwargs):
         """
         Remove the user from all groups he belongs to.
 
+        The default implementation looks the groups up with `get_user_groups`
+        and calls `remove_group_member` for each of them.
+
         :param user: The user for which all memberships should be removed.
         """
-        raise NotImplementedError
+        for group in self.get_user_groups(user, **kwargs):
+            self.remove_group_member(group.get(self.FIELD_PK), user, **kwargs)
 
 
 class StorageBackend(Backend):
@@ -528,6 +868,80 @@ class StorageBackend(Backend):
     All implementations are required to accept the 'base_dir' argument in its constructor.
     """
 
+    """
+    Key to be used in the return of `get_dir_info` for the numeric ID of the group owning the directory.
+    """
+    DIR_INFO_KEY_GID = 'gid'
+
+    """
+    Key to be used in the return of `get_dir_info` for the name of the group owning the directory.
+    """
+    DIR_INFO_KEY_GROUP = 'group'
+
+    """
+    Key to be used in the return of `get_dir_info` for the directory's access mode.
+    """
+    DIR_INFO_KEY_MODE = 'mode'
+
+    """
+    Key to be used in the return of `get_dir_info` for the name of the user owning the directory.
+    """
+    DIR_INFO_KEY_OWNER = 'owner'
+
+    """
+    Key to be used in the return of `get_dir_info` for the numeric ID of the user owning the directory.
+    """
+    DIR_INFO_KEY_UID = 'uid'
+
+    """
+    Key to be used in the return of the `set_dir_*_recursive` methods for the number of changed entries.
+    """
+    RECURSIVE_KEY_CHANGED = 'changed'
+
+    """
+    Key to be used in the return of the `set_dir_*_recursive` methods for the list of
+    (relative path, error message) tuples of the entries that could not be changed.
+    """
+    RECURSIVE_KEY_ERRORS = 'errors'
+
+    """
+    Key to be used in the return of the `set_dir_*_recursive` methods for the number of entries
+    already having the requested values.
+    """
+    RECURSIVE_KEY_UNCHANGED = 'unchanged'
+
+    """
+    Maximum number of directories whose usage is cached by `get_dir_usage`.
+    """
+    USAGE_CACHE_SIZE = 100000
+
+    """
+    Number of seconds a directory's cached usage is trusted even if its modification time did not change.
+
+    This bounds how long files changed in place (not altering the directory's modification time) go unnoticed.
+    """
+    USAGE_CACHE_TTL = 300.0
+
+    """
+    Key to be used in the return of `get_dir_usage` for the number of directories (including the directory itself).
+    """
+    USAGE_KEY_DIRS = 'dirs'
+
+    """
+    Key to be used in the return of `get_dir_usage` for the allocated disk space in bytes.
+    """
+    USAGE_KEY_DISK_USAGE = 'disk_usage'
+
+    """
+    Key to be used in the return of `get_dir_usage` for the number of files (everything but directories).
+    """
+    USAGE_KEY_FILES = 'files'
+
+    """
+    Key to be used in the return of `get_dir_usage` for the apparent size in bytes.
+    """
+    USAGE_KEY_SIZE = 'size'
+
     def __init__(self, base_dir):
         """
         Initialize a new storage backend instance that will work within 'base_dir'.
@@ -539,6 +953,27 @@ class StorageBackend(Backend):
 
         self.base_dir = base_dir
 
+    def _get_usage_cache(self):
+        """
+        Get the cache used by `get_dirs_usage` (created on first use).
+        """
+        cache = getattr(self, '_usage_cache', None)
+        if cache is None:
+            cache = self._usage_cache = LRUCache(max_size=self.USAGE_CACHE_SIZE, ttl=self.USAGE_CACHE_TTL)
+        return cache
+
+    def _stat_to_dir_info(self, st):
+        """
+        Turn the `os.stat_result` of a directory into the dict returned by `get_dir_info`.
+        """
+        return {
+            self.DIR_INFO_KEY_GID: st.st_gid,
+            self.DIR_INFO_KEY_GROUP: fs.get_group_name(st.st_gid),
+            self.DIR_INFO_KEY_MODE: stat.S_IMODE(st.st_mode),
+            self.DIR_INFO_KEY_OWNER: fs.get_user_name(st.st_uid),
+            self.DIR_INFO_KEY_UID: st.st_uid,
+        }
+
     def dir_exists(self, dir_name, **kwargs):
         """
         Check if the directory with the given name exists.
@@ -551,41 +986,138 @@ class StorageBackend(Backend):
         """
         Get the group identifier (numeric) of the group owning the directory.
 
+        The default implementation is built on `get_dir_info`.
+
         :param dir_name: The directory to get the group for.
         """
-        raise NotImplementedError
+        return self.get_dir_info(dir_name, **kwargs)[self.DIR_INFO_KEY_GID]
 
     def get_dir_group(self, dir_name, **kwargs):
         """
         Get the group identifier of the group owning the directory.
 
+        The default implementation is built on `get_dir_info`.
+
         :param dir_name: The directory to get the group for.
         """
-        raise NotImplementedError
+        return self.get_dir_info(dir_name, **kwargs)[self.DIR_INFO_KEY_GROUP]
+
+    def get_dir_info(self, dir_name, **kwargs):
+        """
+        Get the ownership and access mode of the directory with a single `stat` call.
+
+        User and group names are resolved through a cache (see `coco.contract.fs`), so the name service
+        is not queried for every directory. The default implementation stats `get_full_dir_path`.
+
+        :param dir_name: The directory to get the information for.
+
+        :return dict A dict with all the `StorageBackend.DIR_INFO_KEY_*` fields.
+        """
+        try:
+            st = os.stat(self.get_full_dir_path(dir_name, **kwargs))
+        except FileNotFoundError:
+            raise DirectoryNotFoundError("Directory '%s' does not exist." % dir_name)
+        except OSError as ex:
+            raise StorageBackendError("Cannot stat directory '%s': %s" % (dir_name, ex))
+
+        return self._stat_to_dir_info(st)
 
     def get_dir_mode(self, dir_name, **kwargs):
         """
         Get the direcories access modes.
 
+        The default implementation is built on `get_dir_info`.
+
         :param dir_name: The directory to get the mode for.
         """
-        raise NotImplementedError
+        return self.get_dir_info(dir_name, **kwargs)[self.DIR_INFO_KEY_MODE]
 
     def get_dir_owner(self, dir_name, **kwargs):
         """
         Get the user identifier of the user owning the directory.
 
+        The default implementation is built on `get_dir_info`.
+
         :param dir_name: The directory to get the owner for.
         """
-        raise NotImplementedError
+        return self.get_dir_info(dir_name, **kwargs)[self.DIR_INFO_KEY_OWNER]
 
     def get_dir_uid(self, dir_name, **kwargs):
         """
         Get the user identifier (numeric) of the user owning the directory.
 
+        The default implementation is built on `get_dir_info`.
+
         :param dir_name: The directory to get the owner for.
         """
-        raise NotImplementedError
+        return self.get_dir_info(dir_name, **kwargs)[self.DIR_INFO_KEY_UID]
+
+    def get_dir_usage(self, dir_name, max_workers=None, **kwargs):
+        """
+        Get the disk usage of the directory and everything below it.
+
+        See `get_dirs_usage` for how the usage is computed and cached.
+
+        :param dir_name: The directory to get the usage of.
+        :param max_workers: The maximum number of threads to use.
+
+        :return dict A dict with all the `StorageBackend.USAGE_KEY_*` fields.
+        """
+        usage = self.get_dirs_usage([dir_name], max_workers=max_workers, **kwargs)
+        if dir_name not in usage:
+            raise DirectoryNotFoundError("Directory '%s' does not exist." % dir_name)
+        return usage[dir_name]
+
+    def get_dirs_info(self, dir_names, **kwargs):
+        """
+        Get the ownership and access mode of all the given directories at once.
+
+        :param dir_names: An iterable of directories to get the information for.
+
+        :return dict A dict mapping each existing directory to its information (as with `get_dir_info`).
+                     Directories that do not exist are not included.
+        """
+        infos = {}
+        for dir_name in dir_names:
+            try:
+                infos[dir_name] = self.get_dir_info(dir_name, **kwargs)
+            except DirectoryNotFoundError:
+                pass
+        return infos
+
+    def get_dirs_usage(self, dir_names, max_workers=None, **kwargs):
+        """
+        Get the disk usage of all the given directories (and everything below them) in one pass.
+
+        The default implementation walks the trees at `get_full_dir_path` in parallel using
+        `coco.contract.fs.trees_usage`. The results of each directory are cached keyed by its modification time,
+        so repeated queries only read the directories that changed (see `StorageBackend.USAGE_CACHE_TTL`).
+        Directories that are symlinks are treated as missing.
+
+        :param dir_names: An iterable of directories to get the usage of.
+        :param max_workers: The maximum number of threads to use.
+
+        :return dict A dict mapping each existing directory to its usage (as with `get_dir_usage`).
+                     Directories that do not exist are not included.
+        """
+        paths = {}
+        for dir_name in dir_names:
+            paths.setdefault(self.get_full_dir_path(dir_name, **kwargs), []).append(dir_name)
+        try:
+            usage = fs.trees_usage(list(paths), cache=self._get_usage_cache(), max_workers=max_workers)
+        except OSError as ex:
+            raise StorageBackendError("Cannot compute directory usage: %s" % ex)
+
+        result = {}
+        for path, (size, disk_usage, files, dirs) in usage.items():
+            for dir_name in paths[path]:
+                result[dir_name] = {
+                    self.USAGE_KEY_DIRS: dirs,
+                    self.USAGE_KEY_DISK_USAGE: disk_usage,
+                    self.USAGE_KEY_FILES: files,
+                    self.USAGE_KEY_SIZE: size,
+                }
+        return result
 
     def get_full_dir_path(self, dir_name, **kwargs):
         """
@@ -595,6 +1127,18 @@ class StorageBackend(Backend):
         """
         raise NotImplementedError
 
+    def get_pending_deletions(self, **kwargs):
+        """
+        Get the number of directories removed with `rm_dir(..., background=True)` not yet deleted completely.
+
+        Backends supporting background deletion move the directory out of the way and return from `rm_dir`
+        right away, deleting its content afterwards. The default implementation does not delete
+        in the background, so nothing is ever pending.
+
+        :return int The number of pending deletions.
+        """
+        return 0
+
     def mk_dir(self, dir_name, **kwargs):
         """
         Create a directory with the given name.
@@ -603,15 +1147,116 @@ class StorageBackend(Backend):
         """
         raise NotImplementedError
 
+    def provision_dir(self, dir_name, uid=None, gid=None, mode=None, **kwargs):
+        """
+        Create the directory and set its owner, group and access mode.
+
+        The default implementation calls `mk_dir`, `set_dir_uid`, `set_dir_gid` and `set_dir_mode`
+        and removes the new directory with `rm_dir` if setting an attribute fails.
+        Backends able to do this with fewer operations should override it.
+
+        :param dir_name: The name of the directory to create.
+        :param uid: The numeric ID of the owner to set or `None` to keep the default.
+        :param gid: The numeric ID of the group to set or `None` to keep the default.
+        :param mode: The access mode to set or `None` to keep the default.
+        """
+        self.mk_dir(dir_name, **kwargs)
+        try:
+            if uid is not None:
+                self.set_dir_uid(dir_name, uid, **kwargs)
+            if gid is not None:
+                self.set_dir_gid(dir_name, gid, **kwargs)
+            if mode is not None:
+                self.set_dir_mode(dir_name, mode, **kwargs)
+        except BaseException:
+            # do not leave a directory with the wrong owner or mode behind
+            try:
+                self.rm_dir(dir_name, **kwargs)
+            except StorageBackendError:
+                pass
+            raise
+
+    def provision_dirs(self, specs, max_workers=8, **kwargs):
+        """
+        Create many directories with their owner, group and access mode at once.
+
+        The specs are processed concurrently by up to `max_workers` threads with `provision_dir`.
+        A failing directory does not stop the others: its `coco.contract.errors.StorageBackendError`
+        (e.g. `DirectoryNotFoundError` if the parent does not exist) is reported in the result.
+
+        :param specs: An iterable of (dir_name, uid, gid, mode) tuples (see `provision_dir`).
+        :param max_workers: The maximum number of directories provisioned in parallel.
+
+        :return dict A dict mapping each directory name (in the order of `specs`) to `None` if it has been
+                     provisioned successfully or the `StorageBackendError` raised otherwise.
+        :raises ValueError: If a directory name is given more than once (nothing is provisioned then).
+        """
+        def provision(spec):
+            dir_name, uid, gid, mode = spec
+            try:
+                self.provision_dir(dir_name, uid=uid, gid=gid, mode=mode, **kwargs)
+            except StorageBackendError as ex:
+                return ex
+            return None
+
+        specs = list(specs)
+        seen = set()
+        for spec in specs:
+            if spec[0] in seen:
+                raise ValueError("Directory %s is given more than once." % spec[0])
+            seen.add(spec[0])
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='coco-provision') as executor:
+            results = executor.map(provision, specs)
+            return {spec[0]: result for spec, result in zip(specs, results)}
+
     def rm_dir(self, dir_name, recursive=False, **kwargs):
         """
         Delete the directory from the storage backend.
 
+        Implementations may support a `background` keyword argument: if true (and `recursive` is set),
+        the directory is only moved out of the way and its content is deleted in the background
+        (see `get_pending_deletions` and `wait_for_deletions`).
+
         :param dir_name: The name of the directory to delete.
         :param recursive: Either to delete recursive or not.
         """
         raise NotImplementedError
 
+    def set_dir_attributes_recursive(self, dir_name, uid=None, gid=None, mode=None, file_mode=None,
+                                     max_workers=None, **kwargs):
+        """
+        Recursively set the owner, group and/or access mode of the directory and everything below it.
+
+        The default implementation walks the tree at `get_full_dir_path` in parallel using
+        `coco.contract.fs.change_tree`: entries are changed relative to their parent directory's descriptor,
+        symlinks are never followed and entries already having the requested values are skipped.
+        If `dir_name` itself is a symlink, `DirectoryNotFoundError` is raised. Symlinks in the components above it
+        are still resolved: implementations confining names to `base_dir` should start the walk from a descriptor
+        opened relative to it (see `coco.contract.fs.walk_trees`).
+
+        :param dir_name: The directory to change.
+        :param uid: The numeric user ID to set or `None` to keep the owner.
+        :param gid: The numeric group ID to set or `None` to keep the group.
+        :param mode: The access mode to set on directories (and files, unless `file_mode` is given) or `None`.
+        :param file_mode: The access mode to set on files or `None` to use `mode`.
+        :param max_workers: The maximum number of threads to use.
+
+        :return dict A summary with all the `StorageBackend.RECURSIVE_KEY_*` fields.
+        """
+        try:
+            changed, unchanged, errors = fs.change_tree(self.get_full_dir_path(dir_name, **kwargs), uid=uid, gid=gid,
+                                                        mode=mode, file_mode=file_mode, max_workers=max_workers)
+        except OSError as ex:
+            if ex.errno in (errno.ENOENT, errno.ENOTDIR, errno.ELOOP):
+                raise DirectoryNotFoundError("Directory '%s' does not exist." % dir_name)
+            raise StorageBackendError("Cannot walk directory '%s': %s" % (dir_name, ex))
+
+        return {
+            self.RECURSIVE_KEY_CHANGED: changed,
+            self.RECURSIVE_KEY_ERRORS: errors,
+            self.RECURSIVE_KEY_UNCHANGED: unchanged,
+        }
+
     def set_dir_gid(self, dir_name, gid, **kwargs):
         """
         Set the directory's primary group by numeric ID.
@@ -621,6 +1266,17 @@ class StorageBackend(Backend):
         """
         raise NotImplementedError
 
+    def set_dir_gid_recursive(self, dir_name, gid, **kwargs):
+        """
+        Recursively set the primary group of the directory and everything below it by numeric ID.
+
+        :param dir_name: The directory to set the group on.
+        :param gid: The numeric group ID.
+
+        :return dict A summary as with `set_dir_attributes_recursive`.
+        """
+        return self.set_dir_attributes_recursive(dir_name, gid=gid, **kwargs)
+
     def set_dir_group(self, dir_name, group, **kwargs):
         """
         Set the directory's primary group.
@@ -630,6 +1286,21 @@ class StorageBackend(Backend):
         """
         raise NotImplementedError
 
+    def set_dir_group_recursive(self, dir_name, group, **kwargs):
+        """
+        Recursively set the primary group of the directory and everything below it.
+
+        :param dir_name: The directory to set the group on.
+        :param group: The group to set as primary group.
+
+        :return dict A summary as with `set_dir_attributes_recursive`.
+        """
+        try:
+            gid = fs.get_group_id(group)
+        except KeyError:
+            raise StorageBackendError("Group '%s' does not exist." % group)
+        return self.set_dir_attributes_recursive(dir_name, gid=gid, **kwargs)
+
     def set_dir_mode(self, dir_name, mode, **kwargs):
         """
         Set the directory's access mode.
@@ -639,6 +1310,18 @@ class StorageBackend(Backend):
         """
         raise NotImplementedError
 
+    def set_dir_mode_recursive(self, dir_name, mode, file_mode=None, **kwargs):
+        """
+        Recursively set the access mode of the directory and everything below it.
+
+        :param dir_name: The directory to set the mode on.
+        :param mode: The access mode to set.
+        :param file_mode: An optional, different access mode for files.
+
+        :return dict A summary as with `set_dir_attributes_recursive`.
+        """
+        return self.set_dir_attributes_recursive(dir_name, mode=mode, file_mode=file_mode, **kwargs)
+
     def set_dir_owner(self, dir_name, owner, **kwargs):
         """
         Set the directory's owner.
@@ -648,6 +1331,21 @@ class StorageBackend(Backend):
         """
         raise NotImplementedError
 
+    def set_dir_owner_recursive(self, dir_name, owner, **kwargs):
+        """
+        Recursively set the owner of the directory and everything below it.
+
+        :param dir_name: The directory to set the owner on.
+        :param owner: The user to set as an owner.
+
+        :return dict A summary as with `set_dir_attributes_recursive`.
+        """
+        try:
+            uid = fs.get_user_id(owner)
+        except KeyError:
+            raise StorageBackendError("User '%s' does not exist." % owner)
+        return self.set_dir_attributes_recursive(dir_name, uid=uid, **kwargs)
+
     def set_dir_uid(self, dir_name, uid, **kwargs):
         """
         Set the directory's owner by numeric ID.
@@ -657,6 +1355,29 @@ class StorageBackend(Backend):
         """
         raise NotImplementedError
 
+    def set_dir_uid_recursive(self, dir_name, uid, **kwargs):
+        """
+        Recursively set the owner of the directory and everything below it by numeric ID.
+
+        :param dir_name: The directory to set the owner on.
+        :param uid: The user's numeric ID.
+
+        :return dict A summary as with `set_dir_attributes_recursive`.
+        """
+        return self.set_dir_attributes_recursive(dir_name, uid=uid, **kwargs)
+
+    def wait_for_deletions(self, timeout=None, **kwargs):
+        """
+        Wait until all deletions running in the background (see `get_pending_deletions`) are finished.
+
+        The default implementation returns immediately since it does not delete in the background.
+
+        :param timeout: The maximum number of seconds to wait or `None` to wait forever.
+
+        :return bool `True` if there are no pending deletions anymore, `False` if the timeout expired.
+        """
+        return True
+
 
 class UserBackend(Backend):
 
@@ -742,6 +1463,38 @@ class UserBackend(Backend):
         """
         raise NotImplementedError
 
+    def get_users_page(self, page_size=None, cursor=None, **kwargs):
+        """
+        Get a single page of the users the backend stores.
+
+        The default implementation slices the result of `get_users`. Backends able to page natively
+        (e.g. using LDAP's paged results control) should override it and use their own cursor.
+
+        :param page_size: The maximum number of users on the page (defaults to `Backend.DEFAULT_PAGE_SIZE`).
+        :param cursor: The cursor returned with the previous page or `None` for the first page.
+
+        :return tuple A (users, next_cursor) tuple. `next_cursor` is `None` on the last page.
+        """
+        return _slice_page(self.get_users(**kwargs), page_size or self.DEFAULT_PAGE_SIZE, cursor)
+
+    def iter_users(self, page_size=None, **kwargs):
+        """
+        Iterate over all users the backend stores.
+
+        If `get_users_page` is implemented natively, the users are fetched page by page.
+        Otherwise they are taken from a single `get_users` call.
+
+        :param page_size: The number of users to fetch per page (defaults to `Backend.DEFAULT_PAGE_SIZE`).
+
+        :return generator A generator yielding the users.
+        """
+        if type(self).get_users_page is UserBackend.get_users_page:
+            records = self.get_users(**kwargs)
+        else:
+            records = _iter_pages(self.get_users_page, page_size or self.DEFAULT_PAGE_SIZE, **kwargs)
+        for record in records:
+            yield record
+
     def set_user_password(self, user, password, **kwargs):
         """
         Set/update the user's password stored in the backend.
@@ -0,0 +1,393 @@
+from coco.contract.backends import ContainerBackend, GroupBackend, StorageBackend, UserBackend
+from coco.contract.errors import IntegrityValidationError
+from coco.contract.services import EncryptionService, IntegrityService
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import math
+import time
+import uuid
+
+
+"""
+Single step of a workload.
+
+`call(index)` performs the operation for the index-th resource of the run and returns its result.
+`check(index, result)` returns a message if the result violates the contract, `None` otherwise.
+If a `setup` operation fails for an index, the later operations are not run for that index, except for
+`cleanup` operations: they are run for every index the first `setup` operation (creating the resource)
+succeeded for, so resources are removed even if a later setup step failed.
+"""
+Operation = namedtuple('Operation', 'name call check setup cleanup', defaults=(False,))
+
+"""
+The number of error and violation messages kept per operation in the report.
+"""
+MAX_MESSAGES = 5
+
+
+def _expect(predicate, message):
+    """
+    Create a check failing with `message` if `predicate(result)` is false.
+    """
+    def check(index, result):
+        return None if predicate(result) else '%s (got %.80r)' % (message, result)
+    return check
+
+
+def _expect_record(*keys):
+    """
+    Create a check requiring the result to be a dict containing all the given keys.
+    """
+    def check(index, result):
+        if not isinstance(result, dict):
+            return 'Expected a dict, got %s.' % type(result).__name__
+        missing = [key for key in keys if key not in result]
+        if missing:
+            return 'Missing keys: %s.' % ', '.join(missing)
+        return None
+    return check
+
+
+def _expect_records(*keys):
+    """
+    Create a check requiring the result to be a list of dicts containing all the given keys.
+    """
+    check_record = _expect_record(*keys)
+
+    def check(index, result):
+        if not isinstance(result, list):
+            return 'Expected a list, got %s.' % type(result).__name__
+        for record in result:
+            message = check_record(index, record)
+            if message is not None:
+                return message
+        return None
+    return check
+
+
+def _unchecked(index, result):
+    return None
+
+
+def container_workload(backend, names, image=None, cmd='true', **options):
+    """
+    Container lifecycle: create, inspect, start, exec, stop and delete one container per index.
+
+    :param image: The image to create the containers from (defaults to the first available image).
+    :param cmd: The command to execute within the running containers.
+    """
+    if image is None:
+        images = backend.get_container_images()
+        if not images:
+            raise ValueError('The container backend has no image to create containers from.')
+        image = images[0][backend.KEY_PK]
+    pks = {}
+
+    def create(index):
+        result = backend.create_container(names[index], options.get('base_id', 50000) + index, names[index],
+                                          [], [], image=image)
+        pks[index] = result[backend.KEY_PK]
+        return result
+
+    statuses = (backend.BACKEND_STATUS_OK, backend.BACKEND_STATUS_STOPPED, backend.BACKEND_STATUS_ERROR)
+    return [
+        Operation('get_status', lambda index: backend.get_status(),
+                  _expect(lambda result: result in statuses, 'Not a BACKEND_STATUS_* value'), False),
+        Operation('create_container', create, _expect_record(backend.KEY_PK, backend.CONTAINER_KEY_STATUS), True),
+        Operation('container_exists', lambda index: backend.container_exists(pks[index]),
+                  _expect(lambda result: result is True, 'Created container does not exist'), False),
+        Operation('get_container', lambda index: backend.get_container(pks[index]),
+                  _expect_record(backend.KEY_PK, backend.CONTAINER_KEY_STATUS), False),
+        Operation('get_containers', lambda index: backend.get_containers(),
+                  _expect_records(backend.KEY_PK, backend.CONTAINER_KEY_STATUS), False),
+        Operation('get_containers_by_pk', lambda index: backend.get_containers_by_pk([pks[index]]),
+                  _expect(lambda result: isinstance(result, dict) and len(result) == 1, 'Container not found'),
+                  False),
+        Operation('start_container', lambda index: backend.start_container(pks[index]), _unchecked, True),
+        Operation('container_is_running', lambda index: backend.container_is_running(pks[index]),
+                  _expect(lambda result: result is True, 'Started container is not running'), False),
+        Operation('exec_in_container', lambda index: backend.exec_in_container(pks[index], cmd),
+                  _expect(lambda result: isinstance(result, str), 'Output is not a string'), False),
+        Operation('get_container_logs', lambda index: backend.get_container_logs(pks[index]),
+                  _expect(lambda result: isinstance(result, list), 'Logs are not a list'), False),
+        Operation('stop_container', lambda index: backend.stop_container(pks[index]), _unchecked, False),
+        Operation('delete_container', lambda index: backend.delete_container(pks[index]), _unchecked, False, True),
+    ]
+
+
+def encryption_workload(service, names, key='coco-benchmark', text=None, text_size=1024, **options):
+    """
+    Encrypt and decrypt one text per index.
+
+    :param key: The key to encrypt and decrypt with.
+    :param text: The text to encrypt (defaults to `text_size` characters).
+    :param text_size: The length of the default text.
+    """
+    if text is None:
+        text = ('coco' * (text_size // 4 + 1))[:text_size]
+    ciphers = {}
+
+    def encrypt(index):
+        ciphers[index] = service.encrypt(text, key)
+        return ciphers[index]
+
+    return [
+        Operation('encrypt', encrypt,
+                  _expect(lambda result: result is not None and result != text, 'Cipher text equals the text'), True),
+        Operation('decrypt', lambda index: service.decrypt(ciphers[index], key),
+                  _expect(lambda result: result == text, 'Decrypted text differs from the original'), False),
+    ]
+
+
+def group_workload(backend, names, member=None, **options):
+    """
+    Create, inspect and delete one group per index.
+
+    :param member: An existing user added to and removed from each group (membership is skipped if `None`).
+    """
+    base_id = options.get('base_id', 50000)
+    operations = [
+        Operation('create_group', lambda index: backend.create_group(base_id + index, names[index]),
+                  _unchecked, True),
+        Operation('group_exists', lambda index: backend.group_exists(names[index]),
+                  _expect(lambda result: bool(result), 'Created group does not exist'), False),
+        Operation('get_group', lambda index: backend.get_group(names[index]), _expect_record(), False),
+        Operation('get_groups', lambda index: backend.get_groups(), _expect_records(), False),
+    ]
+    if member is not None:
+        operations.extend([
+            Operation('add_group_member', lambda index: backend.add_group_member(names[index], member),
+                      _unchecked, False),
+            Operation('is_group_member', lambda index: backend.is_group_member(names[index], member),
+                      _expect(lambda result: bool(result), 'Added user is not a member'), False),
+            Operation('get_group_members', lambda index: backend.get_group_members(names[index]),
+                      _expect(lambda result: isinstance(result, list), 'Members are not a list'), False),
+            Operation('remove_group_member', lambda index: backend.remove_group_member(names[index], member),
+                      _unchecked, False),
+        ])
+    operations.append(Operation('delete_group', lambda index: backend.delete_group(names[index]), _unchecked, False,
+                                True))
+    return operations
+
+
+def integrity_workload(service, names, key='coco-benchmark', text=None, text_size=1024, **options):
+    """
+    Sign one text per index and verify the signature against the original and a tampered text.
+
+    :param key: The key to sign and verify with.
+    :param text: The text to sign (defaults to `text_size` characters).
+    :param text_size: The length of the default text.
+    """
+    if text is None:
+        text = ('coco' * (text_size // 4 + 1))[:text_size]
+    signatures = {}
+
+    def sign(index):
+        signatures[index] = service.sign(text, key)
+        return signatures[index]
+
+    def verify_tampered(index):
+        try:
+            return service.verify(text + 'x', signatures[index], key)
+        except IntegrityValidationError:
+            return False
+
+    return [
+        Operation('sign', sign, _expect(lambda result: bool(result), 'Empty signature'), True),
+        Operation('verify', lambda index: service.verify(text, signatures[index], key),
+                  _expect(lambda result: result is not False, 'Valid signature rejected'), False),
+        Operation('verify (tampered)', verify_tampered,
+                  _expect(lambda result: result is False, 'Tampered text accepted'), False),
+    ]
+
+
+def storage_workload(backend, names, mode=0o750, **options):
+    """
+    Create, inspect, change and remove one directory per index.
+
+    :param mode: The access mode set on the directories.
+    """
+    info_keys = (backend.DIR_INFO_KEY_GID, backend.DIR_INFO_KEY_GROUP, backend.DIR_INFO_KEY_MODE,
+                 backend.DIR_INFO_KEY_OWNER, backend.DIR_INFO_KEY_UID)
+    return [
+        Operation('mk_dir', lambda index: backend.mk_dir(names[index]), _unchecked, True),
+        Operation('dir_exists', lambda index: backend.dir_exists(names[index]),
+                  _expect(lambda result: result is True, 'Created directory does not exist'), False),
+        Operation('get_dir_info', lambda index: backend.get_dir_info(names[index]),
+                  _expect_record(*info_keys), False),
+        Operation('set_dir_mode', lambda index: backend.set_dir_mode(names[index], mode), _unchecked, False),
+        Operation('get_dir_mode', lambda index: backend.get_dir_mode(names[index]),
+                  _expect(lambda result: result == mode, 'Mode has not been set'), False),
+        Operation('rm_dir', lambda index: backend.rm_dir(names[index]), _unchecked, False, True),
+    ]
+
+
+def user_workload(backend, names, password='coco-Benchmark-1', **options):
+    """
+    Create, authenticate, change and delete one user per index.
+
+    :param password: The password of the created users.
+    """
+    base_id = options.get('base_id', 50000)
+
+    def create(index):
+        return backend.create_user(base_id + index, names[index], password, base_id, '/home/%s' % names[index])
+
+    return [
+        Operation('create_user', create, _unchecked, True),
+        Operation('user_exists', lambda index: backend.user_exists(names[index]),
+                  _expect(lambda result: bool(result), 'Created user does not exist'), False),
+        Operation('get_user', lambda index: backend.get_user(names[index]), _expect_record(), False),
+        Operation('get_users', lambda index: backend.get_users(), _expect_records(), False),
+        Operation('auth_user', lambda index: backend.auth_user(names[index], password),
+                  _expect(lambda result: result is not None, 'Authenticated user not returned'), False),
+        Operation('set_user_password', lambda index: backend.set_user_password(names[index], password),
+                  _unchecked, False),
+        Operation('delete_user', lambda index: backend.delete_user(names[index]), _unchecked, False, True),
+    ]
+
+
+"""
+Mapping of the contracts to the functions creating their workloads.
+
+Each function receives the target, the unique resource names of the run and the benchmark's options
+and returns the list of `Operation`s to run in order.
+"""
+WORKLOADS = (
+    (ContainerBackend, container_workload),
+    (GroupBackend, group_workload),
+    (StorageBackend, storage_workload),
+    (UserBackend, user_workload),
+    (EncryptionService, encryption_workload),
+    (IntegrityService, integrity_workload),
+)
+
+
+def percentile(values, percent):
+    """
+    Get the percentile of the sorted values (nearest-rank method).
+
+    :param values: The sorted values.
+    :param percent: The percentile to get (0 to 100).
+
+    :return The value or `None` if there are no values.
+    """
+    if not values:
+        return None
+    return values[max(0, min(len(values) - 1, int(math.ceil(percent / 100.0 * len(values))) - 1))]
+
+
+def run_benchmark(target, concurrency=(1, 4, 16), iterations=100, prefix=None, **options):
+    """
+    Benchmark the backend or service and check its results against the contract.
+
+    For every contract the target implements (see `WORKLOADS`), the contract's workload is run at each
+    concurrency level: every operation is called `iterations` times (on distinct resources where
+    the operation creates some) before the next operation starts. Resources are cleaned up by the workloads.
+
+    :param target: The backend or service instance to benchmark (connected, if it requires a connection).
+    :param concurrency: The numbers of concurrent callers to measure.
+    :param iterations: The number of calls per operation and concurrency level.
+    :param prefix: The prefix of the created resources' names (defaults to a random one).
+    :param options: Further options for the workloads (e.g. `image`, `key` or `member`, see the
+                    `*_workload` functions) and `base_id`, the first user/group ID used.
+
+    :return dict A JSON serializable report with the keys 'target', 'iterations', 'conformant' (false
+                 if any call failed or violated the contract) and 'results', a list of dicts with the keys
+                 'contract', 'concurrency' and 'operations' (see `run_operation`).
+    """
+    if prefix is None:
+        prefix = 'cocobench%s' % uuid.uuid4().hex[:8]
+    workloads = [(contract, workload) for contract, workload in WORKLOADS if isinstance(target, contract)]
+    if not workloads:
+        raise TypeError("%s does not implement any known contract." % type(target).__name__)
+
+    results = []
+    conformant = True
+    for contract, workload in workloads:
+        for level in concurrency:
+            names = ['%s%s%dx%d' % (prefix, contract.__name__[:1].lower(), level, index)
+                     for index in range(iterations)]
+            indexes = list(range(iterations))
+            created = None
+            reports = []
+            for operation in workload(target, names, **options):
+                cleanup = operation.cleanup and created is not None
+                report, succeeded = run_operation(operation, created if cleanup else indexes, level)
+                reports.append(report)
+                conformant = conformant and not report['errors'] and not report['violations']
+                if operation.setup:
+                    if created is None:
+                        created = succeeded
+                    indexes = succeeded
+            results.append({'contract': contract.__name__, 'concurrency': level, 'operations': reports})
+
+    return {
+        'target': '%s.%s' % (type(target).__module__, type(target).__name__),
+        'iterations': iterations,
+        'conformant': conformant,
+        'results': results,
+    }
+
+
+def run_operation(operation, indexes, concurrency):
+    """
+    Run the operation once for each index with up to `concurrency` calls in flight.
+
+    :param operation: The `Operation` to run.
+    :param indexes: The indexes to run the operation for.
+    :param concurrency: The number of concurrent callers.
+
+    :return tuple A (report, succeeded) tuple, where `report` is a dict with the operation's latency
+                  percentiles (in milliseconds), throughput (calls per second), errors (by exception class)
+                  and contract violations and `succeeded` is the list of indexes the call succeeded for.
+    """
+    def timed(index):
+        start = time.perf_counter()
+        try:
+            result = operation.call(index)
+        except Exception as ex:
+            return index, time.perf_counter() - start, ex, None
+        return index, time.perf_counter() - start, None, result
+
+    latencies = []
+    errors = Counter()
+    messages = []
+    violations = 0
+    succeeded = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='coco-bench') as executor:
+        outcomes = list(executor.map(timed, indexes))
+    elapsed = time.perf_counter() - start
+
+    for index, latency, error, result in outcomes:
+        latencies.append(latency * 1000.0)
+        if error is not None:
+            errors[type(error).__name__] += 1
+            if len(messages) < MAX_MESSAGES:
+                messages.append('%s: %s' % (type(error).__name__, error))
+            continue
+        succeeded.append(index)
+        message = operation.check(index, result)
+        if message is not None:
+            violations += 1
+            if len(messages) < MAX_MESSAGES:
+                messages.append(message)
+
+    latencies.sort()
+    report = {
+        'operation': operation.name,
+        'calls': len(outcomes),
+        'errors': dict(errors),
+        'violations': violations,
+        'messages': messages,
+        'throughput': len(outcomes) / elapsed if elapsed > 0 else None,
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+        },
+    }
+    return report, succeeded
@@ -0,0 +1,179 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache(object):
+
+    """
+    Thread-safe, bounded least-recently-used cache with optional time-to-live.
+
+    Once `max_size` entries are stored, adding a new entry evicts the least recently used one.
+    If a `ttl` is given, entries older than `ttl` seconds are treated as missing and dropped on access.
+
+    Hits, misses, evictions and expirations are counted so the cache can be sized properly (see `stats`).
+    """
+
+    """
+    Sentinel used to detect missing entries (`None` is a valid value to cache).
+    """
+    _MISSING = object()
+
+    def __init__(self, max_size=1024, ttl=None, clock=time.monotonic):
+        """
+        Initialize a new, empty cache.
+
+        :param max_size: The maximum number of entries to keep.
+        :param ttl: The number of seconds an entry stays valid or `None` to keep entries until evicted.
+        :param clock: Callable returning the current time in seconds (used for the TTL).
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __contains__(self, key):
+        """
+        Check if a valid entry exists for the key (does neither count as hit/miss nor refresh the entry).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._is_expired(entry)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _is_expired(self, entry):
+        """
+        Check if the (stored_at, value) entry is older than the TTL.
+        """
+        return self.ttl is not None and self._clock() - entry[0] >= self.ttl
+
+    def clear(self):
+        """
+        Remove all entries from the cache (the counters are kept).
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key, default=None):
+        """
+        Get the value stored for `key`.
+
+        :param key: The key to look up.
+        :param default: The value to return if there is no (valid) entry for the key.
+
+        :return The cached value or `default`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry):
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_or_set(self, key, factory):
+        """
+        Get the value stored for `key` or compute, store and return it if missing.
+
+        The factory is called without holding the cache's lock, so concurrent misses for the same
+        key might call it more than once.
+
+        :param key: The key to look up.
+        :param factory: Callable without arguments computing the value on a miss.
+
+        :return The cached or computed value.
+        """
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def hit_rate(self):
+        """
+        Get the ratio of hits to lookups.
+
+        :return float The hit rate between 0 and 1 (0 if there were no lookups yet).
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return float(self.hits) / lookups if lookups else 0.0
+
+    def invalidate(self, key):
+        """
+        Remove the entry for `key` (if any).
+
+        :param key: The key to remove.
+
+        :return bool `True` if an entry has been removed, `False` otherwise.
+        """
+        with self._lock:
+            return self._entries.pop(key, self._MISSING) is not self._MISSING
+
+    def invalidate_if(self, predicate):
+        """
+        Remove all entries for which `predicate(key)` returns true.
+
+        :param predicate: Callable receiving the key of an entry.
+
+        :return int The number of removed entries.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def reset_stats(self):
+        """
+        Reset all counters to zero.
+        """
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def set(self, key, value):
+        """
+        Store `value` for `key`, evicting the least recently used entry if the cache is full.
+
+        :param key: The key to store the value for (must be hashable).
+        :param value: The value to store.
+        """
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+            elif len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = (self._clock(), value)
+
+    def stats(self):
+        """
+        Get a snapshot of the cache's counters.
+
+        :return dict A dict with the keys 'hits', 'misses', 'evictions', 'expirations', 'size' and 'max_size'.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+            }
@@ -0,0 +1,112 @@
+from coco.contract.errors import ContainerBackendError
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+import time
+
+
+"""
+Outcome of an operation on a single container.
+
+`result` is the operation's return value, `error` the `ContainerBackendError` it raised (or `None`).
+"""
+FanOutResult = namedtuple('FanOutResult', 'container result error')
+
+
+class RateLimiter(object):
+
+    """
+    Thread-safe limiter spacing out operations to at most `rate` per second.
+    """
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        """
+        Initialize a new rate limiter.
+
+        :param rate: The maximum number of operations per second.
+        :param clock: Callable returning the current time in seconds.
+        :param sleep: Callable used to wait.
+        """
+        if rate <= 0:
+            raise ValueError("The rate must be positive (got %s)." % rate)
+        self.interval = 1.0 / rate
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next = None
+
+    def acquire(self):
+        """
+        Wait until the next operation may start.
+        """
+        with self._lock:
+            now = self._clock()
+            start = now if self._next is None or self._next < now else self._next
+            self._next = start + self.interval
+        if start > now:
+            self._sleep(start - now)
+
+
+def fan_out(backend, method, containers, max_workers=16, rate_limit=None, **kwargs):
+    """
+    Run the operation on all containers and wait for all of them.
+
+    See `iter_fan_out`.
+
+    :return tuple A (results, errors) tuple of dicts mapping the containers to the operation's return value
+                  resp. the `ContainerBackendError` it raised.
+    """
+    results = {}
+    errors = {}
+    for outcome in iter_fan_out(backend, method, containers, max_workers=max_workers, rate_limit=rate_limit,
+                                **kwargs):
+        if outcome.error is None:
+            results[outcome.container] = outcome.result
+        else:
+            errors[outcome.container] = outcome.error
+    return results, errors
+
+
+def iter_fan_out(backend, method, containers, max_workers=16, rate_limit=None, **kwargs):
+    """
+    Run a container backend operation on many containers concurrently and yield the outcomes as they complete.
+
+    Up to `max_workers` operations run at the same time. A `ContainerBackendError` raised for a container
+    is yielded as its outcome and does not stop the others. Other exceptions are considered bugs: the
+    operations not started yet are cancelled and the exception is raised once the running ones have finished.
+    The same happens to the not started operations if the generator is closed early.
+
+    Example: `for outcome in iter_fan_out(backend, 'restart_container', pks, rate_limit=10): ...`
+
+    :param backend: The `ContainerBackend` to use.
+    :param method: The name of the backend's method to call (e.g. 'restart_container') or a callable.
+                   It is called with the container as first argument and `kwargs`.
+    :param containers: An iterable of the containers to run the operation on.
+    :param max_workers: The maximum number of operations running at the same time.
+    :param rate_limit: The maximum number of operations started per second (`None` for no limit).
+
+    :return generator A generator yielding a `FanOutResult` per container in order of completion.
+    """
+    operation = getattr(backend, method) if isinstance(method, str) else method
+    limiter = RateLimiter(rate_limit) if rate_limit is not None else None
+
+    def run(container):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return FanOutResult(container, operation(container, **kwargs), None)
+        except ContainerBackendError as ex:
+            return FanOutResult(container, None, ex)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='coco-fanout')
+    pending = set()
+    try:
+        pending = {executor.submit(run, container) for container in containers}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
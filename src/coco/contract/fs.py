@@ -0,0 +1,444 @@
+from coco.contract.cache import LRUCache
+import errno
+import os
+import stat
+import threading
+import time
+
+try:
+    import grp
+    import pwd
+except ImportError:  # not available on non-POSIX systems
+    grp = pwd = None
+
+
+"""
+Flags used to open directories while walking a tree (symlinks are never followed).
+"""
+_DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | getattr(os, 'O_CLOEXEC', 0)
+
+"""
+Flags used to open regular files whose mode needs to be changed (symlinks are never followed).
+"""
+_FILE_FLAGS = os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK | os.O_NOCTTY | getattr(os, 'O_CLOEXEC', 0)
+
+"""
+Directories modified less than this many nanoseconds ago are not cached by `trees_usage`.
+"""
+_RACY_MTIME_NS = 2 * 10 ** 9
+
+"""
+Cache for the group IDs resolved with `get_group_id`.
+"""
+_group_ids = LRUCache(max_size=4096, ttl=300.0)
+
+"""
+Cache for the group names resolved with `get_group_name`.
+"""
+_group_names = LRUCache(max_size=4096, ttl=300.0)
+
+"""
+Cache for the user IDs resolved with `get_user_id`.
+"""
+_user_ids = LRUCache(max_size=4096, ttl=300.0)
+
+"""
+Cache for the user names resolved with `get_user_name`.
+"""
+_user_names = LRUCache(max_size=4096, ttl=300.0)
+
+
+class _SharedFd(object):
+
+    """
+    Reference counted directory file descriptor, closed once the last reference is released.
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self._refs = 1
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            close = self._refs == 0
+        if close:
+            os.close(self.fd)
+
+
+def _chmod_file(name, mode, dir_fd):
+    """
+    Change the mode of the regular file `name` without following a symlink that replaced it meanwhile.
+
+    Files that cannot be opened (e.g. unreadable ones when not running as root) raise `PermissionError`
+    instead of being changed by name, which would follow such a symlink.
+    """
+    fd = os.open(name, _FILE_FLAGS, dir_fd=dir_fd)
+    try:
+        os.fchmod(fd, mode)
+    finally:
+        os.close(fd)
+
+
+def _scan(dir_fd):
+    """
+    Lazily iterate over the entries of the directory.
+    """
+    with os.scandir(dir_fd) as iterator:
+        for entry in iterator:
+            yield entry
+
+
+def _resolve(lookup, numeric_id, attribute):
+    if lookup is None:
+        return str(numeric_id)
+    try:
+        return getattr(lookup(numeric_id), attribute)
+    except KeyError:
+        return str(numeric_id)
+
+
+def _resolve_id(lookup, name, attribute):
+    if isinstance(name, int):
+        return name
+    if lookup is None:
+        raise KeyError("Cannot resolve '%s' without a name service." % name)
+    return getattr(lookup(name), attribute)
+
+
+def change_tree(path, uid=None, gid=None, mode=None, file_mode=None, max_workers=None):
+    """
+    Recursively change the ownership and/or access mode of all entries below (and including) `path`.
+
+    The tree is walked in parallel with `walk_tree`. Entries already having the requested values are
+    skipped. Symbolic links are never followed: their ownership is changed with `lchown`, their mode is left
+    untouched (as are the modes of special files). Failures on single entries do not abort the walk,
+    they are reported in the returned errors (this includes files whose mode cannot be changed because
+    they cannot be opened, see `_chmod_file`).
+
+    :param path: The root of the tree to change: a path or an open directory descriptor (see `walk_trees`).
+    :param uid: The numeric user ID to set or `None` to keep the owner.
+    :param gid: The numeric group ID to set or `None` to keep the group.
+    :param mode: The access mode to set on directories (and files, unless `file_mode` is given) or `None`.
+    :param file_mode: The access mode to set on files or `None` to use `mode`.
+    :param max_workers: The maximum number of threads to use.
+
+    :return tuple A (changed, unchanged, errors) tuple where `errors` is a list of (relative path, error message).
+    """
+    if file_mode is None:
+        file_mode = mode
+    lock = threading.Lock()
+    counts = {'changed': 0, 'unchanged': 0}
+    errors = []
+
+    def needs_chown(st):
+        return (uid is not None and st.st_uid != uid) or (gid is not None and st.st_gid != gid)
+
+    def record(changed, rel_path=None, ex=None):
+        with lock:
+            if ex is not None:
+                errors.append((rel_path, str(ex)))
+            else:
+                counts['changed' if changed else 'unchanged'] += 1
+
+    def visit(dir_fd, rel_path, entries):
+        try:
+            st = os.fstat(dir_fd)
+            changed = False
+            if needs_chown(st):
+                os.fchown(dir_fd, -1 if uid is None else uid, -1 if gid is None else gid)
+                changed = True
+            if mode is not None and stat.S_IMODE(st.st_mode) != mode:
+                os.fchmod(dir_fd, mode)
+                changed = True
+            record(changed)
+        except OSError as ex:
+            record(False, rel_path, ex)
+
+        subdirs = []
+        for entry in entries:
+            entry_path = os.path.join(rel_path, entry.name)
+            try:
+                st = entry.stat(follow_symlinks=False)
+                if stat.S_ISDIR(st.st_mode):
+                    subdirs.append(entry.name)
+                    continue
+                changed = False
+                if needs_chown(st):
+                    os.chown(entry.name, -1 if uid is None else uid, -1 if gid is None else gid,
+                             dir_fd=dir_fd, follow_symlinks=False)
+                    changed = True
+                if file_mode is not None and stat.S_ISREG(st.st_mode) and stat.S_IMODE(st.st_mode) != file_mode:
+                    _chmod_file(entry.name, file_mode, dir_fd)
+                    changed = True
+                record(changed)
+            except FileNotFoundError:
+                continue
+            except OSError as ex:
+                record(False, entry_path, ex)
+        return subdirs
+
+    walk_tree(path, visit, max_workers=max_workers)
+    return counts['changed'], counts['unchanged'], errors
+
+
+def get_group_id(group):
+    """
+    Resolve the group name to its numeric ID using the system's name service.
+
+    Results are cached, so repeated lookups do not hit NSS (e.g. LDAP) again.
+
+    :param group: The group's name (numeric IDs are returned as they are).
+
+    :return int The numeric group ID.
+
+    :raises KeyError: If the group does not exist.
+    """
+    return _group_ids.get_or_set(group, lambda: _resolve_id(grp and grp.getgrnam, group, 'gr_gid'))
+
+
+def get_group_name(gid):
+    """
+    Resolve the numeric group ID to the group's name using the system's name service.
+
+    Results are cached, so repeated lookups do not hit NSS (e.g. LDAP) again.
+
+    :param gid: The numeric group ID.
+
+    :return str The group's name or the ID as string if it cannot be resolved.
+    """
+    return _group_names.get_or_set(gid, lambda: _resolve(grp and grp.getgrgid, gid, 'gr_name'))
+
+
+def get_user_name(uid):
+    """
+    Resolve the numeric user ID to the user's name using the system's name service.
+
+    Results are cached, so repeated lookups do not hit NSS (e.g. LDAP) again.
+
+    :param uid: The numeric user ID.
+
+    :return str The user's name or the ID as string if it cannot be resolved.
+    """
+    return _user_names.get_or_set(uid, lambda: _resolve(pwd and pwd.getpwuid, uid, 'pw_name'))
+
+
+def get_user_id(user):
+    """
+    Resolve the user name to its numeric ID using the system's name service.
+
+    Results are cached, so repeated lookups do not hit NSS (e.g. LDAP) again.
+
+    :param user: The user's name (numeric IDs are returned as they are).
+
+    :return int The numeric user ID.
+
+    :raises KeyError: If the user does not exist.
+    """
+    return _user_ids.get_or_set(user, lambda: _resolve_id(pwd and pwd.getpwnam, user, 'pw_uid'))
+
+
+def invalidate_name_caches():
+    """
+    Drop all cached user and group names and IDs (e.g. after users have been renamed).
+    """
+    _group_ids.clear()
+    _group_names.clear()
+    _user_ids.clear()
+    _user_names.clear()
+
+
+def tree_usage(path, cache=None, max_workers=None):
+    """
+    Compute the disk usage of the directory tree below (and including) `path`.
+
+    See `trees_usage`.
+
+    :param path: The root of the tree: a path or an open directory descriptor (see `walk_trees`).
+    :param cache: An optional `coco.contract.cache.LRUCache` to reuse results of unchanged directories.
+    :param max_workers: The maximum number of threads to use.
+
+    :return tuple A (size, disk_usage, files, dirs) tuple.
+    """
+    return trees_usage([path], cache=cache, max_workers=max_workers, ignore_missing=False)[path]
+
+
+def trees_usage(paths, cache=None, max_workers=None, ignore_missing=True):
+    """
+    Compute the disk usage of all the directory trees below the given paths in one parallel walk.
+
+    If a cache is given, the contribution of each directory (the size and number of its files and the
+    names of its subdirectories) is stored keyed by its device/inode and validated by its modification time.
+    Unchanged directories are therefore not read again, only their subdirectories are checked.
+    Directories modified within the last seconds are not cached, since further changes might not alter
+    their modification time. Files changed in place do not update their directory's modification time:
+    use a cache with a TTL to bound how long such changes can go unnoticed.
+
+    Hard-linked files are counted once per link.
+
+    :param paths: The roots of the trees: paths or open directory descriptors (see `walk_trees`).
+    :param cache: An optional `coco.contract.cache.LRUCache` to reuse results of unchanged directories.
+    :param max_workers: The maximum number of threads to use.
+    :param ignore_missing: If true, paths that do not exist are left out of the result instead of raising.
+
+    :return dict A dict mapping each (existing) path to a (size, disk_usage, files, dirs) tuple, where
+                 `size` is the apparent size and `disk_usage` the allocated space, both in bytes.
+    """
+    lock = threading.Lock()
+    totals = {}
+
+    def visit(root, dir_fd, rel_path, entries):
+        st = os.fstat(dir_fd)
+        key = (st.st_dev, st.st_ino)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None and cached[0] == st.st_mtime_ns:
+            mtime_ns, size, disk_usage, files, subdirs = cached
+        else:
+            size = disk_usage = files = 0
+            subdirs = []
+            for entry in entries:
+                try:
+                    entry_st = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if stat.S_ISDIR(entry_st.st_mode):
+                    subdirs.append(entry.name)
+                else:
+                    size += entry_st.st_size
+                    disk_usage += entry_st.st_blocks * 512
+                    files += 1
+            subdirs = tuple(subdirs)
+            if cache is not None and time.time_ns() - st.st_mtime_ns > _RACY_MTIME_NS:
+                cache.set(key, (st.st_mtime_ns, size, disk_usage, files, subdirs))
+
+        with lock:
+            total = totals.setdefault(root, [0, 0, 0, 0])
+            total[0] += size + st.st_size
+            total[1] += disk_usage + st.st_blocks * 512
+            total[2] += files
+            total[3] += 1
+        return subdirs
+
+    walk_trees(paths, visit, max_workers=max_workers, ignore_missing=ignore_missing)
+    return {root: tuple(total) for root, total in totals.items()}
+
+
+def walk_tree(path, visit, max_workers=None):
+    """
+    Walk the directory tree below `path`, visiting the directories in parallel.
+
+    `visit(dir_fd, rel_path, entries)` is called for every directory (see `walk_trees`).
+
+    :param path: The root of the tree to walk: a path or an open directory descriptor (see `walk_trees`).
+    :param visit: The visitor callable.
+    :param max_workers: The maximum number of threads to use.
+    """
+    walk_trees([path], lambda root, dir_fd, rel_path, entries: visit(dir_fd, rel_path, entries),
+               max_workers=max_workers)
+
+
+def walk_trees(paths, visit, max_workers=None, ignore_missing=False):
+    """
+    Walk the directory trees below all the given paths, visiting the directories in parallel.
+
+    `visit(root, dir_fd, rel_path, entries)` is called from a worker thread for every directory
+    (including the roots themselves, whose `rel_path` is ''). `root` is the path the directory has been
+    found below, `dir_fd` an open file descriptor of the directory (valid during the call only) and `entries`
+    an iterator over its `os.DirEntry` objects (the directory is only read if the iterator is consumed).
+    The visitor returns the names of the subdirectories to descend into.
+
+    Each root is either a path or an open directory descriptor. Root paths are opened without following
+    a symlink in their last component, but their other components are resolved as usual: callers that must
+    not leave a base directory open the root relative to it themselves and pass the descriptor, which is
+    duplicated (the caller keeps ownership of it). Subdirectories are opened relative to their parent's
+    descriptor and never through a symlink, so paths are not resolved over and over again and the walk
+    cannot be redirected out of the tree.
+    The trees are walked depth-first: a directory's descriptor stays open until its subdirectories have been
+    processed, so the number of open descriptors grows with the depth of the trees and `max_workers`
+    (roughly their product) rather than with their width. Roots are only opened once the walk gets to them,
+    so walking many trees does not hold a descriptor per tree either. Entries disappearing during the walk are
+    skipped. If a visitor raises, no further directories are visited and the exception is re-raised once all
+    running visitors have finished.
+
+    :param paths: The roots of the trees to walk (paths or open directory descriptors).
+    :param visit: The visitor callable (see above).
+    :param max_workers: The maximum number of threads to use (defaults to CPU count + 4, at most 32).
+    :param ignore_missing: If true, root paths that do not exist (or are symlinks) are skipped instead of raising
+                           the `OSError`.
+    """
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+    cond = threading.Condition()
+    # LIFO work stack of (root, parent, name, rel_path) tasks: roots are opened by path once their task runs,
+    # all other directories relative to their parent's shared descriptor
+    stack = [(path, None, path, '') for path in reversed(list(paths))]
+    state = {'active': 0}
+    failures = []
+
+    def discard(root, parent, name, rel_path):
+        if parent is not None:
+            parent.release()
+
+    def process(root, parent, name, rel_path):
+        if parent is None:
+            try:
+                handle = _SharedFd(os.dup(name) if isinstance(name, int) else os.open(name, _DIR_FLAGS))
+            except OSError as ex:
+                if ignore_missing and ex.errno in (errno.ENOENT, errno.ENOTDIR, errno.ELOOP):
+                    return
+                raise
+        else:
+            try:
+                handle = _SharedFd(os.open(name, _DIR_FLAGS, dir_fd=parent.fd))
+            except OSError as ex:
+                if ex.errno in (errno.ENOENT, errno.ENOTDIR, errno.ELOOP):
+                    return
+                raise
+            finally:
+                parent.release()
+        try:
+            children = list(visit(root, handle.fd, rel_path, _scan(handle.fd)) or ())
+            for child in children:
+                handle.acquire()
+        finally:
+            handle.release()
+        with cond:
+            stack.extend((root, handle, child, os.path.join(rel_path, child)) for child in reversed(children))
+            cond.notify(len(children))
+
+    def work():
+        while True:
+            with cond:
+                while not stack and state['active']:
+                    cond.wait()
+                if not stack:
+                    cond.notify_all()
+                    return
+                task = stack.pop()
+                state['active'] += 1
+            try:
+                if failures:
+                    discard(*task)
+                else:
+                    process(*task)
+            except BaseException as ex:
+                failures.append(ex)
+            finally:
+                with cond:
+                    state['active'] -= 1
+                    if not state['active'] and not stack:
+                        cond.notify_all()
+
+    workers = [threading.Thread(target=work, name='coco-walk_%d' % i, daemon=True) for i in range(max_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    if failures:
+        raise failures[0]
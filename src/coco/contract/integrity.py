@@ -0,0 +1,99 @@
+from coco.contract.errors import IntegrityServiceError, IntegrityValidationError
+from coco.contract.services import IntegrityService
+import hashlib
+import hmac
+
+
+def _to_bytes(value, name):
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+    raise IntegrityServiceError("The %s must be a str or bytes-like object, got %s." % (name, type(value).__name__))
+
+
+class _HMACSigner(object):
+
+    """
+    Incremental signer (see `IntegrityService.create_signer`) working on copies of a key's prepared hash states.
+    """
+
+    def __init__(self, context):
+        inner, self._outer = context
+        self._inner = inner.copy()
+
+    def finalize(self):
+        outer = self._outer.copy()
+        outer.update(self._inner.digest())
+        return outer.hexdigest()
+
+    def update(self, chunk):
+        self._inner.update(chunk)
+
+
+class HMACIntegrityService(IntegrityService):
+
+    """
+    Reference integrity service signing with HMAC-SHA256 (RFC 2104).
+
+    Signatures are the hex encoded MACs (`str`). Texts and keys can be `str` (UTF-8 encoded) or bytes-like.
+
+    The keyed context, i.e. the inner and outer hash states having already processed the key's pads,
+    is prepared once per key and kept in the service's key context cache (see `Service.get_key_context`).
+    Every message is signed on copies of these states, so the key setup is not repeated per message.
+    Signatures are compared in constant time.
+    """
+
+    """
+    The name of the hash algorithm (as known to `hashlib`) used for the HMAC.
+    """
+    DIGEST = 'sha256'
+
+    def _mac(self, text, context):
+        """
+        Compute the hex encoded MAC of the text on copies of the prepared context.
+        """
+        inner, outer = context
+        inner = inner.copy()
+        inner.update(_to_bytes(text, 'text'))
+        outer = outer.copy()
+        outer.update(inner.digest())
+        return outer.hexdigest()
+
+    def create_signer(self, key, **kwargs):
+        return _HMACSigner(self.get_key_context(key))
+
+    def prepare_key(self, key):
+        key = _to_bytes(key, 'key')
+        block_size = hashlib.new(self.DIGEST).block_size
+        if len(key) > block_size:
+            key = hashlib.new(self.DIGEST, key).digest()
+        key = bytes(key).ljust(block_size, b'\0')
+        return (
+            hashlib.new(self.DIGEST, bytes(byte ^ 0x36 for byte in key)),
+            hashlib.new(self.DIGEST, bytes(byte ^ 0x5c for byte in key)),
+        )
+
+    def sign(self, text, key, **kwargs):
+        return self._mac(text, self.get_key_context(key))
+
+    def verify(self, text, signature, key, **kwargs):
+        expected = self._mac(text, self.get_key_context(key))
+        if not hmac.compare_digest(expected.encode('ascii'), _to_bytes(signature, 'signature')):
+            raise IntegrityValidationError("The signature does not match the text.")
+        return True
+
+    def verify_many(self, items, key, **kwargs):
+        try:
+            context = self.get_key_context(key)
+        except IntegrityServiceError as ex:
+            return [ex for item in items]
+
+        results = []
+        for text, signature in items:
+            try:
+                expected = self._mac(text, context)
+                results.append(hmac.compare_digest(expected.encode('ascii'), _to_bytes(signature, 'signature')))
+            except IntegrityServiceError as ex:
+                results.append(ex)
+        return results
@@ -0,0 +1,380 @@
+from coco.contract.backends import SnapshotableContainerBackend, SuspendableContainerBackend
+from coco.contract.errors import ContainerBackendError, ContainerImageNotFoundError, ContainerNotFoundError, \
+    ContainerSnapshotNotFoundError, IllegalContainerStateError
+from collections import Counter
+import random
+import threading
+import time
+import uuid
+
+
+def _default_exec_handler(container, cmd):
+    """
+    Default command handler of `MemoryContainerBackend`: echo the command to stdout and exit with 0.
+    """
+    return 0, ('%s\n' % cmd).encode('utf-8'), b''
+
+
+class MemoryContainerBackend(SnapshotableContainerBackend, SuspendableContainerBackend):
+
+    """
+    Thread-safe in-memory container backend implementing the full (snapshotable and suspendable) contract.
+
+    It is meant for tests and load tests of code built on top of the container backends without a real
+    container engine. Every call can be slowed down by an artificial latency and fail randomly
+    with a `coco.contract.errors.ContainerBackendError`, so the overhead of the calling code can be measured
+    separately from the backend and its error handling can be exercised. The latency is spent outside of the
+    backend's lock, so concurrent calls overlap as they would with a real engine.
+
+    Cloning is emulated the way backends without native cloning do it: an image of the original container
+    is created and the clone is based on it, so `create_container(..., clone_of=...)` returns a dict with the
+    `ContainerBackend.CONTAINER_KEY_CLONE_*` fields.
+
+    The number of calls per method is counted in `calls`.
+    """
+
+    def __init__(self, images=(), latency=0.0, jitter=0.0, failure_rate=0.0, failing_methods=None,
+                 exec_handler=None, seed=None, sleep=time.sleep):
+        """
+        Initialize a new, empty in-memory container backend.
+
+        :param images: The names of the images available from the start.
+        :param latency: The number of seconds each call takes.
+        :param jitter: The maximum number of seconds randomly added to the latency of each call.
+        :param failure_rate: The probability (0 to 1) with which a call fails before doing anything.
+        :param failing_methods: The names of the methods failures are injected into (all methods if `None`).
+        :param exec_handler: Callable receiving the container's PK and the command, returning an
+                             (exit_code, stdout, stderr) tuple. Defaults to echoing the command.
+        :param seed: The seed of the random generator used for the jitter and the failures.
+        :param sleep: Callable used to spend the latency.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failing_methods = None if failing_methods is None else frozenset(failing_methods)
+        self.exec_handler = exec_handler or _default_exec_handler
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._sleep = sleep
+        self._lock = threading.RLock()
+        self._containers = {}
+        self._images = {}
+        self._names = set()
+        self._snapshots = {}
+        for image in images:
+            self._images[image] = {self.KEY_PK: image, 'name': image, 'container': None}
+
+    def _container(self, container):
+        """
+        Get the container's record (the caller must hold the lock).
+        """
+        try:
+            return self._containers[container]
+        except KeyError:
+            raise ContainerNotFoundError("Container '%s' does not exist." % container)
+
+    def _create_image(self, record, name):
+        """
+        Create an image of the container's record (the caller must hold the lock).
+        """
+        if name in self._images:
+            raise ContainerBackendError("An image named '%s' already exists." % name)
+        image = {self.KEY_PK: name, 'name': name, 'container': record[self.KEY_PK]}
+        self._images[name] = image
+        return image
+
+    def _describe_container(self, record):
+        """
+        Build the container's description as returned by `get_container` (the caller must hold the lock).
+        """
+        description = dict(record)
+        description['ports'] = list(record['ports'])
+        description['volumes'] = list(record['volumes'])
+        del description['logs']
+        return description
+
+    def _describe_snapshot(self, snapshot):
+        """
+        Build the snapshot's description as returned by `get_container_snapshot`.
+        """
+        return {self.KEY_PK: snapshot[self.KEY_PK], 'name': snapshot['name'], 'container': snapshot['container']}
+
+    def _image(self, image):
+        """
+        Get the image's record (the caller must hold the lock).
+        """
+        try:
+            return self._images[image]
+        except KeyError:
+            raise ContainerImageNotFoundError("Image '%s' does not exist." % image)
+
+    def _log(self, record, message):
+        record['logs'].append(message)
+
+    def _simulate(self, method):
+        """
+        Count the call, spend the artificial latency and inject a failure if the dice say so.
+        """
+        with self._lock:
+            self.calls[method] += 1
+            delay = self.latency
+            if self.jitter:
+                delay += self._random.uniform(0, self.jitter)
+            fail = False
+            if self.failure_rate and (self.failing_methods is None or method in self.failing_methods):
+                fail = self._random.random() < self.failure_rate
+        if delay > 0:
+            self._sleep(delay)
+        if fail:
+            raise ContainerBackendError("Injected failure in '%s'." % method)
+
+    def _snapshot(self, snapshot):
+        """
+        Get the snapshot's record (the caller must hold the lock).
+        """
+        try:
+            return self._snapshots[snapshot]
+        except KeyError:
+            raise ContainerSnapshotNotFoundError("Snapshot '%s' does not exist." % snapshot)
+
+    def container_exists(self, container, **kwargs):
+        self._simulate('container_exists')
+        with self._lock:
+            return container in self._containers
+
+    def container_image_exists(self, image):
+        self._simulate('container_image_exists')
+        with self._lock:
+            return image in self._images
+
+    def container_is_running(self, container, **kwargs):
+        self._simulate('container_is_running')
+        with self._lock:
+            return self._container(container)[self.CONTAINER_KEY_STATUS] == self.CONTAINER_STATUS_RUNNING
+
+    def container_is_suspended(self, container, **kwargs):
+        self._simulate('container_is_suspended')
+        with self._lock:
+            return self._container(container)[self.CONTAINER_KEY_STATUS] == self.CONTAINER_STATUS_SUSPENDED
+
+    def container_snapshot_exists(self, snapshot, **kwargs):
+        self._simulate('container_snapshot_exists')
+        with self._lock:
+            return snapshot in self._snapshots
+
+    def create_container(self, username, uid, name, ports, volumes,
+                         cmd=None, base_url=None, image=None, clone_of=None, **kwargs):
+        self._simulate('create_container')
+        with self._lock:
+            if name in self._names:
+                raise ContainerBackendError("A container named '%s' already exists." % name)
+            clone_image = None
+            if clone_of is not None:
+                original = self._container(clone_of)
+                clone_image = self._create_image(original, uuid.uuid4().hex)
+                image = clone_image[self.KEY_PK]
+            elif image is None:
+                raise ContainerBackendError("Either an image or the container to clone must be given.")
+            else:
+                self._image(image)
+
+            pk = uuid.uuid4().hex
+            self._names.add(name)
+            self._containers[pk] = {
+                self.KEY_PK: pk,
+                self.CONTAINER_KEY_STATUS: self.CONTAINER_STATUS_STOPPED,
+                'name': name,
+                'username': username,
+                'uid': uid,
+                'image': image,
+                'clone_of': clone_of,
+                'cmd': cmd,
+                'base_url': base_url,
+                'ports': list(ports or ()),
+                'volumes': list(volumes or ()),
+                'logs': [],
+            }
+            container = self._describe_container(self._containers[pk])
+            if clone_image is None:
+                return container
+            return {
+                self.CONTAINER_KEY_CLONE_CONTAINER: container,
+                self.CONTAINER_KEY_CLONE_IMAGE: dict(clone_image),
+            }
+
+    def create_container_image(self, container, name, **kwargs):
+        self._simulate('create_container_image')
+        with self._lock:
+            return dict(self._create_image(self._container(container), name))
+
+    def create_container_snapshot(self, container, name, **kwargs):
+        self._simulate('create_container_snapshot')
+        with self._lock:
+            record = self._container(container)
+            for snapshot in self._snapshots.values():
+                if snapshot['container'] == container and snapshot['name'] == name:
+                    raise ContainerBackendError(
+                        "Container '%s' already has a snapshot named '%s'." % (container, name))
+            pk = uuid.uuid4().hex
+            self._snapshots[pk] = {
+                self.KEY_PK: pk,
+                'name': name,
+                'container': container,
+                'state': {key: record[key] for key in ('cmd', 'image', 'ports', 'volumes')},
+            }
+            return self._describe_snapshot(self._snapshots[pk])
+
+    def delete_container(self, container, **kwargs):
+        self._simulate('delete_container')
+        with self._lock:
+            record = self._container(container)
+            if record[self.CONTAINER_KEY_STATUS] != self.CONTAINER_STATUS_STOPPED:
+                raise IllegalContainerStateError("Container '%s' must be stopped to be deleted." % container)
+            del self._containers[container]
+            self._names.discard(record['name'])
+            for pk in [pk for pk, snapshot in self._snapshots.items() if snapshot['container'] == container]:
+                del self._snapshots[pk]
+
+    def delete_container_image(self, image, **kwargs):
+        self._simulate('delete_container_image')
+        with self._lock:
+            self._image(image)
+            if any(record['image'] == image for record in self._containers.values()):
+                raise ContainerBackendError("Image '%s' is in use by a container." % image)
+            del self._images[image]
+
+    def delete_container_snapshot(self, snapshot, **kwargs):
+        self._simulate('delete_container_snapshot')
+        with self._lock:
+            self._snapshot(snapshot)
+            del self._snapshots[snapshot]
+
+    def exec_in_container_stream(self, container, cmd, **kwargs):
+        self._simulate('exec_in_container_stream')
+        with self._lock:
+            if self._container(container)[self.CONTAINER_KEY_STATUS] != self.CONTAINER_STATUS_RUNNING:
+                raise IllegalContainerStateError("Container '%s' is not running." % container)
+        exit_code, stdout, stderr = self.exec_handler(container, cmd)
+        if stdout:
+            yield self.EXEC_STREAM_STDOUT, stdout
+        if stderr:
+            yield self.EXEC_STREAM_STDERR, stderr
+        yield self.EXEC_STREAM_EXIT_CODE, exit_code
+
+    def get_container(self, container, **kwargs):
+        self._simulate('get_container')
+        with self._lock:
+            return self._describe_container(self._container(container))
+
+    def get_container_image(self, image, **kwargs):
+        self._simulate('get_container_image')
+        with self._lock:
+            return dict(self._image(image))
+
+    def get_container_images(self, **kwargs):
+        self._simulate('get_container_images')
+        with self._lock:
+            return [dict(image) for image in self._images.values()]
+
+    def get_container_logs(self, container, **kwargs):
+        self._simulate('get_container_logs')
+        with self._lock:
+            return list(self._container(container)['logs'])
+
+    def get_container_snapshot(self, snapshot, **kwargs):
+        self._simulate('get_container_snapshot')
+        with self._lock:
+            return self._describe_snapshot(self._snapshot(snapshot))
+
+    def get_container_snapshots(self, **kwargs):
+        self._simulate('get_container_snapshots')
+        with self._lock:
+            return [self._describe_snapshot(snapshot) for snapshot in self._snapshots.values()]
+
+    def get_containers(self, only_running=False, **kwargs):
+        self._simulate('get_containers')
+        with self._lock:
+            return [
+                self._describe_container(record) for record in self._containers.values()
+                if not only_running or record[self.CONTAINER_KEY_STATUS] == self.CONTAINER_STATUS_RUNNING
+            ]
+
+    def get_containers_by_pk(self, containers, **kwargs):
+        self._simulate('get_containers_by_pk')
+        with self._lock:
+            return {
+                container: self._describe_container(self._containers[container])
+                for container in containers if container in self._containers
+            }
+
+    def get_containers_snapshots(self, container, **kwargs):
+        self._simulate('get_containers_snapshots')
+        with self._lock:
+            self._container(container)
+            return [
+                self._describe_snapshot(snapshot) for snapshot in self._snapshots.values()
+                if snapshot['container'] == container
+            ]
+
+    def get_status(self):
+        try:
+            self._simulate('get_status')
+        except ContainerBackendError:
+            return self.BACKEND_STATUS_ERROR
+        return self.BACKEND_STATUS_OK
+
+    def restart_container(self, container, **kwargs):
+        self._simulate('restart_container')
+        with self._lock:
+            record = self._container(container)
+            if record[self.CONTAINER_KEY_STATUS] == self.CONTAINER_STATUS_SUSPENDED:
+                raise IllegalContainerStateError("Container '%s' is suspended." % container)
+            record[self.CONTAINER_KEY_STATUS] = self.CONTAINER_STATUS_RUNNING
+            self._log(record, 'Container restarted.')
+
+    def restore_container_snapshot(self, container, snapshot, **kwargs):
+        self._simulate('restore_container_snapshot')
+        with self._lock:
+            record = self._container(container)
+            state = self._snapshot(snapshot)
+            if state['container'] != container:
+                raise ContainerSnapshotNotFoundError(
+                    "Snapshot '%s' does not belong to container '%s'." % (snapshot, container))
+            record.update(state['state'])
+            self._log(record, "Snapshot '%s' restored." % state['name'])
+
+    def resume_container(self, container, **kwargs):
+        self._simulate('resume_container')
+        with self._lock:
+            record = self._container(container)
+            if record[self.CONTAINER_KEY_STATUS] != self.CONTAINER_STATUS_SUSPENDED:
+                raise IllegalContainerStateError("Container '%s' is not suspended." % container)
+            record[self.CONTAINER_KEY_STATUS] = self.CONTAINER_STATUS_RUNNING
+            self._log(record, 'Container resumed.')
+
+    def start_container(self, container):
+        self._simulate('start_container')
+        with self._lock:
+            record = self._container(container)
+            if record[self.CONTAINER_KEY_STATUS] == self.CONTAINER_STATUS_SUSPENDED:
+                raise IllegalContainerStateError("Container '%s' is suspended." % container)
+            if record[self.CONTAINER_KEY_STATUS] != self.CONTAINER_STATUS_RUNNING:
+                record[self.CONTAINER_KEY_STATUS] = self.CONTAINER_STATUS_RUNNING
+                self._log(record, 'Container started.')
+
+    def stop_container(self, container, **kwargs):
+        self._simulate('stop_container')
+        with self._lock:
+            record = self._container(container)
+            if record[self.CONTAINER_KEY_STATUS] != self.CONTAINER_STATUS_STOPPED:
+                record[self.CONTAINER_KEY_STATUS] = self.CONTAINER_STATUS_STOPPED
+                self._log(record, 'Container stopped.')
+
+    def suspend_container(self, container, **kwargs):
+        self._simulate('suspend_container')
+        with self._lock:
+            record = self._container(container)
+            if record[self.CONTAINER_KEY_STATUS] != self.CONTAINER_STATUS_RUNNING:
+                raise IllegalContainerStateError("Container '%s' is not running." % container)
+            record[self.CONTAINER_KEY_STATUS] = self.CONTAINER_STATUS_SUSPENDED
+            self._log(record, 'Container suspended.')
@@ -0,0 +1,268 @@
+from coco.contract.errors import ConnectionError
+from collections import deque
+import contextlib
+import threading
+import time
+
+
+class ConnectionPool(object):
+
+    """
+    Thread-safe pool of backend connections.
+
+    The pool keeps between `min_size` and `max_size` connections open. Idle connections are reused
+    (most recently used first) and closed once they have been idle for longer than `idle_timeout`,
+    as long as more than `min_size` connections are open. Expired connections are closed lazily, whenever
+    a connection is acquired or released: a pool that is not used at all keeps them open until `reap`
+    is called (e.g. periodically by the application's scheduler). If all connections are in use and the pool
+    is full, callers wait up to `timeout` seconds for a connection to be returned before a
+    `coco.contract.errors.ConnectionError` is raised.
+
+    Existing `UserBackend`/`GroupBackend` implementations can be pooled with `ConnectionPool.for_backend`.
+    """
+
+    def __init__(self, connect, disconnect=None, min_size=0, max_size=10, idle_timeout=300.0, timeout=30.0,
+                 health_check=None, clock=time.monotonic):
+        """
+        Initialize a new pool and open `min_size` connections.
+
+        :param connect: Callable without arguments returning a new, established connection.
+        :param disconnect: Optional callable receiving a connection to close.
+        :param min_size: The number of connections to keep open even if idle.
+        :param max_size: The maximum number of open connections.
+        :param idle_timeout: The number of seconds after which idle connections (beyond `min_size`) are closed.
+        :param timeout: The default number of seconds to wait for a connection or `None` to wait forever.
+        :param health_check: Optional callable receiving a connection before it is handed out.
+                             If it returns false (or raises), the connection is discarded.
+        :param clock: Callable returning the current time in seconds.
+        """
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool size (min_size=%s, max_size=%s)." % (min_size, max_size))
+
+        self._connect = connect
+        self._disconnect = disconnect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._health_check = health_check
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+
+        for _ in range(min_size):
+            self._size += 1
+            try:
+                self._idle.append((self._open(), clock()))
+            except BaseException:
+                self.close()
+                raise
+
+    @classmethod
+    def for_backend(cls, backend_factory, credentials, **kwargs):
+        """
+        Create a pool of connected backend instances.
+
+        Each pooled connection is a new instance created with `backend_factory` on which
+        `connect(credentials)` has been called. Connections are closed by calling `disconnect()`.
+
+        :param backend_factory: Callable without arguments returning a new (unconnected) backend instance.
+        :param credentials: The credentials to pass to the backend's `connect` method.
+        :param kwargs: Further arguments for the pool (see `ConnectionPool.__init__`).
+
+        :return ConnectionPool The new pool.
+        """
+        def connect():
+            backend = backend_factory()
+            backend.connect(credentials)
+            return backend
+
+        return cls(connect, disconnect=lambda backend: backend.disconnect(), **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _close_quietly(self, connection):
+        """
+        Close the connection, ignoring errors (the connection is dropped either way).
+        """
+        if self._disconnect is not None:
+            try:
+                self._disconnect(connection)
+            except Exception:
+                pass
+
+    def _is_healthy(self, connection):
+        if self._health_check is None:
+            return True
+        try:
+            return bool(self._health_check(connection))
+        except Exception:
+            return False
+
+    def _open(self):
+        """
+        Open a new connection (the caller must have reserved a slot in `_size`).
+        """
+        try:
+            return self._connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _reap_expired(self):
+        """
+        Remove idle connections exceeding the idle timeout (the caller must hold the lock).
+
+        :return list The removed connections, to be closed outside of the lock.
+        """
+        expired = []
+        if self.idle_timeout is None:
+            return expired
+        now = self._clock()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] >= self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+            self._size -= 1
+        return expired
+
+    def acquire(self, timeout=None):
+        """
+        Check out a connection, waiting for one to become available if the pool is exhausted.
+
+        Every acquired connection must be given back with `release`; prefer using `connection`.
+
+        :param timeout: The number of seconds to wait (defaults to the pool's timeout).
+
+        :return A connection.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else self._clock() + timeout
+
+        while True:
+            connection = None
+            expired = []
+            try:
+                with self._cond:
+                    while True:
+                        if self._closed:
+                            raise ConnectionError("The connection pool is closed.")
+                        expired.extend(self._reap_expired())
+                        if self._idle:
+                            connection = self._idle.pop()[0]
+                            break
+                        if self._size < self.max_size:
+                            self._size += 1
+                            break
+                        remaining = None if deadline is None else deadline - self._clock()
+                        if remaining is not None and remaining <= 0:
+                            raise ConnectionError("No connection available within %s seconds." % timeout)
+                        self._waiting += 1
+                        try:
+                            self._cond.wait(remaining)
+                        finally:
+                            self._waiting -= 1
+            finally:
+                for expired_connection in expired:
+                    self._close_quietly(expired_connection)
+
+            if connection is None:
+                return self._open()
+            if self._is_healthy(connection):
+                return connection
+            self.release(connection, discard=True)
+
+    def close(self):
+        """
+        Close all idle connections and refuse further checkouts.
+
+        Connections currently in use are closed when they are released.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, returned_at in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for connection in idle:
+            self._close_quietly(connection)
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """
+        Check out a connection for the duration of the `with` block.
+
+        If the block raises a `coco.contract.errors.ConnectionError`, the connection
+        is considered broken and discarded instead of being returned to the pool.
+
+        :param timeout: The number of seconds to wait (defaults to the pool's timeout).
+        """
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        except ConnectionError:
+            self.release(connection, discard=True)
+            raise
+        except BaseException:
+            self.release(connection)
+            raise
+        else:
+            self.release(connection)
+
+    def reap(self):
+        """
+        Close the idle connections exceeding the idle timeout now.
+
+        :return int The number of closed connections.
+        """
+        with self._cond:
+            expired = self._reap_expired()
+        for connection in expired:
+            self._close_quietly(connection)
+        return len(expired)
+
+    def release(self, connection, discard=False):
+        """
+        Give a checked out connection back to the pool.
+
+        :param connection: The connection to give back.
+        :param discard: If true, the connection is closed instead of being reused.
+        """
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((connection, self._clock()))
+                connection = None
+            expired = self._reap_expired()
+            self._cond.notify()
+
+        if connection is not None:
+            self._close_quietly(connection)
+        for expired_connection in expired:
+            self._close_quietly(expired_connection)
+
+    def stats(self):
+        """
+        Get a snapshot of the pool's state.
+
+        :return dict A dict with the keys 'size', 'idle', 'in_use', 'waiting', 'min_size' and 'max_size'.
+        """
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
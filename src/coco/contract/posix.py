@@ -0,0 +1,549 @@
+from coco.contract import fs
+from coco.contract.backends import StorageBackend
+from coco.contract.errors import DirectoryNotFoundError, StorageBackendError
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import errno
+import inspect
+import os
+import shutil
+import stat
+import threading
+import uuid
+
+
+"""
+Flags used to open directories (symlinks are never followed).
+"""
+_DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | getattr(os, 'O_CLOEXEC', 0)
+
+"""
+Error numbers meaning that (a component of) the directory does not exist or is not a real directory.
+"""
+_NOT_FOUND_ERRNOS = frozenset([errno.ENOENT, errno.ENOTDIR, errno.ELOOP])
+
+"""
+Whether `shutil.rmtree` accepts a `dir_fd` argument (Python 3.11+).
+"""
+_RMTREE_DIR_FD = 'dir_fd' in inspect.signature(shutil.rmtree).parameters
+
+
+def _rmtree(parent_fd, name, path):
+    """
+    Recursively delete the directory `name` within the directory `parent_fd` (located at `path`).
+    """
+    if _RMTREE_DIR_FD:
+        shutil.rmtree(name, dir_fd=parent_fd)
+        return
+    st = os.stat(name, dir_fd=parent_fd, follow_symlinks=False)
+    if not stat.S_ISDIR(st.st_mode):
+        raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR), name)
+    shutil.rmtree(os.path.join(path, name))
+
+
+class PosixStorageBackend(StorageBackend):
+
+    """
+    Reference storage backend working on the local (POSIX) filesystem.
+
+    The backend keeps a file descriptor on `base_dir` open and performs all operations relative to it
+    (`dir_fd` calls), so the base directory's path is not resolved again for every operation.
+    Directory names are paths relative to `base_dir`. Names that are absolute or contain '..' are rejected
+    with a string check before any system call, and symlinks are never followed, so no operation can escape
+    `base_dir`. Ownership and modes are changed through a descriptor of the opened directory. The recursive
+    changes and the usage accounting walk the trees from such descriptors as well.
+
+    `rm_dir(..., recursive=True, background=True)` renames the directory into the `trash_dir` within
+    `base_dir` and returns in constant time. The trash is then deleted by a pool of background threads.
+    Each directory found in the trash is moved to a trash entry of its own, so even a single large tree is
+    deleted in parallel. Trash left over by a previous process is resumed when the backend is created.
+
+    Call `close` (or use the backend as a context manager) to release the base directory's descriptor.
+    """
+
+    """
+    The number of directories opened at once by `get_dirs_usage`.
+    """
+    USAGE_BATCH_SIZE = 64
+
+    def __init__(self, base_dir, trash_dir='.trash', trash_workers=4):
+        """
+        Initialize a new storage backend instance that will work within 'base_dir'.
+
+        :param base_dir: The base directory within which should be worked.
+        :param trash_dir: The name of the directory (within `base_dir`) used for background deletions.
+        :param trash_workers: The number of threads deleting the trash's content.
+        """
+        super().__init__(base_dir)
+        try:
+            self._base_fd = os.open(base_dir, os.O_RDONLY | os.O_DIRECTORY | getattr(os, 'O_CLOEXEC', 0))
+        except OSError as ex:
+            raise StorageBackendError("Cannot open base directory: %s" % ex)
+
+        self.trash_dir = self._split(trash_dir)[0]
+        self._trash_workers = trash_workers
+        self._trash_fd = None
+        self._trash_executor = None
+        self._trash_closed = False
+        self._trash_cond = threading.Condition()
+        self._trash_pending = set()
+        self.trash_errors = {}
+        if self.dir_exists(self.trash_dir):
+            self.resume_trash()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _delete_trash_entry(self, entry):
+        """
+        Delete the trash entry.
+
+        Its subdirectories are moved to trash entries of their own first, so they are deleted in parallel.
+
+        Failures are recorded in `trash_errors`, the entry stays in the trash until `resume_trash` is called.
+        Once `close` has been called, the entry is left in the trash (see `close`).
+        """
+        try:
+            if self._trash_closed:
+                return
+            try:
+                fd = os.open(entry, _DIR_FLAGS, dir_fd=self._trash_fd)
+            except FileNotFoundError:
+                return
+            except OSError as ex:
+                if ex.errno not in (errno.ENOTDIR, errno.ELOOP):
+                    raise
+                os.unlink(entry, dir_fd=self._trash_fd)
+                return
+            try:
+                with os.scandir(fd) as iterator:
+                    subdirs = [child.name for child in iterator if child.is_dir(follow_symlinks=False)]
+                for name in subdirs:
+                    split_entry = uuid.uuid4().hex
+                    os.rename(name, split_entry, src_dir_fd=fd, dst_dir_fd=self._trash_fd)
+                    self._schedule_trash_entry(split_entry)
+            finally:
+                os.close(fd)
+            _rmtree(self._trash_fd, entry, os.path.join(self.base_dir, self.trash_dir))
+            with self._trash_cond:
+                self.trash_errors.pop(entry, None)
+        except Exception as ex:
+            with self._trash_cond:
+                self.trash_errors[entry] = str(ex)
+        finally:
+            with self._trash_cond:
+                self._trash_pending.discard(entry)
+                self._trash_cond.notify_all()
+
+    @contextlib.contextmanager
+    def _errors(self, dir_name):
+        """
+        Translate `OSError`s raised within the block to the matching `coco.contract.errors` errors.
+        """
+        try:
+            yield
+        except OSError as ex:
+            if ex.errno in _NOT_FOUND_ERRNOS:
+                raise DirectoryNotFoundError("Directory '%s' does not exist." % dir_name)
+            raise StorageBackendError("Operation on directory '%s' failed: %s" % (dir_name, ex))
+
+    def _get_base_fd(self):
+        """
+        Get the base directory's descriptor, raising if the backend has been closed.
+
+        A closed backend must not pass `None` as `dir_fd`, which would resolve names relative to the process'
+        working directory instead of `base_dir`.
+        """
+        fd = self._base_fd
+        if fd is None:
+            raise StorageBackendError("The storage backend has been closed.")
+        return fd
+
+    @contextlib.contextmanager
+    def _open_dir(self, dir_name):
+        """
+        Open the directory itself (without following symlinks) for the duration of the block.
+        """
+        with self._parent(dir_name) as (parent_fd, name):
+            with self._errors(dir_name):
+                fd = os.open(name, _DIR_FLAGS, dir_fd=parent_fd)
+        try:
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _open_trash(self):
+        """
+        Get the descriptor of the trash directory, creating the directory if needed.
+        """
+        with self._trash_cond:
+            if self._trash_closed:
+                raise StorageBackendError("The storage backend has been closed.")
+            if self._trash_fd is None:
+                with self._errors(self.trash_dir):
+                    try:
+                        os.mkdir(self.trash_dir, 0o700, dir_fd=self._get_base_fd())
+                    except FileExistsError:
+                        pass
+                    self._trash_fd = os.open(self.trash_dir, _DIR_FLAGS, dir_fd=self._get_base_fd())
+            return self._trash_fd
+
+    @contextlib.contextmanager
+    def _parent(self, dir_name):
+        """
+        Provide the descriptor of the directory's parent and the directory's last path component.
+
+        For top-level directories (the common case) this is the base directory's descriptor, no system call needed.
+        Intermediate components of nested names are opened one by one without following symlinks.
+        """
+        parts = self._split(dir_name)
+        base_fd = self._get_base_fd()
+        if len(parts) == 1:
+            yield base_fd, parts[0]
+            return
+
+        fd = base_fd
+        try:
+            for part in parts[:-1]:
+                with self._errors(dir_name):
+                    child = os.open(part, _DIR_FLAGS, dir_fd=fd)
+                if fd != base_fd:
+                    os.close(fd)
+                fd = child
+            yield fd, parts[-1]
+        finally:
+            if fd != base_fd:
+                os.close(fd)
+
+    def _schedule_trash_entry(self, entry):
+        """
+        Queue the trash entry for deletion by the background threads.
+
+        Nothing is queued once `close` has been called, the entry is left in the trash to be resumed later.
+        """
+        with self._trash_cond:
+            if self._trash_closed or entry in self._trash_pending:
+                return
+            if self._trash_executor is None:
+                self._trash_executor = ThreadPoolExecutor(max_workers=self._trash_workers,
+                                                          thread_name_prefix='coco-trash')
+            self._trash_pending.add(entry)
+            self._trash_executor.submit(self._delete_trash_entry, entry)
+
+    def _split(self, dir_name):
+        """
+        Split the directory name into its path components, rejecting names escaping the base directory.
+        """
+        if dir_name and '/' not in dir_name and dir_name not in ('.', '..') and '\0' not in dir_name:
+            return [dir_name]
+
+        if not dir_name or dir_name.startswith('/') or '\0' in dir_name:
+            raise StorageBackendError("Invalid directory name '%s'." % dir_name)
+        parts = [part for part in dir_name.split('/') if part and part != '.']
+        if not parts or '..' in parts:
+            raise StorageBackendError("Invalid directory name '%s'." % dir_name)
+        return parts
+
+    def close(self):
+        """
+        Close the base directory's descriptor. The backend cannot be used afterwards: all operations raise
+        a `coco.contract.errors.StorageBackendError`.
+
+        Running background deletions are finished, queued ones are left in the trash
+        to be resumed by the next instance working on the same base directory.
+        """
+        with self._trash_cond:
+            # stops the running deletions from scheduling the trees they split off (see `_schedule_trash_entry`)
+            self._trash_closed = True
+            executor = self._trash_executor
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        with self._trash_cond:
+            self._trash_executor = None
+            self._trash_pending.clear()
+            self._trash_cond.notify_all()
+            # no background thread is left to use the descriptors
+            trash_fd, self._trash_fd = self._trash_fd, None
+            base_fd, self._base_fd = self._base_fd, None
+        if trash_fd is not None:
+            os.close(trash_fd)
+        if base_fd is not None:
+            os.close(base_fd)
+
+    def dir_exists(self, dir_name, **kwargs):
+        """
+        Check if the directory with the given name exists (symlinks to directories do not count).
+
+        :param dir_name: The name of the directory to check.
+        """
+        try:
+            with self._parent(dir_name) as (parent_fd, name):
+                st = os.stat(name, dir_fd=parent_fd, follow_symlinks=False)
+        except (DirectoryNotFoundError, FileNotFoundError, NotADirectoryError):
+            return False
+        return stat.S_ISDIR(st.st_mode)
+
+    def get_dir_info(self, dir_name, **kwargs):
+        """
+        Get the ownership and access mode of the directory with a single `fstatat` call.
+
+        :param dir_name: The directory to get the information for.
+
+        :return dict A dict with all the `StorageBackend.DIR_INFO_KEY_*` fields.
+        """
+        with self._parent(dir_name) as (parent_fd, name):
+            with self._errors(dir_name):
+                st = os.stat(name, dir_fd=parent_fd, follow_symlinks=False)
+        if not stat.S_ISDIR(st.st_mode):
+            raise DirectoryNotFoundError("'%s' is not a directory." % dir_name)
+        return self._stat_to_dir_info(st)
+
+    def get_dirs_usage(self, dir_names, max_workers=None, **kwargs):
+        """
+        Get the disk usage of all the given directories (and everything below them) in one pass.
+
+        Works like the default implementation, but each tree is walked from a descriptor opened relative to
+        `base_dir` without following symlinks. The directories are opened in batches of `USAGE_BATCH_SIZE`,
+        so the number of open descriptors stays bounded for any number of directories.
+
+        :param dir_names: An iterable of directories to get the usage of.
+        :param max_workers: The maximum number of threads to use.
+
+        :return dict A dict mapping each existing directory to its usage (as with `get_dir_usage`).
+                     Directories that do not exist (or are symlinks) are not included.
+        """
+        dir_names = list(dir_names)
+        result = {}
+        for start in range(0, len(dir_names), self.USAGE_BATCH_SIZE):
+            with contextlib.ExitStack() as stack:
+                roots = {}
+                for dir_name in dir_names[start:start + self.USAGE_BATCH_SIZE]:
+                    try:
+                        roots[stack.enter_context(self._open_dir(dir_name))] = dir_name
+                    except DirectoryNotFoundError:
+                        pass
+                try:
+                    usage = fs.trees_usage(list(roots), cache=self._get_usage_cache(), max_workers=max_workers)
+                except OSError as ex:
+                    raise StorageBackendError("Cannot compute directory usage: %s" % ex)
+
+            for fd, (size, disk_usage, files, dirs) in usage.items():
+                result[roots[fd]] = {
+                    self.USAGE_KEY_DIRS: dirs,
+                    self.USAGE_KEY_DISK_USAGE: disk_usage,
+                    self.USAGE_KEY_FILES: files,
+                    self.USAGE_KEY_SIZE: size,
+                }
+        return result
+
+    def get_full_dir_path(self, dir_name, **kwargs):
+        """
+        Get the absolute/full path for the directory.
+
+        :param dir_name: The directory to get the path for.
+        """
+        # the defaults inherited from `StorageBackend` work on this path: they must not outlive the backend either
+        self._get_base_fd()
+        return os.path.join(self.base_dir, *self._split(dir_name))
+
+    def get_pending_deletions(self, **kwargs):
+        """
+        Get the number of trash entries not yet deleted by the background threads.
+
+        Entries left in the trash by `close` are not counted anymore, they are resumed by the next instance.
+
+        :return int The number of pending deletions.
+        """
+        with self._trash_cond:
+            return len(self._trash_pending)
+
+    def mk_dir(self, dir_name, mode=0o777, **kwargs):
+        """
+        Create a directory with the given name (its parent must exist).
+
+        :param dir_name: The name of the directory to create.
+        :param mode: The access mode of the new directory (the process' umask applies).
+        """
+        with self._parent(dir_name) as (parent_fd, name):
+            with self._errors(dir_name):
+                os.mkdir(name, mode, dir_fd=parent_fd)
+
+    def provision_dir(self, dir_name, uid=None, gid=None, mode=None, **kwargs):
+        """
+        Create the directory and set its owner, group and access mode through a single descriptor.
+
+        If a mode is given, the directory is created accessible by the process' user only,
+        so it is never exposed with other permissions than the requested ones.
+        If the owner or mode cannot be set, the new directory is removed again.
+
+        :param dir_name: The name of the directory to create.
+        :param uid: The numeric ID of the owner to set or `None` to keep the default.
+        :param gid: The numeric ID of the group to set or `None` to keep the default.
+        :param mode: The access mode to set or `None` to keep the default.
+        """
+        with self._parent(dir_name) as (parent_fd, name):
+            with self._errors(dir_name):
+                os.mkdir(name, 0o700 if mode is not None else 0o777, dir_fd=parent_fd)
+                if uid is None and gid is None and mode is None:
+                    return
+                try:
+                    fd = os.open(name, _DIR_FLAGS, dir_fd=parent_fd)
+                    try:
+                        if uid is not None or gid is not None:
+                            os.fchown(fd, -1 if uid is None else uid, -1 if gid is None else gid)
+                        if mode is not None:
+                            os.fchmod(fd, mode)
+                    finally:
+                        os.close(fd)
+                except BaseException:
+                    # do not leave a directory with the wrong owner or mode behind
+                    with contextlib.suppress(OSError):
+                        os.rmdir(name, dir_fd=parent_fd)
+                    raise
+
+    def resume_trash(self):
+        """
+        Queue all entries found in the trash for deletion (e.g. left over by a previous process or failed before).
+        """
+        trash_fd = self._open_trash()
+        with self._errors(self.trash_dir):
+            entries = os.listdir(trash_fd)
+        for entry in entries:
+            self._schedule_trash_entry(entry)
+
+    def rm_dir(self, dir_name, recursive=False, background=False, **kwargs):
+        """
+        Delete the directory from the storage backend.
+
+        :param dir_name: The name of the directory to delete.
+        :param recursive: Either to delete recursive or not.
+        :param background: If true (and `recursive` is set), the directory is moved to the trash and
+                           its content is deleted in the background.
+        """
+        parts = self._split(dir_name)
+        if parts[0] == self.trash_dir:
+            raise StorageBackendError("The trash directory cannot be deleted.")
+
+        with self._parent(dir_name) as (parent_fd, name):
+            with self._errors(dir_name):
+                if not recursive:
+                    os.rmdir(name, dir_fd=parent_fd)
+                    return
+                if background:
+                    st = os.stat(name, dir_fd=parent_fd, follow_symlinks=False)
+                    if not stat.S_ISDIR(st.st_mode):
+                        raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR), dir_name)
+                    entry = uuid.uuid4().hex
+                    try:
+                        os.rename(name, entry, src_dir_fd=parent_fd, dst_dir_fd=self._open_trash())
+                    except OSError as ex:
+                        # directories on another filesystem (mount points) cannot be moved to the trash
+                        if ex.errno != errno.EXDEV:
+                            raise
+                    else:
+                        self._schedule_trash_entry(entry)
+                        return
+                _rmtree(parent_fd, name, os.path.dirname(self.get_full_dir_path(dir_name)))
+
+    def set_dir_attributes_recursive(self, dir_name, uid=None, gid=None, mode=None, file_mode=None,
+                                     max_workers=None, **kwargs):
+        """
+        Recursively set the owner, group and/or access mode of the directory and everything below it.
+
+        Works like the default implementation, but the tree is walked from a descriptor opened relative to
+        `base_dir` without following symlinks (see `StorageBackend.set_dir_attributes_recursive`).
+
+        :param dir_name: The directory to change.
+        :param uid: The numeric user ID to set or `None` to keep the owner.
+        :param gid: The numeric group ID to set or `None` to keep the group.
+        :param mode: The access mode to set on directories (and files, unless `file_mode` is given) or `None`.
+        :param file_mode: The access mode to set on files or `None` to use `mode`.
+        :param max_workers: The maximum number of threads to use.
+
+        :return dict A summary with all the `StorageBackend.RECURSIVE_KEY_*` fields.
+        """
+        with self._open_dir(dir_name) as fd:
+            try:
+                changed, unchanged, errors = fs.change_tree(fd, uid=uid, gid=gid, mode=mode, file_mode=file_mode,
+                                                            max_workers=max_workers)
+            except OSError as ex:
+                raise StorageBackendError("Cannot walk directory '%s': %s" % (dir_name, ex))
+
+        return {
+            self.RECURSIVE_KEY_CHANGED: changed,
+            self.RECURSIVE_KEY_ERRORS: errors,
+            self.RECURSIVE_KEY_UNCHANGED: unchanged,
+        }
+
+    def set_dir_gid(self, dir_name, gid, **kwargs):
+        """
+        Set the directory's primary group by numeric ID.
+
+        :param dir_name: The directory to set the group on.
+        :param gid: The numeric group ID.
+        """
+        with self._open_dir(dir_name) as fd:
+            with self._errors(dir_name):
+                os.fchown(fd, -1, gid)
+
+    def set_dir_group(self, dir_name, group, **kwargs):
+        """
+        Set the directory's primary group.
+
+        :param dir_name: The directory to set the group on.
+        :param group: The group to set as primary group.
+        """
+        try:
+            gid = fs.get_group_id(group)
+        except KeyError:
+            raise StorageBackendError("Group '%s' does not exist." % group)
+        self.set_dir_gid(dir_name, gid, **kwargs)
+
+    def set_dir_mode(self, dir_name, mode, **kwargs):
+        """
+        Set the directory's access mode.
+
+        :param dir_name: The directory to set the mode on.
+        :param mode: The access mode to set.
+        """
+        with self._open_dir(dir_name) as fd:
+            with self._errors(dir_name):
+                os.fchmod(fd, mode)
+
+    def set_dir_owner(self, dir_name, owner, **kwargs):
+        """
+        Set the directory's owner.
+
+        :param dir_name: The directory to set the owner on.
+        :param owner: The user to set as an owner.
+        """
+        try:
+            uid = fs.get_user_id(owner)
+        except KeyError:
+            raise StorageBackendError("User '%s' does not exist." % owner)
+        self.set_dir_uid(dir_name, uid, **kwargs)
+
+    def set_dir_uid(self, dir_name, uid, **kwargs):
+        """
+        Set the directory's owner by numeric ID.
+
+        :param dir_name: The directory to set the owner on.
+        :param uid: The user's numeric ID.
+        """
+        with self._open_dir(dir_name) as fd:
+            with self._errors(dir_name):
+                os.fchown(fd, uid, -1)
+
+    def wait_for_deletions(self, timeout=None, **kwargs):
+        """
+        Wait until the background threads have deleted all trash entries.
+
+        :param timeout: The maximum number of seconds to wait or `None` to wait forever.
+
+        :return bool `True` if there are no pending deletions anymore, `False` if the timeout expired.
+        """
+        with self._trash_cond:
+            return self._trash_cond.wait_for(lambda: not self._trash_pending, timeout)
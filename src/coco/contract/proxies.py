@@ -0,0 +1,738 @@
+from coco.contract.backends import ContainerBackend
+from coco.contract.cache import LRUCache
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+
+"""
+Sentinel used to detect cache misses (`None` is a valid value to cache).
+"""
+_MISSING = object()
+
+
+def freeze_kwargs(kwargs):
+    """
+    Turn keyword arguments into a tuple that can be used as (part of) a cache key.
+
+    :param kwargs: The keyword arguments to freeze.
+
+    :return tuple The sorted (name, value) pairs.
+    """
+    return tuple(sorted(kwargs.items()))
+
+
+def is_hashable(key):
+    """
+    Check if the key can be used for dict lookups.
+
+    :param key: The key to check.
+
+    :return bool `True` if the key is hashable, `False` otherwise.
+    """
+    try:
+        hash(key)
+    except TypeError:
+        return False
+    return True
+
+
+class BackendProxy(object):
+
+    """
+    Base class for wrappers around a backend or service instance.
+
+    Every attribute not defined on the proxy itself is looked up on the wrapped instance,
+    so a proxy can be used in place of the wrapped object (including its constants and
+    the methods of more specific contracts like `SnapshotableContainerBackend`).
+
+    The proxy reports the wrapped instance's class as its `__class__`, so `isinstance` checks against
+    the contracts (e.g. by `coco.contract.aio.to_async`) see through (nested) proxies. `type(proxy)` remains
+    the proxy's class, so checks against the outermost proxy's class still work.
+    """
+
+    def __init__(self, backend):
+        """
+        Initialize a new proxy for `backend`.
+
+        :param backend: The backend (or service) instance to wrap.
+        """
+        self.backend = backend
+
+    @property
+    def __class__(self):
+        return self.backend.__class__
+
+    def __getattr__(self, name):
+        if name == 'backend':
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+
+class CachingContainerBackend(BackendProxy):
+
+    """
+    Read-through cache in front of any `ContainerBackend` implementation.
+
+    The results of `get_container`, `get_containers`, `get_containers_by_pk` (and the bulk methods built
+    on top of it), `get_container_image`, `get_container_images` and `container_image_exists` are served
+    from a bounded TTL/LRU cache. Calls made through the proxy that change a container or an image
+    invalidate the affected entries. Changes made by bypassing the proxy are picked up once the TTL expires.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    """
+    Methods changing the container passed as their first argument.
+    """
+    CONTAINER_WRITE_METHODS = frozenset([
+        'delete_container',
+        'restart_container',
+        'restore_container_snapshot',
+        'resume_container',
+        'start_container',
+        'stop_container',
+        'suspend_container',
+    ])
+
+    """
+    Methods changing the list of available images.
+    """
+    IMAGE_WRITE_METHODS = frozenset([
+        'create_container_image',
+        'delete_container_image',
+    ])
+
+    """
+    Cache key prefixes of the image related entries.
+    """
+    _IMAGE_KINDS = frozenset(['image', 'image_exists', 'images'])
+
+    def __init__(self, backend, max_size=1024, ttl=5.0):
+        """
+        Initialize a new caching proxy for `backend`.
+
+        :param backend: The container backend to wrap.
+        :param max_size: The maximum number of cached entries.
+        :param ttl: The number of seconds a cached entry is served before it gets fetched again.
+        """
+        super().__init__(backend)
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = super().__getattr__(name)
+        if name in self.CONTAINER_WRITE_METHODS:
+            return self._invalidating(attr, 'container', self.invalidate_container)
+        if name in self.IMAGE_WRITE_METHODS:
+            return self._invalidating(attr, 'image', lambda image: self.invalidate_images())
+        return attr
+
+    def _cached(self, key, fetch):
+        """
+        Return the cached value for `key` or fetch and store it on a miss.
+
+        Values fetched while an invalidation happened are returned but not stored,
+        so a concurrent write cannot be hidden by a stale read.
+        """
+        if not is_hashable(key):
+            return fetch()
+
+        value = self.cache.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            value = fetch()
+            self._store(generation, [(key, value)])
+        return value
+
+    def _invalidate(self, predicate):
+        with self._lock:
+            self._generation += 1
+            return self.cache.invalidate_if(predicate)
+
+    def _invalidating(self, method, arg_name, invalidate):
+        """
+        Wrap the write method so the resource passed as first argument (or `arg_name`) is invalidated afterwards.
+        """
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            target = args[0] if args else kwargs.get(arg_name)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                invalidate(target)
+        return wrapper
+
+    def _store(self, generation, items):
+        with self._lock:
+            if generation == self._generation:
+                for key, value in items:
+                    self.cache.set(key, value)
+
+    def container_image_exists(self, image):
+        """
+        Cached version of `ContainerBackend.container_image_exists`.
+        """
+        return self._cached(('image_exists', image), lambda: self.backend.container_image_exists(image))
+
+    def create_container(self, *args, **kwargs):
+        """
+        Create the container on the wrapped backend and invalidate the container lists.
+
+        If the container is a clone, the images are invalidated as well since the backend
+        might have created an image for it.
+        """
+        # `clone_of` is the 9th positional argument of `ContainerBackend.create_container`
+        clone_of = args[8] if len(args) > 8 else kwargs.get('clone_of')
+        try:
+            return self.backend.create_container(*args, **kwargs)
+        finally:
+            self._invalidate(lambda key: key[0] == 'containers')
+            if clone_of is not None:
+                self.invalidate_images()
+
+    def get_container(self, container, **kwargs):
+        """
+        Cached version of `ContainerBackend.get_container`.
+        """
+        return self._cached(
+            ('container', container, freeze_kwargs(kwargs)),
+            lambda: self.backend.get_container(container, **kwargs)
+        )
+
+    def get_container_image(self, image, **kwargs):
+        """
+        Cached version of `ContainerBackend.get_container_image`.
+        """
+        return self._cached(
+            ('image', image, freeze_kwargs(kwargs)),
+            lambda: self.backend.get_container_image(image, **kwargs)
+        )
+
+    def get_container_images(self, **kwargs):
+        """
+        Cached version of `ContainerBackend.get_container_images`.
+        """
+        return self._cached(
+            ('images', freeze_kwargs(kwargs)),
+            lambda: self.backend.get_container_images(**kwargs)
+        )
+
+    def get_containers(self, only_running=False, **kwargs):
+        """
+        Cached version of `ContainerBackend.get_containers`.
+        """
+        return self._cached(
+            ('containers', only_running, freeze_kwargs(kwargs)),
+            lambda: self.backend.get_containers(only_running=only_running, **kwargs)
+        )
+
+    def get_containers_by_pk(self, containers, **kwargs):
+        """
+        Cached version of `ContainerBackend.get_containers_by_pk`.
+
+        Containers found in the cache (e.g. from previous `get_container` calls) are served from there,
+        all others are fetched with a single call to the wrapped backend.
+        """
+        frozen = freeze_kwargs(kwargs)
+        if not is_hashable(frozen):
+            return self.backend.get_containers_by_pk(containers, **kwargs)
+
+        found = {}
+        missing = []
+        for container in containers:
+            value = self.cache.get(('container', container, frozen), _MISSING)
+            if value is _MISSING:
+                missing.append(container)
+            else:
+                found[container] = value
+
+        if missing:
+            generation = self._generation
+            fetched = self.backend.get_containers_by_pk(missing, **kwargs)
+            self._store(generation, [(('container', pk, frozen), value) for pk, value in fetched.items()])
+            found.update(fetched)
+        return found
+
+    containers_are_running = ContainerBackend.containers_are_running
+    containers_exist = ContainerBackend.containers_exist
+    get_containers_status = ContainerBackend.get_containers_status
+
+    def invalidate_all(self):
+        """
+        Drop all cached entries.
+        """
+        self._invalidate(lambda key: True)
+
+    def invalidate_container(self, container=None):
+        """
+        Drop the cached entries of `container` and all cached container lists.
+
+        :param container: The container to invalidate or `None` to invalidate all containers.
+        """
+        def predicate(key):
+            if key[0] == 'containers':
+                return True
+            return key[0] == 'container' and (container is None or key[1] == container)
+
+        self._invalidate(predicate)
+
+    def invalidate_images(self):
+        """
+        Drop all cached image entries.
+        """
+        self._invalidate(lambda key: key[0] in self._IMAGE_KINDS)
+
+
+class CachingGroupBackend(BackendProxy):
+
+    """
+    In-process membership index in front of any `GroupBackend` implementation.
+
+    The index maps each group to the set of its members and each user to the set of its groups.
+    It is filled from `get_group_members` (and `iter_groups` where all groups are needed), so
+    `is_group_member` is answered with a set lookup once a group has been loaded.
+
+    Each group's members are reloaded once they are older than `ttl` seconds, the group list
+    is reloaded on the same schedule. Only expired groups are fetched again. Membership changes made
+    through the proxy are applied to the index immediately.
+    """
+
+    def __init__(self, backend, ttl=60.0, clock=time.monotonic):
+        """
+        Initialize a new membership index for `backend`.
+
+        :param backend: The group backend to wrap.
+        :param ttl: The number of seconds loaded memberships are used before they get fetched again.
+        :param clock: Callable returning the current time in seconds.
+        """
+        super().__init__(backend)
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._members = {}
+        self._members_loaded_at = {}
+        self._groups_of = {}
+        self._groups = None
+        self._groups_loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def _drop_group(self, group):
+        """
+        Remove the group from the index (the caller must hold the lock).
+        """
+        for user in self._members.pop(group, ()):
+            self._unlink(group, user)
+        self._members_loaded_at.pop(group, None)
+        if self._groups is not None:
+            self._groups.pop(group, None)
+
+    def _ensure_all_groups(self):
+        """
+        Make sure the group list and the members of all groups are loaded and not expired.
+        """
+        with self._lock:
+            groups_expired = self._groups is None or self._is_expired(self._groups_loaded_at)
+            generation = self._generation
+        if groups_expired:
+            records = {record.get(self.FIELD_PK): record for record in self.backend.iter_groups()}
+            with self._lock:
+                if generation == self._generation:
+                    for group in set(self._members) - set(records):
+                        self._drop_group(group)
+                    self._groups = records
+                    self._groups_loaded_at = self._clock()
+
+        with self._lock:
+            groups = list(self._groups or ())
+        for group in groups:
+            with self._lock:
+                fresh = group in self._members and not self._is_expired(self._members_loaded_at[group])
+            if not fresh:
+                self._load_members(group)
+
+    def _index_add(self, group, users):
+        with self._lock:
+            self._generation += 1
+            if group in self._members:
+                for user in users:
+                    self._members[group].add(user)
+                    self._groups_of.setdefault(user, set()).add(group)
+
+    def _index_remove(self, group, users):
+        with self._lock:
+            self._generation += 1
+            members = self._members.get(group)
+            if members is not None:
+                for user in users:
+                    if user in members:
+                        members.discard(user)
+                        self._unlink(group, user)
+
+    def _is_expired(self, loaded_at):
+        return self.ttl is not None and self._clock() - loaded_at >= self.ttl
+
+    def _load_members(self, group):
+        """
+        Fetch the group's members from the wrapped backend and store them in the index.
+
+        Results fetched while the index was changed are returned but not stored.
+
+        :return tuple A (members, users) tuple of the backend's result and the set of member identifiers.
+        """
+        generation = self._generation
+        members = self.backend.get_group_members(group)
+        users = set(self._member_key(member) for member in members)
+        with self._lock:
+            self.refreshes += 1
+            if generation == self._generation:
+                for user in self._members.get(group, set()) - users:
+                    self._unlink(group, user)
+                for user in users:
+                    self._groups_of.setdefault(user, set()).add(group)
+                self._members[group] = users
+                self._members_loaded_at[group] = self._clock()
+        return members, users
+
+    def _member_key(self, member):
+        """
+        Get the identifier of a member as returned by `get_group_members`.
+        """
+        if isinstance(member, dict):
+            return member.get(self.FIELD_PK)
+        return member
+
+    def _unlink(self, group, user):
+        """
+        Remove the group from the user's reverse index entry (the caller must hold the lock).
+        """
+        groups = self._groups_of.get(user)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self._groups_of[user]
+
+    def add_group_member(self, group, user, **kwargs):
+        """
+        Add the user to the group and to the index.
+        """
+        self.backend.add_group_member(group, user, **kwargs)
+        self._index_add(group, [user])
+
+    def add_group_members(self, group, users, **kwargs):
+        """
+        Add the users to the group and to the index.
+        """
+        users = list(users)
+        self.backend.add_group_members(group, users, **kwargs)
+        self._index_add(group, users)
+
+    def create_group(self, gid, name, **kwargs):
+        """
+        Create the group and mark the group list for reloading.
+        """
+        try:
+            return self.backend.create_group(gid, name, **kwargs)
+        finally:
+            with self._lock:
+                self._generation += 1
+                self._groups_loaded_at = None
+                self._groups = None
+
+    def delete_group(self, group, **kwargs):
+        """
+        Delete the group and remove it from the index.
+        """
+        try:
+            return self.backend.delete_group(group, **kwargs)
+        finally:
+            with self._lock:
+                self._generation += 1
+                self._drop_group(group)
+
+    def get_group_members(self, group, **kwargs):
+        """
+        Get the group's members from the wrapped backend and refresh the index with them.
+        """
+        if kwargs:
+            return self.backend.get_group_members(group, **kwargs)
+        return self._load_members(group)[0]
+
+    def get_user_groups(self, user, **kwargs):
+        """
+        Get the user's groups from the index (loading all expired groups first).
+        """
+        if kwargs:
+            return self.backend.get_user_groups(user, **kwargs)
+        self._ensure_all_groups()
+        with self._lock:
+            groups = self._groups or {}
+            return [groups[group] for group in self._groups_of.get(user, ()) if group in groups]
+
+    def invalidate(self):
+        """
+        Drop the whole index.
+        """
+        with self._lock:
+            self._generation += 1
+            self._members.clear()
+            self._members_loaded_at.clear()
+            self._groups_of.clear()
+            self._groups = None
+            self._groups_loaded_at = None
+
+    def is_group_member(self, group, user, **kwargs):
+        """
+        Check the membership using the index (loading the group's members if missing or expired).
+        """
+        if kwargs:
+            return self.backend.is_group_member(group, user, **kwargs)
+        with self._lock:
+            members = self._members.get(group)
+            if members is not None and not self._is_expired(self._members_loaded_at[group]):
+                self.hits += 1
+                return user in members
+            self.misses += 1
+        return user in self._load_members(group)[1]
+
+    def remove_group_member(self, group, user, **kwargs):
+        """
+        Remove the user from the group and from the index.
+        """
+        self.backend.remove_group_member(group, user, **kwargs)
+        self._index_remove(group, [user])
+
+    def remove_group_members(self, group, users, **kwargs):
+        """
+        Remove the users from the group and from the index.
+        """
+        users = list(users)
+        self.backend.remove_group_members(group, users, **kwargs)
+        self._index_remove(group, users)
+
+    def remove_user_from_all_groups(self, user, **kwargs):
+        """
+        Remove the user from all groups and from the index.
+        """
+        self.backend.remove_user_from_all_groups(user, **kwargs)
+        with self._lock:
+            self._generation += 1
+            for group in self._groups_of.pop(user, ()):
+                self._members[group].discard(user)
+
+    def stats(self):
+        """
+        Get a snapshot of the index's counters.
+
+        :return dict A dict with the keys 'hits', 'misses', 'refreshes', 'groups' and 'users'.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'groups': len(self._members),
+                'users': len(self._groups_of),
+            }
+
+
+class InstrumentedBackend(BackendProxy):
+
+    """
+    Instrumenting wrapper around any backend or service instance.
+
+    For every public method called through the proxy, the number of calls, the errors by exception class
+    (e.g. 'ContainerNotFoundError') and a latency histogram are recorded. Generator methods
+    (e.g. `iter_containers`) are measured until the generator is exhausted or closed.
+
+    Metrics and tracing sinks are attached with hooks:
+    listeners are called after every call with (method, duration, error), `tracer(method)` returns a context
+    manager wrapped around every (non-generator) call, e.g. to open a tracing span, and `on_slow` is called with
+    (method, duration, args, kwargs) for calls taking at least `slow_threshold` seconds.
+
+    Method lookups are cached on the proxy, so the wrapped instance's methods are resolved once.
+    While the proxy is disabled, the wrapped instance's methods are handed out as they are, so the
+    instrumentation costs nothing but the proxy's attribute lookup.
+    """
+
+    """
+    Default upper bounds (in seconds) of the latency histogram's buckets.
+    """
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, backend, enabled=True, listeners=(), tracer=None, slow_threshold=None, on_slow=None,
+                 buckets=LATENCY_BUCKETS, clock=time.perf_counter):
+        """
+        Initialize a new instrumenting proxy for `backend`.
+
+        :param backend: The backend (or service) instance to wrap.
+        :param enabled: Whether calls are instrumented from the start.
+        :param listeners: Callables receiving the method's name, the call's duration in seconds and
+                          the raised exception (or `None`) after every call.
+        :param tracer: Optional callable receiving the method's name and returning a context manager
+                       to wrap the call in.
+        :param slow_threshold: The number of seconds from which on calls are considered slow (`None` to disable).
+        :param on_slow: Optional callable receiving the method's name, the call's duration and its arguments
+                        for every slow call.
+        :param buckets: The sorted upper bounds (in seconds) of the latency histogram's buckets.
+        :param clock: Callable returning the current time in seconds.
+        """
+        super().__init__(backend)
+        self.listeners = list(listeners)
+        self.tracer = tracer
+        self.slow_threshold = slow_threshold
+        self.on_slow = on_slow
+        self.buckets = tuple(buckets)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._methods = {}
+        self._cached_names = set()
+        self._enabled = enabled
+
+    def __getattr__(self, name):
+        attr = super().__getattr__(name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        if self._enabled:
+            if inspect.isgeneratorfunction(attr):
+                attr = self._instrument_generator(name, attr)
+            else:
+                attr = self._instrument(name, attr)
+        # cache the method on the proxy, so later lookups do not pass through `__getattr__` again
+        self.__dict__[name] = attr
+        self._cached_names.add(name)
+        return attr
+
+    def _forget_methods(self):
+        """
+        Drop the cached methods, so they are looked up (and wrapped, if enabled) again.
+        """
+        for name in list(self._cached_names):
+            self.__dict__.pop(name, None)
+            self._cached_names.discard(name)
+
+    def _instrument(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = self._clock()
+            error = None
+            try:
+                if self.tracer is None:
+                    return method(*args, **kwargs)
+                with self.tracer(name):
+                    return method(*args, **kwargs)
+            except Exception as ex:
+                error = ex
+                raise
+            finally:
+                self._record(name, self._clock() - start, error, args, kwargs)
+
+        return wrapper
+
+    def _instrument_generator(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = self._clock()
+            error = None
+            try:
+                yield from method(*args, **kwargs)
+            except Exception as ex:
+                error = ex
+                raise
+            finally:
+                self._record(name, self._clock() - start, error, args, kwargs)
+
+        return wrapper
+
+    def _record(self, name, duration, error, args, kwargs):
+        """
+        Account the call and notify the hooks.
+        """
+        slow = self.slow_threshold is not None and duration >= self.slow_threshold
+        with self._lock:
+            stats = self._methods.get(name)
+            if stats is None:
+                stats = self._methods[name] = {
+                    'calls': 0,
+                    'errors': {},
+                    'slow': 0,
+                    'total': 0.0,
+                    'max': 0.0,
+                    'counts': [0] * (len(self.buckets) + 1),
+                }
+            stats['calls'] += 1
+            stats['total'] += duration
+            stats['max'] = max(stats['max'], duration)
+            stats['counts'][bisect.bisect_left(self.buckets, duration)] += 1
+            if error is not None:
+                error_name = type(error).__name__
+                stats['errors'][error_name] = stats['errors'].get(error_name, 0) + 1
+            if slow:
+                stats['slow'] += 1
+
+        # a failing sink must never break the backend call it reports on
+        if slow and self.on_slow is not None:
+            try:
+                self.on_slow(name, duration, args, kwargs)
+            except Exception:
+                pass
+        for listener in self.listeners:
+            try:
+                listener(name, duration, error)
+            except Exception:
+                pass
+
+    def disable(self):
+        """
+        Stop instrumenting calls (calls already running are still recorded).
+        """
+        self._enabled = False
+        self._forget_methods()
+
+    def enable(self):
+        """
+        Start instrumenting calls.
+        """
+        self._enabled = True
+        self._forget_methods()
+
+    @property
+    def enabled(self):
+        """
+        Whether calls are currently instrumented.
+        """
+        return self._enabled
+
+    def reset_stats(self):
+        """
+        Drop all recorded metrics.
+        """
+        with self._lock:
+            self._methods.clear()
+
+    def stats(self):
+        """
+        Get a snapshot of the recorded metrics.
+
+        :return dict A dict mapping each called method's name to a dict with the keys 'calls', 'errors' (a dict
+                     mapping exception class names to counts), 'slow', 'total', 'mean' and 'max' (in seconds),
+                     'buckets' (the histogram's upper bounds) and 'counts' (the number of calls per bucket,
+                     with an additional last entry for calls slower than the last bound).
+        """
+        with self._lock:
+            return {
+                name: dict(
+                    stats,
+                    errors=dict(stats['errors']),
+                    counts=list(stats['counts']),
+                    mean=stats['total'] / stats['calls'],
+                    buckets=list(self.buckets),
+                )
+                for name, stats in self._methods.items()
+            }
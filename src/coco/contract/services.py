@@ -1,10 +1,289 @@
+from coco.contract.cache import LRUCache
+from coco.contract.errors import EncryptionServiceError, IntegrityServiceError, IntegrityValidationError
+import hashlib
+import hmac
+import mmap
+import os
+import struct
+import threading
+
+
+"""
+The number of bytes read at once from file-like objects by `iter_chunks`.
+"""
+CHUNK_SIZE = 1024 * 1024
+
+"""
+Per-process secret used by `Service.key_fingerprint`, so fingerprints cannot be matched against guessed keys.
+"""
+_FINGERPRINT_SECRET = os.urandom(32)
+
+"""
+Lock serializing the creation of the services' key context caches (see `Service._get_key_contexts`).
+"""
+_KEY_CONTEXTS_LOCK = threading.Lock()
+
+
+def _read_all(data):
+    """
+    Read all of `data` (see `iter_chunks`) into memory.
+    """
+    content = bytearray()
+    for chunk in iter_chunks(data):
+        content += chunk
+    return bytes(content)
+
+
+def _read_exactly(source, size):
+    """
+    Read `size` bytes from the file-like object (less only at the end of the data).
+    """
+    data = source.read(size)
+    if data is None or len(data) == size or not data:
+        return data or b''
+    parts = [data]
+    remaining = size - len(data)
+    while remaining:
+        part = source.read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b''.join(parts)
+
+
+def _to_bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def iter_chunks(data, chunk_size=CHUNK_SIZE):
+    """
+    Iterate over the content of `data` in chunks of bytes, without loading it into memory at once.
+
+    `data` can be a path (`str` or path-like object), a file-like object, a single `bytes`-like object or
+    an iterable of chunks (`str` chunks are UTF-8 encoded). Files given by path are memory-mapped and
+    yielded as a single (lazily paged in) buffer. File-like objects are read into a reused buffer,
+    so each chunk is only valid until the next one is requested.
+
+    :param data: The data to iterate over.
+    :param chunk_size: The number of bytes to read at once from file-like objects.
+
+    :return generator A generator yielding bytes-like objects.
+    """
+    if isinstance(data, (str, os.PathLike)):
+        with open(data, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, 'madvise'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapped) as view:
+                    yield view
+    elif isinstance(data, (bytes, bytearray, memoryview, mmap.mmap)):
+        yield data
+    elif hasattr(data, 'readinto'):
+        buffer = bytearray(chunk_size)
+        with memoryview(buffer) as view:
+            while True:
+                size = data.readinto(buffer)
+                if not size:
+                    return
+                yield view[:size]
+    elif hasattr(data, 'read'):
+        while True:
+            chunk = data.read(chunk_size)
+            if not chunk:
+                return
+            yield _to_bytes(chunk)
+    else:
+        for chunk in data:
+            yield _to_bytes(chunk)
+
+
+class _DigestVerifier(object):
+
+    """
+    Verifier (see `IntegrityService.create_verifier`) recomputing the signature with a signer.
+    """
+
+    def __init__(self, signer, signature):
+        self._signer = signer
+        self._signature = signature
+
+    def update(self, chunk):
+        self._signer.update(chunk)
+
+    def verify(self):
+        if not hmac.compare_digest(_to_bytes(self._signer.finalize()), _to_bytes(self._signature)):
+            raise IntegrityValidationError("The signature does not match the data.")
+        return True
+
+
 class Service(object):
 
     """
     The interface defines a service in the sense of 'a resource that can be used for only a handful of jobs'.
+
+    Services working with keys can prepare a key once (e.g. derive the actual key and set up the
+    cipher/HMAC context) by implementing `prepare_key` and use `get_key_context` to get the prepared context.
+    Prepared contexts are kept in a bounded LRU cache keyed by a fingerprint of the key, never the key itself.
     """
 
-    pass
+    """
+    The maximum number of prepared key contexts kept by `get_key_context`.
+    """
+    KEY_CONTEXT_CACHE_SIZE = 128
+
+    """
+    The number of seconds a prepared key context is kept (`None` to keep it until it is evicted).
+    """
+    KEY_CONTEXT_CACHE_TTL = None
+
+    def _get_key_contexts(self):
+        """
+        Get the cache of the prepared key contexts (created on first use).
+
+        The cache and the per-thread memo of the last used context are created under a lock,
+        so threads using the service concurrently for the first time share them.
+        """
+        cache = getattr(self, '_key_contexts', None)
+        if cache is None:
+            with _KEY_CONTEXTS_LOCK:
+                cache = getattr(self, '_key_contexts', None)
+                if cache is None:
+                    self._key_contexts_lock = threading.Lock()
+                    self._key_context_memo = threading.local()
+                    self._key_context_memo_hits = 0
+                    self._key_context_memo_counters = {}
+                    cache = self._key_contexts = LRUCache(max_size=self.KEY_CONTEXT_CACHE_SIZE,
+                                                          ttl=self.KEY_CONTEXT_CACHE_TTL)
+        return cache
+
+    def _new_memo_counter(self):
+        """
+        Register a memo hit counter for the current thread.
+
+        Each thread only increments its own counter, so memo hits are counted without a shared lock. The counters
+        are registered by thread id: the counter a previous memo (or a finished thread with the same id) left
+        behind is folded into the running total, so the registry stays as small as the set of live threads.
+
+        :return list The one-item list holding the thread's hit count.
+        """
+        counter = [0]
+        with self._key_contexts_lock:
+            previous = self._key_context_memo_counters.get(threading.get_ident())
+            if previous is not None:
+                self._key_context_memo_hits += previous[0]
+            self._key_context_memo_counters[threading.get_ident()] = counter
+        return counter
+
+    def _reset_key_context_memo(self):
+        """
+        Drop the contexts remembered by all threads (the memo is replaced, releasing all the threads' entries).
+        """
+        self._key_context_memo = threading.local()
+
+    def clear_key_contexts(self):
+        """
+        Drop all prepared key contexts (e.g. after keys have been rotated).
+        """
+        self._get_key_contexts().clear()
+        self._reset_key_context_memo()
+
+    def get_key_context(self, key):
+        """
+        Get the context prepared for the key with `prepare_key`, preparing it on first use.
+
+        Only `str` and bytes-like keys are cached, contexts for other keys are prepared on every call.
+        Each thread remembers the last `str` or `bytes` key object it used with its context, so callers passing
+        the same key over and over (the common case) skip both the fingerprint and the cache lookup. The memo is
+        dropped by `clear_key_contexts` and `invalidate_key_context`, and only used without a
+        `KEY_CONTEXT_CACHE_TTL`, so a remembered context never outlives its cache entry.
+
+        :param key: The key to get the context for.
+
+        :return The prepared context.
+        """
+        memo = getattr(self, '_key_context_memo', None)
+        last = getattr(memo, 'entry', None)
+        if last is not None and last[0] is key:
+            last[2][0] += 1
+            return last[1]
+
+        cache = self._get_key_contexts()
+        fingerprint = self.key_fingerprint(key)
+        if fingerprint is None:
+            return self.prepare_key(key)
+        if cache.ttl is not None:
+            return cache.get_or_set(fingerprint, lambda: self.prepare_key(key))
+
+        memo = self._key_context_memo
+        context = cache.get_or_set(fingerprint, lambda: self.prepare_key(key))
+        if type(key) in (str, bytes):
+            last = getattr(memo, 'entry', None)
+            memo.entry = (key, context, last[2] if last is not None else self._new_memo_counter())
+        return context
+
+    def get_key_context_stats(self):
+        """
+        Get a snapshot of the key context cache's counters (e.g. to size `KEY_CONTEXT_CACHE_SIZE`).
+
+        :return dict A dict with the keys 'hits', 'misses', 'evictions', 'expirations', 'size', 'max_size'
+                     and 'hit_rate'. The hits include the lookups served by the threads' last used contexts.
+        """
+        stats = self._get_key_contexts().stats()
+        with self._key_contexts_lock:
+            stats['hits'] += self._key_context_memo_hits
+            stats['hits'] += sum(counter[0] for counter in self._key_context_memo_counters.values())
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = float(stats['hits']) / lookups if lookups else 0.0
+        return stats
+
+    def invalidate_key_context(self, key):
+        """
+        Drop the prepared context of the key (e.g. after the key has been revoked).
+
+        :param key: The key to drop the context of.
+
+        :return bool `True` if a context has been dropped, `False` otherwise.
+        """
+        cache = self._get_key_contexts()
+        fingerprint = self.key_fingerprint(key)
+        if fingerprint is None:
+            return False
+        invalidated = cache.invalidate(fingerprint)
+        self._reset_key_context_memo()
+        return invalidated
+
+    def key_fingerprint(self, key):
+        """
+        Compute the fingerprint identifying the key in the key context cache.
+
+        The fingerprint is a keyed BLAKE2b hash with a per-process secret, so it reveals nothing about the key.
+
+        :param key: The key to compute the fingerprint of.
+
+        :return bytes The fingerprint or `None` if the key is neither a `str` nor bytes-like.
+        """
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        elif not isinstance(key, (bytes, bytearray, memoryview)):
+            return None
+        return hashlib.blake2b(key, digest_size=16, key=_FINGERPRINT_SECRET).digest()
+
+    def prepare_key(self, key):
+        """
+        Prepare the context used to work with the key.
+
+        Implementations should override this method to do the expensive per-key work (key derivation,
+        cipher or HMAC setup) and obtain the result with `get_key_context`. The default implementation
+        returns the key as it is.
+
+        :param key: The key to prepare.
+
+        :return The prepared context. It is shared between threads, so it must not be modified when used.
+        """
+        return key
 
 
 class EncryptionService(Service):
@@ -16,7 +295,47 @@ class EncryptionService(Service):
     and the connection cannot be considered secure.
 
     All methods accept kwargs so individual data can be passed to conrete implementations.
+
+    Data too large to be held in memory is encrypted with `encrypt_stream` (and decrypted with `decrypt_stream`)
+    in chunks of `STREAM_CHUNK_SIZE` bytes. Each chunk is encrypted separately together with associated data
+    binding it to its stream, its position and whether it is the last one, so corrupted, reordered, dropped or
+    appended chunks are detected while decrypting, chunk by chunk.
+    """
+
+    """
+    Magic bytes starting a stream written by `encrypt_stream` (followed by the format version).
+    """
+    STREAM_MAGIC = b'COCOENC\x01'
+
+    """
+    The default number of plain text bytes per chunk of `encrypt_stream`.
+    """
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    """
+    The largest chunk size accepted by `decrypt_stream` (bounds its memory use for untrusted input).
     """
+    STREAM_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+    """
+    Stream header: magic, random stream ID and chunk size.
+    """
+    _STREAM_HEADER = struct.Struct('>8s16sI')
+
+    """
+    Associated data of each chunk: stream ID, chunk index and final chunk flag.
+    """
+    _STREAM_CHUNK_AD = struct.Struct('>16sQ?')
+
+    """
+    Prefix of each encrypted chunk: its length, the highest bit flags the final chunk.
+    """
+    _STREAM_FRAME = struct.Struct('>I')
+
+    """
+    Bit of the chunk prefix flagging the final chunk (it is authenticated as part of the associated data).
+    """
+    _STREAM_FINAL = 0x80000000
 
     def decrypt(self, text, key, **kwargs):
         """
@@ -27,6 +346,102 @@ class EncryptionService(Service):
         """
         raise NotImplementedError
 
+    def decrypt_chunk(self, chunk, key, associated_data, **kwargs):
+        """
+        Decrypt a chunk encrypted with `encrypt_chunk` and authenticate it together with the associated data.
+
+        The default implementation decrypts the chunk with `decrypt` and checks the associated data prefixed
+        to the plain text by the default `encrypt_chunk`.
+
+        :param chunk: The encrypted chunk (bytes).
+        :param key: The key to decrypt the chunk with.
+        :param associated_data: The data the chunk must have been encrypted with (bytes).
+
+        :return bytes The plain text chunk.
+
+        :raises EncryptionServiceError: If the chunk is corrupted or does not belong to the associated data.
+        """
+        plain = _to_bytes(self.decrypt(chunk, key, **kwargs))
+        if not hmac.compare_digest(plain[:len(associated_data)], associated_data):
+            raise EncryptionServiceError("The chunk does not belong to this position of the stream.")
+        return plain[len(associated_data):]
+
+    def decrypt_many(self, texts, key, **kwargs):
+        """
+        Decrypt all the input cipher texts with the given key.
+
+        The default implementation calls `decrypt` for each text. Implementations with a costly key setup
+        should override it to set the key up once for the whole batch.
+
+        :param texts: An iterable of cipher texts to decrypt.
+        :param key: The key to decrypt the messages with.
+
+        :return list A list with the decrypted text for each input text (in the same order) or, where
+                     decrypting failed, the raised `coco.contract.errors.EncryptionServiceError`.
+        """
+        results = []
+        for text in texts:
+            try:
+                results.append(self.decrypt(text, key, **kwargs))
+            except EncryptionServiceError as ex:
+                results.append(ex)
+        return results
+
+    def decrypt_stream(self, source, target, key, **kwargs):
+        """
+        Decrypt a stream written by `encrypt_stream`, chunk by chunk.
+
+        Only one encrypted chunk is held in memory at once. Each chunk is authenticated before its plain text
+        is written, so a corrupted chunk is detected as soon as it is reached. Note that the plain text of the
+        chunks before it has been written to `target` by then and must be discarded by the caller.
+
+        :param source: The file-like object (opened in binary mode) to read the encrypted stream from.
+        :param target: The file-like object (opened in binary mode) to write the plain text to.
+        :param key: The key to decrypt the stream with.
+
+        :return int The number of plain text bytes written.
+
+        :raises EncryptionServiceError: If the stream is malformed, truncated, extended or a chunk is corrupted.
+        """
+        header = _read_exactly(source, self._STREAM_HEADER.size)
+        if len(header) != self._STREAM_HEADER.size:
+            raise EncryptionServiceError("The stream is too short.")
+        magic, stream_id, chunk_size = self._STREAM_HEADER.unpack(header)
+        if magic != self.STREAM_MAGIC:
+            raise EncryptionServiceError("The data is not an encrypted stream.")
+        if not 0 < chunk_size <= self.STREAM_MAX_CHUNK_SIZE:
+            raise EncryptionServiceError("Invalid chunk size %d." % chunk_size)
+        # allow the cipher text to be larger than the plain text (e.g. due to padding or an encoding)
+        max_frame = chunk_size * 2 + 1024
+
+        written = 0
+        index = 0
+        while True:
+            prefix = _read_exactly(source, self._STREAM_FRAME.size)
+            if len(prefix) != self._STREAM_FRAME.size:
+                raise EncryptionServiceError("The stream is truncated (chunk %d is missing)." % index)
+            size = self._STREAM_FRAME.unpack(prefix)[0]
+            final = bool(size & self._STREAM_FINAL)
+            size &= ~self._STREAM_FINAL
+            if size > max_frame:
+                raise EncryptionServiceError("Chunk %d is too large." % index)
+            frame = _read_exactly(source, size)
+            if len(frame) != size:
+                raise EncryptionServiceError("The stream is truncated (chunk %d is incomplete)." % index)
+
+            try:
+                plain = self.decrypt_chunk(frame, key, self._STREAM_CHUNK_AD.pack(stream_id, index, final), **kwargs)
+            except EncryptionServiceError as ex:
+                raise EncryptionServiceError("Chunk %d is corrupted: %s" % (index, ex))
+            if plain:
+                target.write(plain)
+                written += len(plain)
+            index += 1
+            if final:
+                if source.read(1):
+                    raise EncryptionServiceError("Unexpected data after the final chunk.")
+                return written
+
     def encrypt(self, text, key, **kwargs):
         """
         Encrypt the input text with the given key.
@@ -36,6 +451,80 @@ class EncryptionService(Service):
         """
         raise NotImplementedError
 
+    def encrypt_chunk(self, chunk, key, associated_data, **kwargs):
+        """
+        Encrypt a chunk of a stream so it can only be decrypted together with the associated data.
+
+        Implementations based on an AEAD cipher should override this method (and `decrypt_chunk`) to pass the
+        associated data to the cipher. The default implementation encrypts the associated data prefixed
+        to the chunk with `encrypt`, which requires `encrypt` to authenticate the cipher text
+        (and to accept and return bytes).
+
+        :param chunk: The plain text chunk (bytes).
+        :param key: The key to encrypt the chunk with.
+        :param associated_data: The data to bind the chunk to (bytes).
+
+        :return bytes The encrypted chunk.
+        """
+        return _to_bytes(self.encrypt(associated_data + chunk, key, **kwargs))
+
+    def encrypt_many(self, texts, key, **kwargs):
+        """
+        Encrypt all the input texts with the given key.
+
+        The default implementation calls `encrypt` for each text. Implementations with a costly key setup
+        should override it to set the key up once for the whole batch.
+
+        :param texts: An iterable of texts to encrypt.
+        :param key: The key to encrypt the texts with.
+
+        :return list A list with the cipher text for each input text (in the same order) or, where
+                     encrypting failed, the raised `coco.contract.errors.EncryptionServiceError`.
+        """
+        results = []
+        for text in texts:
+            try:
+                results.append(self.encrypt(text, key, **kwargs))
+            except EncryptionServiceError as ex:
+                results.append(ex)
+        return results
+
+    def encrypt_stream(self, source, target, key, chunk_size=None, **kwargs):
+        """
+        Encrypt the data read from `source` in chunks and write the encrypted stream to `target`.
+
+        Only one chunk is held in memory at once. Each chunk is encrypted with `encrypt_chunk`.
+
+        :param source: The file-like object (opened in binary mode) to read the plain text from.
+        :param target: The file-like object (opened in binary mode) to write the encrypted stream to.
+        :param key: The key to encrypt the stream with.
+        :param chunk_size: The number of plain text bytes per chunk (defaults to `STREAM_CHUNK_SIZE`).
+
+        :return int The number of plain text bytes read.
+        """
+        chunk_size = chunk_size or self.STREAM_CHUNK_SIZE
+        if not 0 < chunk_size <= self.STREAM_MAX_CHUNK_SIZE:
+            raise ValueError("Invalid chunk size %d." % chunk_size)
+        stream_id = os.urandom(16)
+        target.write(self._STREAM_HEADER.pack(self.STREAM_MAGIC, stream_id, chunk_size))
+
+        read = 0
+        index = 0
+        chunk = _read_exactly(source, chunk_size)
+        while True:
+            # read ahead, so the last chunk can be marked as such
+            following = _read_exactly(source, chunk_size) if len(chunk) == chunk_size else b''
+            final = not following
+            encrypted = self.encrypt_chunk(chunk, key, self._STREAM_CHUNK_AD.pack(stream_id, index, final),
+                                           **kwargs)
+            target.write(self._STREAM_FRAME.pack(len(encrypted) | (self._STREAM_FINAL if final else 0)))
+            target.write(encrypted)
+            read += len(chunk)
+            if final:
+                return read
+            chunk = following
+            index += 1
+
 
 class IntegrityService(Service):
 
@@ -44,8 +533,42 @@ class IntegrityService(Service):
 
     The integrity services are used whenever the integrity of a resource (message, status etc.)
     needs to be ensured.
+
+    Large payloads can be signed and verified with `sign_stream` and `verify_stream`. To process them in
+    constant memory, implementations provide incremental signers with `create_signer` (and `create_verifier`
+    if the signature cannot be verified by recomputing it, e.g. for asymmetric signatures).
     """
 
+    def create_signer(self, key, **kwargs):
+        """
+        Create an incremental signer for the provided key.
+
+        The signer has an `update(chunk)` method, which is called with consecutive bytes-like chunks of the data,
+        and a `finalize()` method returning the signature of all the data (as `sign` would return it).
+
+        :param key: The key to sign with.
+
+        :return The signer.
+        """
+        raise NotImplementedError
+
+    def create_verifier(self, signature, key, **kwargs):
+        """
+        Create an incremental verifier of the signature for the provided key.
+
+        The verifier has an `update(chunk)` method, which is called with consecutive bytes-like chunks of the data,
+        and a `verify()` method returning `True` if the signature matches all the data or raising a
+        `coco.contract.errors.IntegrityValidationError` otherwise.
+
+        The default implementation recomputes the signature with `create_signer` and compares it in constant time.
+
+        :param signature: The signature to verify.
+        :param key: The key to verify the signature with.
+
+        :return The verifier.
+        """
+        return _DigestVerifier(self.create_signer(key, **kwargs), signature)
+
     def sign(self, text, key, **kwargs):
         """
         Sign the input text with the provided key.
@@ -55,6 +578,26 @@ class IntegrityService(Service):
         """
         raise NotImplementedError
 
+    def sign_stream(self, data, key, **kwargs):
+        """
+        Sign the data read incrementally from a path, a file-like object or an iterable of chunks.
+
+        With `create_signer` implemented, the data is hashed chunk by chunk in constant memory.
+        Otherwise it is read into memory and signed (as bytes) with `sign`.
+
+        :param data: The data to sign (see `iter_chunks`).
+        :param key: The key to sign the data with.
+
+        :return The signature (as `sign` would return it).
+        """
+        if type(self).create_signer is IntegrityService.create_signer:
+            return self.sign(_read_all(data), key, **kwargs)
+
+        signer = self.create_signer(key, **kwargs)
+        for chunk in iter_chunks(data):
+            signer.update(chunk)
+        return signer.finalize()
+
     def verify(self, text, signature, key, **kwargs):
         """
         Verify the signature of the input text using the provided key.
@@ -64,3 +607,53 @@ class IntegrityService(Service):
         :param key: The key to verify the signature with.
         """
         raise NotImplementedError
+
+    def verify_many(self, items, key, **kwargs):
+        """
+        Verify the signatures of many texts signed with the same key.
+
+        The default implementation calls `verify` for each item. Implementations should override it
+        to set the key up once for the whole batch.
+
+        :param items: An iterable of (text, signature) tuples.
+        :param key: The key to verify the signatures with.
+
+        :return list A list with an entry for each item (in the same order): `True` if the signature is valid,
+                     `False` if it is not (i.e. `verify` raised an `IntegrityValidationError` or returned `False`)
+                     or the `coco.contract.errors.IntegrityServiceError` raised if the item could not be verified.
+        """
+        results = []
+        for text, signature in items:
+            try:
+                results.append(self.verify(text, signature, key, **kwargs) is not False)
+            except IntegrityValidationError:
+                results.append(False)
+            except IntegrityServiceError as ex:
+                results.append(ex)
+        return results
+
+    def verify_stream(self, data, signature, key, **kwargs):
+        """
+        Verify the signature of the data read incrementally from a path, a file-like object or an iterable of chunks.
+
+        With `create_signer` (or `create_verifier`) implemented, the data is processed chunk by chunk in constant
+        memory. Otherwise it is read into memory and verified (as bytes) with `verify`.
+
+        :param data: The data to verify the signature of (see `iter_chunks`).
+        :param signature: The signature to verify for the data.
+        :param key: The key to verify the signature with.
+
+        :return bool `True` if the signature is valid.
+
+        :raises IntegrityValidationError: If the signature does not match the data.
+        """
+        if type(self).create_signer is IntegrityService.create_signer and \
+                type(self).create_verifier is IntegrityService.create_verifier:
+            if self.verify(_read_all(data), signature, key, **kwargs) is False:
+                raise IntegrityValidationError("The signature does not match the data.")
+            return True
+
+        verifier = self.create_verifier(signature, key, **kwargs)
+        for chunk in iter_chunks(data):
+            verifier.update(chunk)
+        return verifier.verify()
@@ -0,0 +1,16 @@
+import pytest
+import resource
+
+
+@pytest.fixture
+def fd_limit():
+    """
+    Lower the soft limit of open file descriptors for the duration of the test.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    def lower(limit):
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(limit, hard), hard))
+
+    yield lower
+    resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
@@ -0,0 +1,112 @@
+from coco.contract import aio
+from coco.contract.backends import ContainerBackend
+import asyncio
+import time
+
+
+class MemoryGroupBackend(aio.AsyncGroupBackend):
+
+    def __init__(self, groups):
+        self.members = {group: set() for group in groups}
+
+    async def add_group_member(self, group, user, **kwargs):
+        self.members[group].add(user)
+
+    async def get_groups(self, **kwargs):
+        return [{self.FIELD_PK: group} for group in sorted(self.members)]
+
+    async def is_group_member(self, group, user, **kwargs):
+        return user in self.members[group]
+
+    async def remove_group_member(self, group, user, **kwargs):
+        self.members[group].discard(user)
+
+
+class PagedGroupBackend(MemoryGroupBackend):
+
+    async def get_groups(self, **kwargs):
+        raise AssertionError('The groups must be fetched page by page.')
+
+    async def get_groups_page(self, page_size=None, cursor=None, **kwargs):
+        groups = [{self.FIELD_PK: group} for group in sorted(self.members)]
+        offset = cursor or 0
+        self.pages += 1
+        return groups[offset:offset + page_size], offset + page_size if offset + page_size < len(groups) else None
+
+
+class SlowBackend(ContainerBackend):
+
+    def container_image_exists(self, image):
+        time.sleep(0.3)
+        return True
+
+
+def test_exiting_the_adapter_does_not_block_the_loop():
+    async def main():
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.ensure_future(tick())
+        async with aio.to_async(SlowBackend()) as adapter:
+            call = asyncio.ensure_future(adapter.container_image_exists('base'))
+            await asyncio.sleep(0.05)
+            del ticks[:]
+        ticker.cancel()
+        # the pending call has finished before the adapter's pool was shut down
+        assert call.done() and call.result()
+        return ticks
+
+    assert len(asyncio.run(main())) > 5
+
+
+def test_async_contracts_slice_and_iterate_by_default():
+    class Users(aio.AsyncUserBackend):
+        async def get_users(self, **kwargs):
+            return [{self.FIELD_PK: i} for i in range(5)]
+
+    async def main():
+        users = Users()
+        first, cursor = await users.get_users_page(page_size=2)
+        second, cursor = await users.get_users_page(page_size=2, cursor=cursor)
+        third, cursor = await users.get_users_page(page_size=2, cursor=cursor)
+        assert [user['pk'] for user in first + second + third] == [0, 1, 2, 3, 4]
+        assert cursor is None
+        assert [user['pk'] async for user in users.iter_users()] == [0, 1, 2, 3, 4]
+
+        class Containers(aio.AsyncSnapshotableContainerBackend):
+            async def get_containers(self, only_running=False, **kwargs):
+                return [{self.KEY_PK: 'running'}] + ([] if only_running else [{self.KEY_PK: 'stopped'}])
+
+            async def get_container_snapshots(self, **kwargs):
+                return [{self.KEY_PK: 'snapshot'}]
+
+        containers = Containers()
+        assert (await containers.get_containers_page(page_size=1, only_running=True))[1] is None
+        assert [c['pk'] async for c in containers.iter_containers()] == ['running', 'stopped']
+        assert [s['pk'] async for s in containers.iter_container_snapshots()] == ['snapshot']
+
+        groups = PagedGroupBackend(['g%d' % i for i in range(5)])
+        groups.pages = 0
+        assert [group['pk'] async for group in groups.iter_groups(page_size=2)] == ['g0', 'g1', 'g2', 'g3', 'g4']
+        assert groups.pages == 3
+
+    asyncio.run(main())
+
+
+def test_async_group_backend_bulk_defaults():
+    async def main():
+        groups = MemoryGroupBackend(['a', 'b', 'c'])
+        await groups.add_group_members('a', ['alice', 'bob'])
+        await groups.add_group_members('b', ['alice'])
+        assert [group['pk'] for group in await groups.get_user_groups('alice')] == ['a', 'b']
+
+        await groups.remove_group_members('a', ['bob'])
+        assert await groups.get_user_groups('bob') == []
+        await groups.remove_user_from_all_groups('alice')
+        assert groups.members == {'a': set(), 'b': set(), 'c': set()}
+
+    asyncio.run(main())
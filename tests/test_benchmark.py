@@ -0,0 +1,20 @@
+from coco.contract.benchmark import run_benchmark
+from coco.contract.memory import MemoryContainerBackend
+
+
+def test_memory_backend_is_conformant():
+    backend = MemoryContainerBackend(images=['base'])
+    report = run_benchmark(backend, concurrency=(1, 4), iterations=10)
+    assert report['conformant']
+    assert backend.get_containers() == []
+
+
+def test_containers_are_deleted_when_start_fails():
+    backend = MemoryContainerBackend(images=['base'], failure_rate=0.3, failing_methods=['start_container'], seed=1)
+    report = run_benchmark(backend, concurrency=(1, 4), iterations=20)
+
+    assert not report['conformant']
+    assert backend.get_containers() == []
+    operations = {operation['operation']: operation for operation in report['results'][0]['operations']}
+    assert operations['start_container']['errors']
+    assert operations['delete_container']['calls'] == 20
@@ -0,0 +1,139 @@
+from coco.contract.errors import EncryptionServiceError
+from coco.contract.services import EncryptionService
+import hashlib
+import hmac
+import io
+import os
+import pytest
+import struct
+
+
+class AuthenticatedXorService(EncryptionService):
+
+    """
+    Toy authenticated encryption (SHA-256 key stream, HMAC-SHA256 tag) to exercise the stream framing.
+    """
+
+    def _key_stream(self, key, nonce, size):
+        blocks = (hashlib.sha256(key + nonce + struct.pack('>Q', i)).digest() for i in range(size // 32 + 1))
+        return b''.join(blocks)[:size]
+
+    def decrypt(self, text, key, **kwargs):
+        nonce, body, tag = text[:16], text[16:-32], text[-32:]
+        if not hmac.compare_digest(hmac.new(key, nonce + body, 'sha256').digest(), tag):
+            raise EncryptionServiceError("Authentication failed.")
+        return bytes(a ^ b for a, b in zip(body, self._key_stream(key, nonce, len(body))))
+
+    def encrypt(self, text, key, **kwargs):
+        nonce = os.urandom(16)
+        body = bytes(a ^ b for a, b in zip(text, self._key_stream(key, nonce, len(text))))
+        return nonce + body + hmac.new(key, nonce + body, 'sha256').digest()
+
+
+KEY = b'k' * 32
+HEADER_SIZE = struct.calcsize('>8s16sI')
+
+
+def encrypt(data, chunk_size=16, key=KEY):
+    target = io.BytesIO()
+    AuthenticatedXorService().encrypt_stream(io.BytesIO(data), target, key, chunk_size=chunk_size)
+    return target.getvalue()
+
+
+def decrypt(stream, key=KEY):
+    target = io.BytesIO()
+    AuthenticatedXorService().decrypt_stream(io.BytesIO(stream), target, key)
+    return target.getvalue()
+
+
+def split(stream):
+    """
+    Split the encrypted stream into its header and its frames (including their length prefixes).
+    """
+    header, frames, offset = stream[:HEADER_SIZE], [], HEADER_SIZE
+    while offset < len(stream):
+        size = struct.unpack('>I', stream[offset:offset + 4])[0] & 0x7fffffff
+        frames.append(stream[offset:offset + 4 + size])
+        offset += 4 + size
+    return header, frames
+
+
+@pytest.mark.parametrize('size', [0, 1, 15, 16, 17, 64, 1000])
+def test_round_trip(size):
+    data = os.urandom(size)
+    stream = encrypt(data)
+    assert decrypt(stream) == data
+    assert len(split(stream)[1]) == max(1, -(-size // 16))
+
+
+def test_wrong_key_is_detected():
+    with pytest.raises(EncryptionServiceError):
+        decrypt(encrypt(b'x' * 100), key=b'o' * 32)
+
+
+def test_not_a_stream():
+    with pytest.raises(EncryptionServiceError):
+        decrypt(b'definitely not an encrypted stream')
+    with pytest.raises(EncryptionServiceError):
+        decrypt(b'')
+
+
+@pytest.mark.parametrize('cut', [1, 4, 20])
+def test_truncation_within_a_chunk_is_detected(cut):
+    stream = encrypt(os.urandom(100))
+    with pytest.raises(EncryptionServiceError):
+        decrypt(stream[:-cut])
+
+
+def test_dropped_final_chunks_are_detected():
+    header, frames = split(encrypt(os.urandom(100)))
+    for count in range(len(frames)):
+        with pytest.raises(EncryptionServiceError):
+            decrypt(header + b''.join(frames[:count]))
+
+
+def test_dropped_middle_chunk_is_detected():
+    header, frames = split(encrypt(os.urandom(100)))
+    with pytest.raises(EncryptionServiceError):
+        decrypt(header + b''.join(frames[:2] + frames[3:]))
+
+
+def test_reordered_chunks_are_detected():
+    header, frames = split(encrypt(os.urandom(100)))
+    frames[1], frames[2] = frames[2], frames[1]
+    with pytest.raises(EncryptionServiceError):
+        decrypt(header + b''.join(frames))
+
+
+def test_appended_data_is_detected():
+    stream = encrypt(os.urandom(100))
+    other_header, other_frames = split(encrypt(os.urandom(100)))
+    with pytest.raises(EncryptionServiceError):
+        decrypt(stream + other_frames[0])
+    with pytest.raises(EncryptionServiceError):
+        decrypt(stream + b'\0')
+
+
+def test_chunks_of_another_stream_are_detected():
+    header, frames = split(encrypt(os.urandom(100)))
+    other_header, other_frames = split(encrypt(os.urandom(100)))
+    frames[1] = other_frames[1]
+    with pytest.raises(EncryptionServiceError):
+        decrypt(header + b''.join(frames))
+
+
+def test_flipped_final_flag_is_detected():
+    header, frames = split(encrypt(os.urandom(100)))
+    first = bytearray(frames[0])
+    first[0] |= 0x80
+    with pytest.raises(EncryptionServiceError):
+        decrypt(header + bytes(first))
+
+
+def test_tampered_bytes_are_detected():
+    stream = encrypt(os.urandom(100))
+    for position in range(HEADER_SIZE, len(stream), 7):
+        tampered = bytearray(stream)
+        tampered[position] ^= 0x01
+        with pytest.raises(EncryptionServiceError):
+            decrypt(bytes(tampered))
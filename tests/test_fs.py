@@ -0,0 +1,128 @@
+from coco.contract import fs
+import os
+import pytest
+import stat
+
+
+def make_wide_tree(base, width):
+    """
+    Create `width` subdirectories below `base`, each containing one more directory with a file.
+    """
+    for i in range(width):
+        nested = os.path.join(base, 'd%d' % i, 'nested')
+        os.makedirs(nested)
+        with open(os.path.join(nested, 'file'), 'w') as f:
+            f.write('x')
+
+
+def test_walk_trees_visits_every_directory_once(tmp_path):
+    make_wide_tree(str(tmp_path), 20)
+    seen = []
+
+    def visit(root, dir_fd, rel_path, entries):
+        seen.append(rel_path)
+        return [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+
+    fs.walk_trees([str(tmp_path)], visit, max_workers=4)
+    expected = [''] + ['d%d' % i for i in range(20)] + [os.path.join('d%d' % i, 'nested') for i in range(20)]
+    assert sorted(seen) == sorted(expected)
+
+
+def test_walk_trees_does_not_follow_symlinks(tmp_path):
+    outside = tmp_path / 'outside'
+    (outside / 'secret').mkdir(parents=True)
+    tree = tmp_path / 'tree'
+    tree.mkdir()
+    (tree / 'link').symlink_to(outside)
+    seen = []
+
+    def visit(root, dir_fd, rel_path, entries):
+        seen.append(rel_path)
+        # a visitor naming the symlink must not get the walk out of the tree
+        return [entry.name for entry in entries]
+
+    fs.walk_trees([str(tree)], visit)
+    assert seen == ['']
+
+
+def test_walk_trees_raises_visitor_errors(tmp_path):
+    make_wide_tree(str(tmp_path), 50)
+
+    def visit(root, dir_fd, rel_path, entries):
+        if rel_path.endswith('nested'):
+            raise RuntimeError('boom')
+        return [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+
+    with pytest.raises(RuntimeError):
+        fs.walk_trees([str(tmp_path)], visit, max_workers=4)
+
+
+def test_walk_trees_missing_roots(tmp_path):
+    missing = str(tmp_path / 'missing')
+    with pytest.raises(FileNotFoundError):
+        fs.walk_trees([missing], lambda root, dir_fd, rel_path, entries: [])
+    fs.walk_trees([missing], lambda root, dir_fd, rel_path, entries: [], ignore_missing=True)
+
+
+def test_change_tree_and_tree_usage_within_fd_limit(tmp_path, fd_limit):
+    make_wide_tree(str(tmp_path), 3000)
+    fd_limit(256)
+
+    changed, unchanged, errors = fs.change_tree(str(tmp_path), mode=0o750, file_mode=0o640, max_workers=8)
+    assert errors == []
+    assert changed + unchanged == 1 + 3000 * 3
+    assert fs.tree_usage(str(tmp_path), max_workers=8)[2:] == (3000, 1 + 3000 * 2)
+
+
+def test_change_tree_leaves_symlink_targets_alone(tmp_path):
+    target = tmp_path / 'target'
+    target.write_text('x')
+    target.chmod(0o600)
+    tree = tmp_path / 'tree'
+    tree.mkdir()
+    (tree / 'link').symlink_to(target)
+    (tree / 'file').write_text('x')
+
+    changed, unchanged, errors = fs.change_tree(str(tree), mode=0o755, file_mode=0o644)
+    assert errors == []
+    assert stat.S_IMODE(target.stat().st_mode) == 0o600
+    assert stat.S_IMODE((tree / 'file').stat().st_mode) == 0o644
+    assert stat.S_IMODE(tree.stat().st_mode) == 0o755
+
+
+@pytest.mark.skipif(os.geteuid() == 0, reason='root can open unreadable files')
+def test_change_tree_reports_unreadable_files(tmp_path):
+    unreadable = tmp_path / 'unreadable'
+    unreadable.write_text('x')
+    unreadable.chmod(0)
+
+    changed, unchanged, errors = fs.change_tree(str(tmp_path), file_mode=0o644)
+    assert [rel_path for rel_path, message in errors] == ['unreadable']
+    assert stat.S_IMODE(unreadable.stat().st_mode) == 0
+
+
+def test_symlinked_roots_are_not_followed(tmp_path):
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    (outside / 'file').write_text('x')
+    outside.chmod(0o755)
+    link = tmp_path / 'link'
+    link.symlink_to(outside)
+
+    with pytest.raises(OSError):
+        fs.change_tree(str(link), mode=0o700)
+    assert stat.S_IMODE(outside.stat().st_mode) == 0o755
+    assert fs.trees_usage([str(link)]) == {}
+
+
+def test_walk_from_a_descriptor(tmp_path):
+    make_wide_tree(str(tmp_path), 3)
+    fd = os.open(str(tmp_path), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        assert fs.tree_usage(fd)[2:] == (3, 7)
+        changed, unchanged, errors = fs.change_tree(fd, file_mode=0o600)
+        assert errors == [] and changed == 3
+        # the caller keeps ownership of the descriptor
+        os.fstat(fd)
+    finally:
+        os.close(fd)
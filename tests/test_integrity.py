@@ -0,0 +1,140 @@
+from coco.contract.errors import IntegrityValidationError
+from coco.contract.integrity import HMACIntegrityService
+import gc
+import hmac
+import io
+import os
+import pytest
+import threading
+import weakref
+
+
+@pytest.mark.parametrize('key_size', [0, 1, 32, 64, 65, 200])
+@pytest.mark.parametrize('size', [0, 1, 63, 64, 1000])
+def test_sign_matches_hmac(key_size, size):
+    service = HMACIntegrityService()
+    key = os.urandom(key_size)
+    text = os.urandom(size)
+    expected = hmac.new(key, text, 'sha256').hexdigest()
+
+    assert service.sign(text, key) == expected
+    assert service.verify(text, expected, key)
+    assert service.sign_stream(io.BytesIO(text), key) == expected
+
+
+def test_sign_str():
+    service = HMACIntegrityService()
+    assert service.sign('text', 'key') == hmac.new(b'key', b'text', 'sha256').hexdigest()
+
+
+def test_sign_stream_matches_hmac(tmp_path):
+    service = HMACIntegrityService()
+    key = os.urandom(32)
+    data = os.urandom(3 * 1024 * 1024 + 7)
+    path = tmp_path / 'data'
+    path.write_bytes(data)
+    expected = hmac.new(key, data, 'sha256').hexdigest()
+
+    assert service.sign_stream(str(path), key) == expected
+    with open(str(path), 'rb') as f:
+        assert service.sign_stream(f, key) == expected
+    assert service.verify_stream(str(path), expected, key)
+    with pytest.raises(IntegrityValidationError):
+        service.verify_stream(io.BytesIO(data[:-1]), expected, key)
+
+
+def test_verify_rejects_tampering():
+    service = HMACIntegrityService()
+    signature = service.sign('text', 'key')
+    with pytest.raises(IntegrityValidationError):
+        service.verify('texT', signature, 'key')
+    with pytest.raises(IntegrityValidationError):
+        service.verify('text', signature, 'other key')
+    assert service.verify_many([('text', signature), ('texT', signature)], 'key') == [True, False]
+
+
+def test_key_contexts_are_cached_by_fingerprint():
+    service = HMACIntegrityService()
+    key = bytearray(os.urandom(32))
+    service.sign('a', key)
+    service.sign('b', bytes(key))
+    stats = service.get_key_context_stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 1
+    assert stats['size'] == 1
+
+    # a changed key must not be served the context of its old content
+    key[0] ^= 1
+    assert service.sign('a', key) == hmac.new(bytes(key), b'a', 'sha256').hexdigest()
+
+
+def test_memo_does_not_keep_keys_or_contexts_alive():
+    class Key(bytearray):
+        pass
+
+    service = HMACIntegrityService()
+    key = Key(os.urandom(32))
+    reference = weakref.ref(key)
+    service.sign('text', key)
+    del key
+    gc.collect()
+    assert reference() is None
+
+    service.clear_key_contexts()
+    assert service.get_key_context_stats()['size'] == 0
+    assert not hasattr(service._key_context_memo, 'entry')
+
+
+def test_memo_is_served_by_key_identity_and_dropped_on_invalidate():
+    service = HMACIntegrityService()
+    key = os.urandom(32)
+    for text in ('a', 'b', 'c'):
+        assert service.sign(text, key) == hmac.new(key, text.encode(), 'sha256').hexdigest()
+    assert service._key_context_memo.entry[0] is key
+    stats = service.get_key_context_stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+
+    assert service.invalidate_key_context(key)
+    assert not hasattr(service._key_context_memo, 'entry')
+    service.sign('d', key)
+    stats = service.get_key_context_stats()
+    assert (stats['hits'], stats['misses']) == (2, 2)
+
+
+def test_memo_hits_are_counted_per_thread():
+    service = HMACIntegrityService()
+    key = 'key'
+    service.sign('text', key)
+
+    def run():
+        for _ in range(100):
+            service.sign('text', key)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # the first use in each thread looks up the shared cache, the rest are memo hits
+    assert service.get_key_context_stats()['hits'] == 4 * 100
+    service.clear_key_contexts()
+    run()
+    assert service.get_key_context_stats()['hits'] == 4 * 100 + 99
+
+
+def test_key_contexts_are_shared_between_threads():
+    service = HMACIntegrityService()
+    barrier = threading.Barrier(8)
+    caches = []
+
+    def run():
+        barrier.wait()
+        caches.append(service._get_key_contexts())
+        service.sign('text', 'key')
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, caches))) == 1
@@ -0,0 +1,100 @@
+from coco.contract.errors import ConnectionError
+from coco.contract.pool import ConnectionPool
+import itertools
+import pytest
+import threading
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_pool(**kwargs):
+    counter = itertools.count()
+    closed = []
+    pool = ConnectionPool(lambda: next(counter), disconnect=closed.append, **kwargs)
+    return pool, closed
+
+
+def test_connections_are_reused():
+    pool, closed = make_pool(max_size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second == first
+    assert pool.stats()['size'] == 1
+    assert closed == []
+
+
+def test_acquire_times_out_when_exhausted():
+    pool, closed = make_pool(max_size=1, timeout=0.05)
+    connection = pool.acquire()
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert pool.stats()['waiting'] == 0
+
+    # a released connection wakes up a waiting caller
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire(timeout=5)))
+    waiter.start()
+    pool.release(connection)
+    waiter.join()
+    assert acquired == [connection]
+
+
+def test_discarded_connections_are_closed():
+    pool, closed = make_pool(max_size=1)
+    with pytest.raises(ConnectionError):
+        with pool.connection() as connection:
+            raise ConnectionError('broken')
+    assert closed == [connection]
+    assert pool.stats()['size'] == 0
+    with pool.connection() as replacement:
+        assert replacement != connection
+
+
+def test_unhealthy_connections_are_replaced():
+    counter = itertools.count()
+    pool = ConnectionPool(lambda: next(counter), health_check=lambda connection: connection > 0)
+    pool.release(pool.acquire())
+    assert pool.acquire() == 1
+
+
+def test_idle_connections_are_reaped():
+    clock = Clock()
+    pool, closed = make_pool(min_size=1, max_size=3, idle_timeout=10, clock=clock)
+    connections = [pool.acquire() for _ in range(3)]
+    for connection in connections:
+        pool.release(connection)
+    assert pool.stats()['size'] == 3
+
+    clock.now = 11
+    assert pool.reap() == 2
+    assert pool.stats()['size'] == 1
+    assert len(closed) == 2
+
+    # releasing a connection reaps as well
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    clock.now = 22
+    pool.release(second)
+    assert pool.stats()['size'] == 1
+    assert closed[-1] == first
+
+
+def test_close():
+    pool, closed = make_pool(max_size=2)
+    in_use = pool.acquire()
+    pool.release(pool.acquire())
+    pool.close()
+    assert len(closed) == 1
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    pool.release(in_use)
+    assert in_use in closed
+    assert pool.stats()['size'] == 0
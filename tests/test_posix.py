@@ -0,0 +1,205 @@
+from coco.contract.backends import StorageBackend
+from coco.contract.errors import DirectoryNotFoundError, StorageBackendError
+from coco.contract.posix import PosixStorageBackend
+import os
+import pytest
+import stat
+import threading
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = PosixStorageBackend(str(tmp_path))
+    yield backend
+    backend.close()
+
+
+def test_get_dirs_info(backend):
+    backend.mk_dir('a')
+    backend.mk_dir('b')
+    backend.set_dir_mode('b', 0o700)
+
+    infos = backend.get_dirs_info(['a', 'b', 'missing'])
+    assert sorted(infos) == ['a', 'b']
+    assert infos['b'][backend.DIR_INFO_KEY_MODE] == 0o700
+    assert infos['a'][backend.DIR_INFO_KEY_UID] == os.geteuid()
+    assert infos['a'] == backend.get_dir_info('a')
+
+
+def test_get_dirs_usage(backend):
+    backend.mk_dir('a')
+    backend.mk_dir('a/sub')
+    with open(os.path.join(backend.get_full_dir_path('a/sub'), 'file'), 'wb') as f:
+        f.write(b'x' * 1000)
+    backend.mk_dir('empty')
+
+    usage = backend.get_dirs_usage(['a', 'empty', 'missing'])
+    assert sorted(usage) == ['a', 'empty']
+    assert usage['a'][backend.USAGE_KEY_FILES] == 1
+    assert usage['a'][backend.USAGE_KEY_DIRS] == 2
+    assert usage['a'][backend.USAGE_KEY_SIZE] >= 1000
+    assert usage['empty'][backend.USAGE_KEY_FILES] == 0
+    with pytest.raises(DirectoryNotFoundError):
+        backend.get_dir_usage('missing')
+
+
+def test_get_dirs_usage_within_fd_limit(backend, fd_limit):
+    names = ['home%d' % i for i in range(1500)]
+    for name in names:
+        backend.mk_dir(name)
+        backend.mk_dir(name + '/data')
+    fd_limit(256)
+
+    usage = backend.get_dirs_usage(names, max_workers=8)
+    assert len(usage) == 1500
+    assert all(entry[backend.USAGE_KEY_DIRS] == 2 for entry in usage.values())
+
+
+@pytest.mark.parametrize('dir_name', ['', '/etc', '..', '../escaped', 'a/../../escaped', 'a/..', 'nul\0byte'])
+def test_names_escaping_the_base_dir_are_rejected(backend, dir_name):
+    with pytest.raises(StorageBackendError):
+        backend.mk_dir(dir_name)
+    with pytest.raises(StorageBackendError):
+        backend.get_full_dir_path(dir_name)
+
+
+def test_symlinks_are_not_followed(backend, tmp_path_factory):
+    outside = tmp_path_factory.mktemp('outside')
+    os.symlink(str(outside), backend.get_full_dir_path('link'))
+
+    assert not backend.dir_exists('link')
+    with pytest.raises(DirectoryNotFoundError):
+        backend.mk_dir('link/escaped')
+    with pytest.raises(DirectoryNotFoundError):
+        backend.set_dir_mode('link', 0o777)
+    assert os.listdir(str(outside)) == []
+
+
+def test_nested_dirs(backend):
+    backend.mk_dir('a')
+    backend.mk_dir('a/b')
+    assert backend.dir_exists('a/./b')
+    backend.rm_dir('a', recursive=True)
+    assert not backend.dir_exists('a')
+
+
+def test_provision_dirs(backend):
+    results = backend.provision_dirs([('a', None, None, 0o750), ('b', os.geteuid(), None, None),
+                                      ('missing/c', None, None, None)])
+    assert list(results) == ['a', 'b', 'missing/c']
+    assert results['a'] is None and results['b'] is None
+    assert isinstance(results['missing/c'], DirectoryNotFoundError)
+    assert backend.get_dir_info('a')[backend.DIR_INFO_KEY_MODE] == 0o750
+
+    with pytest.raises(ValueError):
+        backend.provision_dirs([('d', None, None, 0o700), ('e', None, None, None), ('d', None, None, 0o755)])
+    assert not backend.dir_exists('d')
+    assert not backend.dir_exists('e')
+
+
+@pytest.mark.parametrize('default', [False, True])
+def test_failed_provisioning_removes_the_dir(backend, monkeypatch, default):
+    def fail(*args, **kwargs):
+        raise OSError(1, 'Operation not permitted')
+
+    monkeypatch.setattr(os, 'fchmod', fail)
+    provision_dir = StorageBackend.provision_dir if default else PosixStorageBackend.provision_dir
+    with pytest.raises(StorageBackendError):
+        provision_dir(backend, 'a', mode=0o750)
+    assert not backend.dir_exists('a')
+
+
+def test_use_after_close_raises(backend, tmp_path, monkeypatch):
+    backend.mk_dir('a')
+    backend.close()
+    backend.close()
+    monkeypatch.chdir(str(tmp_path))
+
+    for call in (lambda: backend.mk_dir('escaped'), lambda: backend.dir_exists('a'),
+                 lambda: backend.get_dir_info('a'), lambda: backend.get_dirs_usage(['a']),
+                 lambda: backend.set_dir_mode('a', 0o700), lambda: backend.rm_dir('a', recursive=True)):
+        with pytest.raises(StorageBackendError):
+            call()
+    assert not os.path.exists(str(tmp_path / 'escaped'))
+    assert os.path.isdir(str(tmp_path / 'a'))
+
+
+def make_tree(backend, name, width):
+    backend.mk_dir(name)
+    for i in range(width):
+        backend.mk_dir('%s/d%d' % (name, i))
+        backend.mk_dir('%s/d%d/nested' % (name, i))
+
+
+def trash_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('coco-trash')]
+
+
+def test_rm_dir_background(backend):
+    make_tree(backend, 'tree', 50)
+    backend.rm_dir('tree', recursive=True, background=True)
+    assert not backend.dir_exists('tree')
+    assert backend.wait_for_deletions(timeout=10)
+    assert backend.get_pending_deletions() == 0
+    assert backend.trash_errors == {}
+    assert os.listdir(backend.get_full_dir_path(backend.trash_dir)) == []
+
+
+def test_close_stops_background_deletions(tmp_path):
+    backend = PosixStorageBackend(str(tmp_path), trash_workers=4)
+    make_tree(backend, 'tree', 200)
+    backend.rm_dir('tree', recursive=True, background=True)
+    backend.close()
+
+    assert trash_threads() == []
+    assert backend.get_pending_deletions() == 0
+    with pytest.raises(StorageBackendError):
+        backend.resume_trash()
+
+    # whatever was left in the trash is resumed by the next instance
+    with PosixStorageBackend(str(tmp_path)) as resumed:
+        assert resumed.wait_for_deletions(timeout=10)
+        assert os.listdir(resumed.get_full_dir_path(resumed.trash_dir)) == []
+    assert trash_threads() == []
+
+
+@pytest.fixture
+def outside(tmp_path_factory):
+    outside = tmp_path_factory.mktemp('outside')
+    victim = outside / 'victim'
+    victim.mkdir()
+    (victim / 'f').write_text('x')
+    victim.chmod(0o755)
+    return outside
+
+
+@pytest.mark.parametrize('dir_name', ['link', 'real/sub', 'real/sub/victim'])
+def test_recursive_changes_do_not_follow_symlinked_names(backend, outside, dir_name):
+    backend.mk_dir('real')
+    os.symlink(str(outside), backend.get_full_dir_path('link'))
+    os.symlink(str(outside), backend.get_full_dir_path('real/sub'))
+    before = os.stat(str(outside / 'victim' / 'f'))
+
+    with pytest.raises(DirectoryNotFoundError):
+        backend.set_dir_mode_recursive(dir_name, 0o700)
+    with pytest.raises(DirectoryNotFoundError):
+        backend.set_dir_uid_recursive(dir_name, 4321)
+    with pytest.raises(DirectoryNotFoundError):
+        backend.get_dir_usage(dir_name)
+    assert backend.get_dirs_usage([dir_name]) == {}
+
+    assert stat.S_IMODE((outside / 'victim').stat().st_mode) == 0o755
+    after = os.stat(str(outside / 'victim' / 'f'))
+    assert (after.st_uid, after.st_mode) == (before.st_uid, before.st_mode)
+
+
+def test_recursive_changes(backend):
+    make_tree(backend, 'tree', 3)
+    with open(os.path.join(backend.get_full_dir_path('tree/d0'), 'file'), 'w') as f:
+        f.write('x')
+
+    summary = backend.set_dir_mode_recursive('tree', 0o750, file_mode=0o640)
+    assert summary[backend.RECURSIVE_KEY_ERRORS] == []
+    assert summary[backend.RECURSIVE_KEY_CHANGED] + summary[backend.RECURSIVE_KEY_UNCHANGED] == 8
+    assert backend.get_dir_mode('tree/d2/nested') == 0o750
+    assert stat.S_IMODE(os.stat(os.path.join(backend.get_full_dir_path('tree/d0'), 'file')).st_mode) == 0o640
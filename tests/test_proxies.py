@@ -0,0 +1,256 @@
+from coco.contract import aio
+from coco.contract.backends import ContainerBackend, GroupBackend
+from coco.contract.benchmark import run_benchmark
+from coco.contract.errors import ContainerNotFoundError
+from coco.contract.memory import MemoryContainerBackend
+from coco.contract.proxies import CachingContainerBackend, CachingGroupBackend, InstrumentedBackend
+import asyncio
+import pytest
+
+
+def test_proxies_implement_the_wrapped_contracts():
+    backend = InstrumentedBackend(CachingContainerBackend(MemoryContainerBackend(images=['base'])))
+    assert isinstance(backend, ContainerBackend)
+    assert isinstance(backend, InstrumentedBackend)
+    assert type(backend) is InstrumentedBackend
+    assert isinstance(CachingGroupBackend(GroupBackend()), GroupBackend)
+
+
+def test_proxies_can_be_adapted_to_asyncio():
+    backend = InstrumentedBackend(CachingContainerBackend(MemoryContainerBackend(images=['base'])))
+    adapter = aio.to_async(backend)
+    assert isinstance(adapter, aio.AsyncContainerBackend)
+    assert asyncio.run(adapter.container_image_exists('base'))
+    assert backend.stats()['container_image_exists']['calls'] == 1
+
+
+def test_proxies_can_be_benchmarked():
+    backend = InstrumentedBackend(MemoryContainerBackend(images=['base']))
+    report = run_benchmark(backend, concurrency=(2,), iterations=5)
+    assert report['conformant']
+    assert backend.stats()['create_container']['calls'] == 5
+
+
+def make_container(backend, name='c', image='base'):
+    return backend.create_container('user', 1000, name, [], [], image=image)[ContainerBackend.KEY_PK]
+
+
+def test_caching_container_backend_counts_hits_misses_and_evictions():
+    backend = MemoryContainerBackend(images=['base', 'other'])
+    proxy = CachingContainerBackend(backend, max_size=2)
+    pk = make_container(backend)
+
+    for _ in range(3):
+        assert proxy.get_container(pk)[ContainerBackend.KEY_PK] == pk
+    assert backend.calls['get_container'] == 1
+    assert proxy.container_image_exists('base')
+    assert proxy.container_image_exists('other')
+    stats = proxy.cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (2, 3, 1, 2)
+
+    # the container's entry was the least recently used one and has been evicted
+    proxy.get_container(pk)
+    assert backend.calls['get_container'] == 2
+
+
+@pytest.mark.parametrize('method, prepare', [
+    ('start_container', []),
+    ('stop_container', ['start_container']),
+    ('restart_container', []),
+    ('suspend_container', ['start_container']),
+    ('resume_container', ['start_container', 'suspend_container']),
+])
+def test_caching_container_backend_write_methods_invalidate(method, prepare):
+    backend = MemoryContainerBackend(images=['base'])
+    proxy = CachingContainerBackend(backend)
+    pk = make_container(backend)
+    for name in prepare:
+        getattr(backend, name)(pk)
+
+    # the write methods are not defined on the proxy but wrapped by `__getattr__`
+    assert method not in vars(CachingContainerBackend)
+    before = proxy.get_container(pk)
+    proxy.get_containers()
+    getattr(proxy, method)(pk)
+    assert proxy.get_container(pk) == backend.get_container(pk) != before
+    assert proxy.get_containers() == backend.get_containers()
+    assert proxy.get_containers_status([pk]) == {pk: backend.get_container(pk)[ContainerBackend.CONTAINER_KEY_STATUS]}
+
+
+def test_caching_container_backend_restore_and_delete_invalidate():
+    backend = MemoryContainerBackend(images=['base'])
+    proxy = CachingContainerBackend(backend)
+    pk = make_container(backend)
+    snapshot = backend.create_container_snapshot(pk, 'snap')[ContainerBackend.KEY_PK]
+
+    proxy.get_container(pk)
+    proxy.restore_container_snapshot(container=pk, snapshot=snapshot)
+    proxy.get_container(pk)
+    assert backend.calls['get_container'] == 2
+
+    assert proxy.containers_exist([pk]) == {pk: True}
+    proxy.delete_container(pk)
+    assert proxy.containers_exist([pk]) == {pk: False}
+    assert proxy.get_containers() == []
+    with pytest.raises(ContainerNotFoundError):
+        proxy.get_container(pk)
+
+
+def test_caching_container_backend_image_writes_invalidate():
+    backend = MemoryContainerBackend(images=['base'])
+    proxy = CachingContainerBackend(backend)
+    pk = make_container(backend)
+
+    assert not proxy.container_image_exists('new')
+    assert len(proxy.get_container_images()) == 1
+    proxy.create_container_image(pk, 'new')
+    assert proxy.container_image_exists('new')
+    assert len(proxy.get_container_images()) == 2
+    proxy.delete_container_image('new')
+    assert not proxy.container_image_exists('new')
+    assert len(proxy.get_container_images()) == 1
+
+
+def test_caching_container_backend_create_container_with_positional_clone_of():
+    backend = MemoryContainerBackend(images=['base'])
+    proxy = CachingContainerBackend(backend)
+    original = make_container(backend)
+
+    assert len(proxy.get_containers()) == 1
+    assert len(proxy.get_container_images()) == 1
+    clone = proxy.create_container('user', 1000, 'clone', [], [], None, None, None, original)
+    clone_image = clone[ContainerBackend.CONTAINER_KEY_CLONE_IMAGE][ContainerBackend.KEY_PK]
+    assert len(proxy.get_containers()) == 2
+    assert clone_image in [image[ContainerBackend.KEY_PK] for image in proxy.get_container_images()]
+    assert proxy.container_image_exists(clone_image)
+
+
+class InvalidatingBackend(MemoryContainerBackend):
+
+    """
+    Backend invalidating the proxy's cache while a read is in flight (as a concurrent write would).
+    """
+
+    proxy = None
+
+    def get_container(self, container, **kwargs):
+        result = super().get_container(container, **kwargs)
+        self.proxy.invalidate_container(container)
+        return result
+
+    def get_containers_by_pk(self, containers, **kwargs):
+        result = super().get_containers_by_pk(containers, **kwargs)
+        self.proxy.invalidate_container()
+        return result
+
+
+@pytest.mark.parametrize('read', [
+    lambda proxy, pk: proxy.get_container(pk),
+    lambda proxy, pk: proxy.get_containers_by_pk([pk])[pk],
+])
+def test_caching_container_backend_does_not_store_stale_reads(read):
+    backend = InvalidatingBackend(images=['base'])
+    proxy = backend.proxy = CachingContainerBackend(backend)
+    pk = make_container(backend)
+
+    assert read(proxy, pk)[ContainerBackend.KEY_PK] == pk
+    assert proxy.cache.stats()['size'] == 0
+    read(proxy, pk)
+    assert backend.calls['get_container'] + backend.calls['get_containers_by_pk'] == 2
+
+
+class MemoryGroupBackend(GroupBackend):
+
+    def __init__(self, groups=()):
+        self.members = {group: set() for group in groups}
+        self.loads = 0
+
+    def add_group_member(self, group, user, **kwargs):
+        self.members[group].add(user)
+
+    def create_group(self, gid, name, **kwargs):
+        self.members[name] = set()
+        return {self.FIELD_PK: name}
+
+    def delete_group(self, group, **kwargs):
+        del self.members[group]
+
+    def get_group_members(self, group, **kwargs):
+        self.loads += 1
+        return sorted(self.members[group])
+
+    def get_groups(self, **kwargs):
+        return [{self.FIELD_PK: group} for group in sorted(self.members)]
+
+    def is_group_member(self, group, user, **kwargs):
+        return user in self.members[group]
+
+    def remove_group_member(self, group, user, **kwargs):
+        self.members[group].discard(user)
+
+
+def user_groups(proxy, user):
+    return sorted(group[GroupBackend.FIELD_PK] for group in proxy.get_user_groups(user))
+
+
+def test_caching_group_backend_applies_membership_changes():
+    backend = MemoryGroupBackend(['a', 'b'])
+    proxy = CachingGroupBackend(backend)
+    assert user_groups(proxy, 'alice') == []
+    assert not proxy.is_group_member('a', 'alice')
+
+    proxy.add_group_member('a', 'alice')
+    proxy.add_group_members('b', ['alice', 'bob'])
+    assert proxy.is_group_member('a', 'alice') and proxy.is_group_member('b', 'bob')
+    assert user_groups(proxy, 'alice') == ['a', 'b']
+    assert user_groups(proxy, 'bob') == ['b']
+
+    proxy.remove_group_member('a', 'alice')
+    assert not proxy.is_group_member('a', 'alice')
+    assert user_groups(proxy, 'alice') == ['b']
+    proxy.remove_group_members('b', ['bob'])
+    assert not proxy.is_group_member('b', 'bob')
+    assert user_groups(proxy, 'bob') == []
+
+    proxy.remove_user_from_all_groups('alice')
+    assert not proxy.is_group_member('b', 'alice')
+    assert user_groups(proxy, 'alice') == []
+
+    # every change has been applied to the index, so the members have only been loaded once per group
+    assert backend.loads == 2
+    assert proxy.stats()['misses'] == 0
+
+
+def test_caching_group_backend_tracks_created_and_deleted_groups():
+    backend = MemoryGroupBackend(['a'])
+    proxy = CachingGroupBackend(backend)
+    proxy.add_group_member('a', 'alice')
+    assert user_groups(proxy, 'alice') == ['a']
+
+    proxy.create_group(1, 'new')
+    proxy.add_group_member('new', 'alice')
+    assert proxy.is_group_member('new', 'alice')
+    assert user_groups(proxy, 'alice') == ['a', 'new']
+
+    proxy.delete_group('a')
+    assert user_groups(proxy, 'alice') == ['new']
+    assert proxy.stats()['groups'] == 1
+
+
+def test_caching_group_backend_reloads_expired_groups():
+    now = [0.0]
+    backend = MemoryGroupBackend(['a', 'b'])
+    proxy = CachingGroupBackend(backend, ttl=10, clock=lambda: now[0])
+    assert not proxy.is_group_member('a', 'alice')
+    assert user_groups(proxy, 'alice') == []
+
+    # changes bypassing the proxy are only seen once the index has expired
+    backend.add_group_member('a', 'alice')
+    backend.members['c'] = {'alice'}
+    assert not proxy.is_group_member('a', 'alice')
+    assert user_groups(proxy, 'alice') == []
+
+    now[0] = 10.0
+    assert proxy.is_group_member('a', 'alice')
+    assert user_groups(proxy, 'alice') == ['a', 'c']
+    assert proxy.stats() == {'hits': 1, 'misses': 2, 'refreshes': 5, 'groups': 3, 'users': 1}